@@ -2,11 +2,12 @@
 
 import sys
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 
 import click
 
-from .job_utils import get_job, update_job_status
+from .job_utils import get_job, log_api_metrics, update_job_status
+from .result_cache import log_result_cache_stats
 from .processors import (
     process_text_letter_count_job,
     process_rastermap_job,
@@ -52,6 +53,8 @@ def run_job(job_id: str, api_base_url: Optional[str] = None) -> None:
         handler = handler_map.get(job["type"])
         if handler:
             handler(job, api_base_url=api_base_url)
+            log_api_metrics()
+            log_result_cache_stats()
         else:
             error_msg = f"Unknown job type: {job['type']}"
             click.echo(f"Error: {error_msg}", err=True)
@@ -67,6 +70,95 @@ def run_job(job_id: str, api_base_url: Optional[str] = None) -> None:
         sys.exit(1)
 
 
+@cli.command()
+@click.option("--api-base-url", help="Base URL for the API", envvar="NEUROSIFT_API_URL")
+@click.option(
+    "--api-key",
+    help="Worker API key of the job manager",
+    envvar="NEUROSIFT_WORKER_API_KEY",
+)
+@click.option(
+    "--job-type",
+    "job_types",
+    multiple=True,
+    help="Job type to process, can be repeated (default: all supported types)",
+)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Maximum number of jobs run at a time",
+)
+@click.option(
+    "--wait",
+    type=float,
+    default=20,
+    show_default=True,
+    help="Seconds each claim request waits for a pending job",
+)
+@click.option(
+    "--max-jobs",
+    type=int,
+    default=0,
+    help="Exit after claiming this many jobs (default: no limit)",
+)
+def worker(
+    api_base_url: Optional[str],
+    api_key: Optional[str],
+    job_types: Tuple[str, ...],
+    concurrency: int,
+    wait: float,
+    max_jobs: int,
+) -> None:
+    """Claim and process pending jobs until stopped.
+
+    Imports the processors once, then long-polls the job manager for pending
+    jobs of the supported types, claiming each atomically and running up to
+    CONCURRENCY of them at a time in forked processes.
+    """
+    from .core import JOB_TYPE_PRELOAD_MODULES
+    from .worker import Worker, preload_job_processors
+
+    if not api_key:
+        click.echo("Error: a worker API key is required (--api-key)", err=True)
+        sys.exit(1)
+    for job_type in job_types:
+        if job_type not in JOB_TYPE_PRELOAD_MODULES:
+            click.echo(f"Error: Unknown job type: {job_type}", err=True)
+            sys.exit(1)
+    loaded = preload_job_processors(list(job_types or JOB_TYPE_PRELOAD_MODULES))
+    if not loaded:
+        click.echo("Error: no job processors could be imported", err=True)
+        sys.exit(1)
+    Worker(
+        loaded,
+        concurrency=concurrency,
+        wait=wait,
+        max_jobs=max_jobs,
+        api_base_url=api_base_url,
+        api_key=api_key,
+    ).run()
+
+
+@cli.command()
+@click.option("--clear", is_flag=True, help="Remove all entries and statistics")
+def result_cache(clear: bool) -> None:
+    """Show the hit rate of the local result cache.
+
+    Identical jobs on unchanged input files are completed with the output of
+    the earlier job, using an index kept in $NEUROSIFT_RESULT_CACHE_DIR.
+    """
+    from .result_cache import RESULT_CACHE_DIR, ResultCache, format_result_cache_stats
+
+    cache = ResultCache()
+    if clear:
+        cache.clear()
+        click.echo(f"Cleared the result cache in {RESULT_CACHE_DIR}")
+        return
+    click.echo(f"{RESULT_CACHE_DIR}: {format_result_cache_stats(cache.stats())}")
+
+
 def main() -> None:
     """Entry point for the neurosift-job-runner command-line tool."""
     cli(auto_envvar_prefix="NEUROSIFT")
@@ -4,6 +4,14 @@ import sys
 
 from .job_utils import get_job, update_job_status
 
+# Modules used by the processor of each job type when it runs, which the
+# worker imports upfront (relative names are within this package)
+JOB_TYPE_PRELOAD_MODULES = {
+    "text-letter-count": [],
+    "rastermap": ["lindi", "scipy.stats", "rastermap"],
+    "multiscale_spike_density": ["lindi"],
+}
+
 
 # Lazy imports for job processors to avoid loading all dependencies upfront
 def get_job_processor(job_type: str):
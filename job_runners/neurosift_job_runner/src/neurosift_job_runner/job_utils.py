@@ -1,8 +1,16 @@
+import io
 import os
+import mimetypes
+import random
 import requests
 import json
 import logging
-from typing import Dict, Any, Tuple, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Any, List, Tuple, Optional
+from requests.adapters import HTTPAdapter
 from pydantic import BaseModel, Field
 
 # Configure logging
@@ -18,6 +26,194 @@ DEFAULT_API_BASE_URL = os.getenv(
 #     "http://localhost:3000/api",
 # )
 
+# Outputs of at least this size are uploaded in parts when possible
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_PART_SIZE = 16 * 1024 * 1024
+MULTIPART_MAX_WORKERS = 4
+
+# Timeouts in seconds for connecting to and reading from the job manager and
+# the storage
+API_CONNECT_TIMEOUT = float(os.getenv("NEUROSIFT_API_CONNECT_TIMEOUT", "10"))
+API_READ_TIMEOUT = float(os.getenv("NEUROSIFT_API_READ_TIMEOUT", "60"))
+
+# Idempotent calls are retried this many times on connection errors, timeouts
+# and the statuses below, after delays drawn uniformly from 0 to
+# API_RETRY_BACKOFF * 2**attempt seconds (at most API_RETRY_MAX_DELAY)
+API_MAX_RETRIES = int(os.getenv("NEUROSIFT_API_MAX_RETRIES", "5"))
+API_RETRY_BACKOFF = 0.5
+API_RETRY_MAX_DELAY = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Statuses a job cannot leave (see validateJobState in the job manager)
+TERMINAL_JOB_STATUSES = {"completed", "failed"}
+
+# Minimum number of seconds between two progress updates of a ProgressReporter
+PROGRESS_MIN_INTERVAL = 2.0
+
+# Content types of output files that mimetypes does not know
+CONTENT_TYPES = {
+    ".lindi.json": "application/json",
+    ".lindi.tar": "application/x-tar",
+    ".json": "application/json",
+    ".mp4": "video/mp4",
+}
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class ApiClient:
+    """HTTP client shared by the job-manager and storage calls.
+
+    One requests.Session keeps connections alive between calls (so progress
+    updates do not each pay for a TCP and TLS handshake). Every call has a
+    timeout, idempotent calls are retried with exponential backoff and
+    jitter, and the latency of each call (including its retries) is logged
+    at debug level and added up per call name in metrics.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: Tuple[float, float] = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+        max_retries: int = API_MAX_RETRIES,
+        backoff: float = API_RETRY_BACKOFF,
+        pool_size: int = 2 * MULTIPART_MAX_WORKERS,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.metrics: Dict[str, CallStats] = {}
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        name: str,
+        method: str,
+        url: str,
+        *,
+        idempotent: Optional[bool] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send a request, retrying it if it is idempotent.
+
+        Args:
+            name: Name of the call in the metrics, e.g. "get_job"
+            method: HTTP method
+            url: URL of the request
+            idempotent: Whether the call can be retried (default: by method)
+            timeout: (connect, read) timeouts overriding the defaults
+            **kwargs: Passed to requests; a file-like data is rewound before
+                each retry
+
+        Returns:
+            The response, which may have an error status
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = self.max_retries if idempotent else 0
+        data = kwargs.get("data")
+        position = data.tell() if hasattr(data, "seek") else None
+        timer = time.perf_counter()
+        attempt = 0
+        while True:
+            if position is not None:
+                data.seek(position)
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout or self.timeout, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    self._record(name, method, url, timer, attempt, None)
+                    raise
+                reason = str(e)
+                delay = self._retry_delay(attempt, None)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    self._record(name, method, url, timer, attempt, response)
+                    return response
+                reason = f"status {response.status_code}"
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                response.close()
+            logging.warning(f"{name}: {reason}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), API_RETRY_MAX_DELAY)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff * 2**attempt, API_RETRY_MAX_DELAY))
+
+    def _record(
+        self,
+        name: str,
+        method: str,
+        url: str,
+        timer: float,
+        retries: int,
+        response: Optional[requests.Response],
+    ) -> None:
+        elapsed = time.perf_counter() - timer
+        status = response.status_code if response is not None else "error"
+        logging.debug(
+            f"{name}: {method} {url} -> {status} in {elapsed * 1000:.0f} ms"
+            + (f" ({retries} retries)" if retries else "")
+        )
+        with self._lock:
+            stats = self.metrics.setdefault(name, CallStats())
+            stats.calls += 1
+            stats.errors += response is None or not response.ok
+            stats.retries += retries
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    def format_metrics(self) -> str:
+        with self._lock:
+            return "; ".join(
+                f"{name}: {s.calls} calls, avg {s.total_seconds / s.calls * 1000:.0f} ms, "
+                f"max {s.max_seconds * 1000:.0f} ms, {s.retries} retries, "
+                f"{s.errors} errors"
+                for name, s in sorted(self.metrics.items())
+            )
+
+
+_api_client: Optional[ApiClient] = None
+_api_client_pid: Optional[int] = None
+
+
+def get_api_client() -> ApiClient:
+    """The ApiClient of this process (forked processes get their own, as
+    pooled connections cannot be shared with the parent)."""
+    global _api_client, _api_client_pid
+    if _api_client is None or _api_client_pid != os.getpid():
+        _api_client = ApiClient()
+        _api_client_pid = os.getpid()
+    return _api_client
+
+
+def log_api_metrics(label: str = "API calls") -> None:
+    """Log the call counts and latencies recorded by the ApiClient."""
+    if _api_client is not None and _api_client_pid == os.getpid():
+        metrics = _api_client.format_metrics()
+        if metrics:
+            logging.info(f"{label}: {metrics}")
+
 
 def get_upload_urls(
     job_id: str, file_name: str, size: int, api_base_url: Optional[str] = None
@@ -34,8 +230,11 @@ def get_upload_urls(
         Tuple of (upload_url, download_url)
     """
     base_url = api_base_url or DEFAULT_API_BASE_URL
-    response = requests.post(
+    response = get_api_client().request(
+        "get_upload_urls",
+        "POST",
         f"{base_url}/jobs/{job_id}/upload-url",
+        idempotent=True,
         headers={"Content-Type": "application/json"},
         json={"fileName": file_name, "size": size},
     )
@@ -47,27 +246,219 @@ def get_upload_urls(
     return result["uploadUrl"], result["downloadUrl"]
 
 
+def guess_content_type(file_name: str) -> str:
+    """Content type of an output file, from its extension."""
+    for suffix, content_type in CONTENT_TYPES.items():
+        if file_name.endswith(suffix):
+            return content_type
+    return mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+
 def upload_job_output(
-    filename: str, job_id: str, api_base_url: Optional[str] = None
+    filename: str,
+    job_id: str,
+    api_base_url: Optional[str] = None,
+    content_type: Optional[str] = None,
 ) -> str:
     """Upload data to storage and return the URL.
 
+    The file is streamed from disk. Files of at least MULTIPART_THRESHOLD
+    bytes are uploaded in parts, in parallel, if the job manager supports
+    multipart uploads (see upload_job_output_multipart), and with a single
+    PUT otherwise.
+
     Args:
         filename: Path to the file to upload
         job_id: ID of the job
         api_base_url: Optional API base URL override
+        content_type: Content type (default: guessed from the file name)
 
     Returns:
         Download URL for the uploaded data
     """
+    file_base_name = os.path.basename(filename)
+    content_type = content_type or guess_content_type(file_base_name)
+    size = os.path.getsize(filename)
+
+    if size >= MULTIPART_THRESHOLD:
+        try:
+            return upload_job_output_multipart(
+                filename,
+                job_id,
+                api_base_url=api_base_url,
+                content_type=content_type,
+            )
+        except MultipartUploadNotSupported:
+            logging.info("Multipart uploads not supported, uploading in one request")
+
+    upload_url, download_url = get_upload_urls(
+        job_id, file_base_name, size, api_base_url=api_base_url
+    )
+
     with open(filename, "rb") as f:
-        data_bytes = f.read()
+        response = get_api_client().request(
+            "upload",
+            "PUT",
+            upload_url,
+            data=f,
+            headers={"Content-Type": content_type, "Content-Length": str(size)},
+        )
+
+    if not response.ok:
+        raise requests.RequestException("Failed to upload data")
+
+    return download_url
 
+
+class MultipartUploadNotSupported(Exception):
+    pass
+
+
+def upload_job_output_multipart(
+    filename: str,
+    job_id: str,
+    api_base_url: Optional[str] = None,
+    content_type: Optional[str] = None,
+    part_size: int = MULTIPART_PART_SIZE,
+    max_workers: int = MULTIPART_MAX_WORKERS,
+) -> str:
+    """Upload a file in parts, in parallel, and return the download URL.
+
+    Uses the multipart endpoints of the job manager:
+    POST /jobs/{id}/multipart-upload with the file name, size, part size and
+    content type returns an uploadId, one signed URL per part (partUrls) and
+    the downloadUrl (and possibly a different partSize). Each part is PUT to
+    its URL, retried on its own, and the ETags of the parts are sent to
+    POST /jobs/{id}/multipart-upload/complete. At most max_workers parts
+    are read from disk at a time, streamed in small blocks.
+
+    Args:
+        filename: Path to the file to upload
+        job_id: ID of the job
+        api_base_url: Optional API base URL override
+        content_type: Content type (default: guessed from the file name)
+        part_size: Requested size of the parts in bytes
+        max_workers: Number of parts uploaded at the same time
+
+    Returns:
+        Download URL for the uploaded data
+
+    Raises:
+        MultipartUploadNotSupported: If the job manager has no multipart
+            endpoints
+    """
+    base_url = api_base_url or DEFAULT_API_BASE_URL
     file_base_name = os.path.basename(filename)
+    content_type = content_type or guess_content_type(file_base_name)
+    size = os.path.getsize(filename)
 
-    return upload_job_output_bytes(
-        data_bytes, file_base_name, job_id, api_base_url=api_base_url
+    response = get_api_client().request(
+        "start_multipart_upload",
+        "POST",
+        f"{base_url}/jobs/{job_id}/multipart-upload",
+        headers={"Content-Type": "application/json"},
+        json={
+            "fileName": file_base_name,
+            "size": size,
+            "partSize": part_size,
+            "contentType": content_type,
+        },
     )
+    if response.status_code in (404, 405, 501):
+        raise MultipartUploadNotSupported()
+    if not response.ok:
+        raise requests.RequestException("Failed to start multipart upload")
+    result = response.json()
+    upload_id = result["uploadId"]
+    part_urls: List[str] = result["partUrls"]
+    part_size = result.get("partSize", part_size)
+    if len(part_urls) != max(1, -(-size // part_size)):
+        raise requests.RequestException("Unexpected number of part URLs")
+
+    def upload_part(part_number: int) -> Dict[str, Any]:
+        offset = (part_number - 1) * part_size
+        length = min(part_size, size - offset)
+        # each part is retried on its own by the ApiClient
+        with open(filename, "rb") as f:
+            part_response = get_api_client().request(
+                "upload_part",
+                "PUT",
+                part_urls[part_number - 1],
+                data=_FilePart(f, offset, length),
+                headers={"Content-Length": str(length)},
+            )
+        part_response.raise_for_status()
+        etag = part_response.headers.get("ETag", "")
+        return {"partNumber": part_number, "etag": etag}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(upload_part, range(1, len(part_urls) + 1)))
+        response = get_api_client().request(
+            "complete_multipart_upload",
+            "POST",
+            f"{base_url}/jobs/{job_id}/multipart-upload/complete",
+            idempotent=True,
+            headers={"Content-Type": "application/json"},
+            json={"fileName": file_base_name, "uploadId": upload_id, "parts": parts},
+        )
+        if not response.ok:
+            raise requests.RequestException("Failed to complete multipart upload")
+    except Exception:
+        # let the storage discard the uploaded parts
+        try:
+            get_api_client().request(
+                "abort_multipart_upload",
+                "POST",
+                f"{base_url}/jobs/{job_id}/multipart-upload/abort",
+                idempotent=True,
+                headers={"Content-Type": "application/json"},
+                json={"fileName": file_base_name, "uploadId": upload_id},
+            )
+        except requests.RequestException:
+            pass
+        raise
+
+    return result["downloadUrl"]
+
+
+class _FilePart(io.RawIOBase):
+    """Read-only view of length bytes of a file starting at offset, which
+    requests streams as a request body."""
+
+    def __init__(self, f: BinaryIO, offset: int, length: int):
+        self._f = f
+        self._offset = offset
+        self.len = length
+        self._pos = 0
+        self._f.seek(offset)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.len
+        self._pos = min(max(pos, 0), self.len)
+        self._f.seek(self._offset + self._pos)
+        return self._pos
+
+    def readinto(self, b: Any) -> int:
+        n = min(len(b), self.len - self._pos)
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        b[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
 
 
 def upload_job_output_json(
@@ -75,7 +466,11 @@ def upload_job_output_json(
 ) -> str:
     data_bytes = json.dumps(data).encode("utf-8")
     return upload_job_output_bytes(
-        data_bytes, file_base_name, job_id, api_base_url=api_base_url
+        data_bytes,
+        file_base_name,
+        job_id,
+        api_base_url=api_base_url,
+        content_type="application/json",
     )
 
 
@@ -84,6 +479,7 @@ def upload_job_output_bytes(
     file_base_name: str,
     job_id: str,
     api_base_url: Optional[str] = None,
+    content_type: Optional[str] = None,
 ) -> str:
     size = len(data_bytes)
 
@@ -91,8 +487,12 @@ def upload_job_output_bytes(
         job_id, file_base_name, size, api_base_url=api_base_url
     )
 
-    response = requests.put(
-        upload_url, data=data_bytes, headers={"Content-Type": "application/json"}
+    response = get_api_client().request(
+        "upload",
+        "PUT",
+        upload_url,
+        data=data_bytes,
+        headers={"Content-Type": content_type or guess_content_type(file_base_name)},
     )
 
     if not response.ok:
@@ -113,8 +513,11 @@ def get_job(job_id: str, api_base_url: str | None = None) -> Dict[str, Any]:
     """
     base_url = api_base_url or DEFAULT_API_BASE_URL
     try:
-        response = requests.get(
-            f"{base_url}/jobs/{job_id}", headers={"Content-Type": "application/json"}
+        response = get_api_client().request(
+            "get_job",
+            "GET",
+            f"{base_url}/jobs/{job_id}",
+            headers={"Content-Type": "application/json"},
         )
         response.raise_for_status()
         return response.json()
@@ -135,17 +538,192 @@ def update_job_status(
     """
     base_url = api_base_url or DEFAULT_API_BASE_URL
     try:
-        response = requests.patch(
+        # the updates set fields to values, so repeating them is harmless
+        response = get_api_client().request(
+            "update_job_status",
+            "PATCH",
             f"{base_url}/jobs/{job_id}",
+            idempotent=True,
             headers={"Content-Type": "application/json"},
             json=updates,
         )
+        status = updates.get("status")
+        if response.status_code == 400 and status in TERMINAL_JOB_STATUSES:
+            # if the response to an earlier attempt was lost, the job already
+            # has this status and the retry is rejected as a transition
+            if get_job(job_id, api_base_url=api_base_url)["status"] == status:
+                return
         response.raise_for_status()
     except Exception as e:
         logging.error(f"Error updating job {job_id}: {e}")
         raise
 
 
+def mark_job_running(
+    job: Dict[str, Any], progress: float, api_base_url: str | None = None
+) -> None:
+    """Set a job running with its initial progress.
+
+    Jobs claimed by a worker are already running, so only their progress is
+    updated.
+
+    Args:
+        job: The job dictionary
+        progress: Initial progress of the job
+        api_base_url: Optional API base URL override
+    """
+    updates: Dict[str, Any] = {"progress": progress}
+    if job.get("status") != "running":
+        updates["status"] = "running"
+    kwargs = {"api_base_url": api_base_url} if api_base_url else {}
+    update_job_status(job["_id"], updates, **kwargs)
+
+
+def claim_job(
+    job_types: List[str],
+    worker_id: str,
+    wait: float = 0,
+    api_base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Claim the oldest pending job of the given types, marking it running.
+
+    Args:
+        job_types: Job types the worker can process
+        worker_id: Identifier of the worker, recorded on the job
+        wait: Seconds the job manager waits for a job before returning none
+        api_base_url: Optional API base URL override
+        api_key: Worker API key (default: $NEUROSIFT_WORKER_API_KEY)
+
+    Returns:
+        The claimed job, or None if no job became available
+    """
+    base_url = api_base_url or DEFAULT_API_BASE_URL
+    api_key = api_key or os.getenv("NEUROSIFT_WORKER_API_KEY")
+    if not api_key:
+        raise ValueError("A worker API key is required to claim jobs")
+    # not retried: a claim whose response is lost would leave a job running
+    response = get_api_client().request(
+        "claim_job",
+        "POST",
+        f"{base_url}/jobs/claim",
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        },
+        json={"types": job_types, "workerId": worker_id, "wait": wait},
+        timeout=(API_CONNECT_TIMEOUT, wait + API_READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    if response.status_code == 204:
+        return None
+    return response.json()
+
+
+class ProgressReporter:
+    """Sends the progress of a job from a background thread.
+
+    update() only records the latest value, so processors can call it as
+    often as they like without waiting for the job manager. The thread sends
+    the latest value when it changes, at most once every min_interval
+    seconds, with an estimate of the remaining time from the progress made
+    so far. close() (or leaving a with block) sends the last value and stops
+    the thread, so it should be called before the job is completed or failed.
+
+    Example:
+        with ProgressReporter(job_id, api_base_url=api_base_url) as progress:
+            for i in range(n):
+                ...
+                progress.update(10 + 80 * (i + 1) / n)
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        api_base_url: Optional[str] = None,
+        min_interval: float = PROGRESS_MIN_INTERVAL,
+    ):
+        """
+        Args:
+            job_id: ID of the job
+            api_base_url: Optional API base URL override
+            min_interval: Minimum number of seconds between two updates sent
+        """
+        self.job_id = job_id
+        self.api_base_url = api_base_url
+        self.min_interval = min_interval
+        self._latest: Optional[float] = None
+        self._sent: Optional[float] = None
+        # time and progress of the first update, for the remaining time
+        self._first: Optional[Tuple[float, float]] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update(self, progress: float) -> None:
+        """Record the progress of the job, in percent."""
+        progress = min(max(float(progress), 0.0), 100.0)
+        with self._cond:
+            if self._first is None:
+                self._first = (time.monotonic(), progress)
+            self._latest = progress
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Send the last recorded progress and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __enter__(self) -> "ProgressReporter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        last_send = -float("inf")
+        while True:
+            with self._cond:
+                while self._latest == self._sent and not self._closed:
+                    self._cond.wait()
+                # coalesce the updates made until the next send is due
+                while not self._closed:
+                    remaining = last_send + self.min_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._latest == self._sent:
+                    return
+                progress = self._latest
+                eta = self._eta(progress)
+            self._send(progress, eta)
+            self._sent = progress
+            last_send = time.monotonic()
+
+    def _eta(self, progress: Optional[float]) -> Optional[float]:
+        if progress is None or self._first is None or progress >= 100:
+            return None
+        start_time, start_progress = self._first
+        if progress <= start_progress:
+            return None
+        elapsed = time.monotonic() - start_time
+        return elapsed * (100 - progress) / (progress - start_progress)
+
+    def _send(self, progress: Optional[float], eta: Optional[float]) -> None:
+        updates: Dict[str, Any] = {"progress": round(progress or 0, 1)}
+        if eta is not None:
+            updates["etaSec"] = round(eta)
+        kwargs = {"api_base_url": self.api_base_url} if self.api_base_url else {}
+        try:
+            update_job_status(self.job_id, updates, **kwargs)
+        except Exception:
+            # logged by update_job_status; progress is best effort
+            pass
+
+
 class InputFile(BaseModel):
     name: str
     url: str
@@ -162,6 +740,10 @@ class OutputFile(BaseModel):
     api_base_url: Optional[str] = None
     output_url: Optional[str] = None
 
+    def progress_reporter(self, **kwargs: Any) -> ProgressReporter:
+        """A ProgressReporter for the job of this output."""
+        return ProgressReporter(self.job_id, api_base_url=self.api_base_url, **kwargs)
+
     def upload(self, fname: str, delete_local_file: bool = True):
         logging.info(f"Uploading output file {fname}")
         kwargs = {"api_base_url": self.api_base_url} if self.api_base_url else {}
@@ -17,6 +17,8 @@ class MultiscaleSpikeDensityProcessor:
     description = "Compute a multiscale spike density matrix from spike trains"
     label = "multiscale_spike_density"
     attributes = {}
+    # bump when the output changes, so cached results are not reused
+    version = "1"
 
     @staticmethod
     def run(context: MultiscaleSpikeDensityContext):
@@ -76,10 +78,12 @@ class MultiscaleSpikeDensityProcessor:
 
         # bin the spikes
         spike_counts = np.zeros((num_bins, num_units), dtype=np.int32)
-        for i in range(num_units):
-            spike_counts[:, i], _ = np.histogram(
-                spike_trains[i], bins=num_bins, range=(start_time_sec, end_time_sec)
-            )
+        with context.output.progress_reporter() as progress:
+            for i in range(num_units):
+                spike_counts[:, i], _ = np.histogram(
+                    spike_trains[i], bins=num_bins, range=(start_time_sec, end_time_sec)
+                )
+                progress.update(10 + 70 * (i + 1) / num_units)
 
         output_fname = "output.lindi.tar"
         g = lindi.LindiH5pyFile.from_lindi_file(output_fname, mode="w")
@@ -25,6 +25,8 @@ class RastermapProcessor:
     description = "Compute the sorting order of units using Rastermap"
     label = "rastermap"
     attributes = {}
+    # bump when the output changes, so cached results are not reused
+    version = "1"
 
     @staticmethod
     def run(context: RastermapContext):
@@ -90,25 +92,29 @@ class RastermapProcessor:
         num_bins = int((end_time_sec - start_time_sec) / bin_size_sec)
         print(f"Number of bins: {num_bins}")
 
-        print("Binning spikes...")
-        spike_counts = np.zeros((num_bins, num_units), dtype=np.int32)
-        for i in range(num_units):
-            spike_counts[:, i], _ = np.histogram(
-                spike_trains[i], bins=num_bins, range=(start_time_sec, end_time_sec)
-            )
-
-        print("Z-scoring the spike counts...")
-        spks = spike_counts.T
-        spks = zscore(spks, axis=1)
-
-        print("Running Rastermap...")
-        model = Rastermap(
-            n_clusters=n_clusters if n_clusters > 0 else None,  # type: ignore
-            n_PCs=n_PCs,
-            locality=locality,
-            grid_upsample=grid_upsample,
-        ).fit(spks)
-        print("Done with Rastermap")
+        with context.output.progress_reporter() as progress:
+            print("Binning spikes...")
+            spike_counts = np.zeros((num_bins, num_units), dtype=np.int32)
+            for i in range(num_units):
+                spike_counts[:, i], _ = np.histogram(
+                    spike_trains[i], bins=num_bins, range=(start_time_sec, end_time_sec)
+                )
+                progress.update(10 + 30 * (i + 1) / num_units)
+
+            print("Z-scoring the spike counts...")
+            spks = spike_counts.T
+            spks = zscore(spks, axis=1)
+            progress.update(45)
+
+            print("Running Rastermap...")
+            model = Rastermap(
+                n_clusters=n_clusters if n_clusters > 0 else None,  # type: ignore
+                n_PCs=n_PCs,
+                locality=locality,
+                grid_upsample=grid_upsample,
+            ).fit(spks)
+            print("Done with Rastermap")
+            progress.update(85)
 
         isort = model.isort
         print("isort:", isort)
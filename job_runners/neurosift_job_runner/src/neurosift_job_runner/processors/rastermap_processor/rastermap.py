@@ -2,7 +2,12 @@ from typing import Any, Dict
 import os
 import json
 import logging
-from ...job_utils import update_job_status, InputFile, OutputFile
+from ...job_utils import mark_job_running, update_job_status, InputFile, OutputFile
+from ...result_cache import (
+    complete_job_from_cache,
+    get_result_cache_key,
+    store_job_result,
+)
 from .RastermapProcessor import RastermapProcessor, RastermapContext
 
 
@@ -16,7 +21,7 @@ def process_rastermap_job(job: Dict[str, Any], api_base_url: str | None = None)
     kwargs = {"api_base_url": api_base_url} if api_base_url else {}
 
     try:
-        update_job_status(job["_id"], {"status": "running", "progress": 5}, **kwargs)
+        mark_job_running(job, 5, api_base_url=api_base_url)
 
         # Get input parameters
         input_data = json.loads(job["input"])
@@ -27,6 +32,10 @@ def process_rastermap_job(job: Dict[str, Any], api_base_url: str | None = None)
         locality = input_data.get("locality")
         grid_upsample = input_data.get("grid_upsample")
 
+        cache_key = get_result_cache_key(job, RastermapProcessor.version, nwb_url)
+        if complete_job_from_cache(job, cache_key, api_base_url=api_base_url):
+            return
+
         input_file = InputFile(name="input", url=nwb_url, file_base_name="file.nwb")
         output_file = OutputFile(
             name="output",
@@ -47,15 +56,13 @@ def process_rastermap_job(job: Dict[str, Any], api_base_url: str | None = None)
 
         update_job_status(job["_id"], {"progress": 10}, **kwargs)
         RastermapProcessor.run(context)
+        output = json.dumps({"output_url": output_file.output_url})
         update_job_status(
             job["_id"],
-            {
-                "progress": 100,
-                "status": "completed",
-                "output": json.dumps({"output_url": output_file.output_url}),
-            },
+            {"progress": 100, "status": "completed", "output": output},
             **kwargs,
         )
+        store_job_result(job, cache_key, output)
 
         logging.info("Job completed successfully")
 
@@ -2,7 +2,7 @@ from typing import Any, Dict
 import requests
 import json
 import logging
-from ...job_utils import update_job_status, upload_job_output_json
+from ...job_utils import mark_job_running, update_job_status, upload_job_output_json
 
 
 def process_text_letter_count_job(
@@ -29,7 +29,7 @@ def process_text_letter_count_job(
         text = response.text
 
         # Update progress
-        update_job_status(job["_id"], {"status": "running", "progress": 25}, **kwargs)
+        mark_job_running(job, 25, api_base_url=api_base_url)
         logging.info("Downloaded file and started processing")
 
         # Compute letter counts
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .job_utils import get_api_client, update_job_status
+
+# Index of the outputs of completed jobs, shared by the runners on this machine
+RESULT_CACHE_DIR = os.getenv(
+    "NEUROSIFT_RESULT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "neurosift-job-runner"),
+)
+# Set NEUROSIFT_RESULT_CACHE=0 to always recompute
+RESULT_CACHE_ENABLED = os.getenv("NEUROSIFT_RESULT_CACHE", "1") != "0"
+# Seconds an output is reused after the job that computed it
+RESULT_CACHE_TTL = float(os.getenv("NEUROSIFT_RESULT_CACHE_TTL", 7 * 24 * 3600))
+# Maximum number of entries, the least recently used are evicted first
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("NEUROSIFT_RESULT_CACHE_MAX_ENTRIES", 10000))
+
+
+def normalize_job_input(input_json: str) -> str:
+    """Serialize a job input with sorted keys and no whitespace, so that
+    inputs differing only in formatting get the same cache key."""
+    return json.dumps(json.loads(input_json), sort_keys=True, separators=(",", ":"))
+
+
+def get_input_file_fingerprint(url: str) -> Optional[Dict[str, Any]]:
+    """Identify the current contents of a remote input file.
+
+    Args:
+        url: URL of the input file
+
+    Returns:
+        The ETag, size and modification time of the file from a HEAD
+        request, or None if the server reports neither an ETag nor a
+        modification time (the size alone does not identify the contents)
+    """
+    try:
+        response = get_api_client().request(
+            "input_head", "HEAD", url, allow_redirects=True
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logging.warning(f"Unable to get the ETag and size of {url}: {e}")
+        return None
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return None
+    size = response.headers.get("Content-Length")
+    return {
+        "etag": etag,
+        "size": int(size) if size else None,
+        "last_modified": last_modified,
+    }
+
+
+def get_result_cache_key(
+    job: Dict[str, Any], processor_version: str, input_url: str
+) -> Optional[str]:
+    """Derive the cache key of a job.
+
+    Args:
+        job: The job dictionary
+        processor_version: Version of the processor of the job type
+        input_url: URL of the input file the job reads
+
+    Returns:
+        A hash of the job type, normalized input, processor version and input
+        file fingerprint, or None if the job cannot be cached
+    """
+    if not RESULT_CACHE_ENABLED:
+        return None
+    fingerprint = get_input_file_fingerprint(input_url)
+    if fingerprint is None:
+        return None
+    key = json.dumps(
+        {
+            "type": job["type"],
+            "input": normalize_job_input(job["input"]),
+            "processor_version": processor_version,
+            "input_file": fingerprint,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ResultCache:
+    """An SQLite index from cache keys to job outputs.
+
+    Entries expire ttl seconds after they are stored, and the least recently
+    used entries are evicted beyond max_entries. Outputs themselves stay on
+    the output storage; only their URLs are kept. Lookups recorded with
+    record_lookup() give the hit rate across processes and runs.
+    """
+
+    def __init__(
+        self,
+        directory: str = RESULT_CACHE_DIR,
+        *,
+        ttl: float = RESULT_CACHE_TTL,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+    ):
+        """
+        Args:
+            directory: Directory of the index database
+            ttl: Seconds an entry is valid after it is stored
+            max_entries: Maximum number of entries kept
+        """
+        self.path = os.path.join(directory, "results.sqlite")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                "job_type TEXT, output TEXT, created REAL, last_used REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, "
+                "value INTEGER)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # a connection per operation, as forked job processes share the index
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        """The output stored for a key, or None if it is missing or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT output FROM results WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, job_type: str, output: str) -> None:
+        """Store the output of a job, evicting expired and excess entries."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, job_type, output, now, now),
+            )
+            conn.execute("DELETE FROM results WHERE created <= ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM results "
+                "ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def record_lookup(self, hit: bool) -> None:
+        """Count a lookup for the hit rate."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO stats VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                ("hits" if hit else "misses",),
+            )
+
+    def discard(self, key: str) -> None:
+        """Remove an entry whose output is no longer available."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM stats")
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of entries, hits and misses, and the hit rate."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            (entries,) = conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        hits = counts.get("hits", 0)
+        misses = counts.get("misses", 0)
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+
+
+def format_result_cache_stats(stats: Dict[str, Any]) -> str:
+    """Summarize the statistics of a ResultCache in one line."""
+    rate = stats["hit_rate"]
+    return (
+        f"{stats['hits']} hits, {stats['misses']} misses"
+        + (f" (hit rate {rate:.0%})" if rate is not None else "")
+        + f", {stats['entries']} entries"
+    )
+
+
+def log_result_cache_stats(label: str = "Result cache") -> None:
+    """Log the hit rate of the result cache, if it is enabled."""
+    if not RESULT_CACHE_ENABLED:
+        return
+    try:
+        stats = ResultCache().stats()
+    except Exception as e:
+        logging.warning(f"Unable to read the result cache: {e}")
+        return
+    if stats["hits"] + stats["misses"] == 0:
+        return
+    logging.info(f"{label}: {format_result_cache_stats(stats)}")
+
+
+def _output_available(output: str) -> bool:
+    try:
+        url = json.loads(output)["output_url"]
+        response = get_api_client().request(
+            "cached_output_head", "HEAD", url, allow_redirects=True
+        )
+    except Exception:
+        return False
+    return response.ok
+
+
+def complete_job_from_cache(
+    job: Dict[str, Any], cache_key: Optional[str], api_base_url: Optional[str] = None
+) -> bool:
+    """Complete a job with the output of an identical earlier job.
+
+    Args:
+        job: The job dictionary
+        cache_key: Key from get_result_cache_key (None to skip the cache)
+        api_base_url: Optional API base URL override
+
+    Returns:
+        True if the job was completed from the cache
+    """
+    if cache_key is None:
+        return False
+    try:
+        cache = ResultCache()
+        output = cache.get(cache_key)
+        if output is not None and not _output_available(output):
+            logging.info(f"Cached output of job {job['_id']} is gone, recomputing")
+            cache.discard(cache_key)
+            output = None
+        cache.record_lookup(output is not None)
+    except Exception as e:
+        logging.warning(f"Unable to read the result cache: {e}")
+        return False
+    if output is None:
+        return False
+    kwargs = {"api_base_url": api_base_url} if api_base_url else {}
+    update_job_status(
+        job["_id"],
+        {"progress": 100, "status": "completed", "output": output},
+        **kwargs,
+    )
+    logging.info(f"Job {job['_id']} completed from the result cache")
+    return True
+
+
+def store_job_result(
+    job: Dict[str, Any], cache_key: Optional[str], output: str
+) -> None:
+    """Record the output of a completed job for later identical jobs.
+
+    Args:
+        job: The job dictionary
+        cache_key: Key from get_result_cache_key (None to skip the cache)
+        output: The output the job was completed with
+    """
+    if cache_key is None:
+        return
+    try:
+        ResultCache().put(cache_key, job["type"], output)
+    except Exception as e:
+        logging.warning(f"Unable to store the result of job {job['_id']}: {e}")
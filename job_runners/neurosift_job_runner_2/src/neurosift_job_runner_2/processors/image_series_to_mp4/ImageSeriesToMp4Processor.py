@@ -1,5 +1,6 @@
 import time
 import json
+from typing import Callable, Optional
 import numpy as np
 from pydantic import BaseModel, Field
 from ...job_utils import InputFile, OutputFile
@@ -21,6 +22,8 @@ class ImageSeriesToMp4Processor:
     description = "Convert an image series in an NWB file to an MP4 video"
     label = "image_series_to_mp4"
     attributes = {}
+    # bump when the output changes, so cached results are not reused
+    version = "1"
 
     @staticmethod
     def run(context: ImageSeriesToMp4Context):
@@ -49,14 +52,27 @@ class ImageSeriesToMp4Processor:
         num_frames = min(max_num_frames, data.shape[0])  # type: ignore
 
         output_fname = "output.mp4"
-        data_to_mp4(data, output_fname, sample_rate, num_frames)
+        with context.output.progress_reporter() as progress:
+            data_to_mp4(
+                data,
+                output_fname,
+                sample_rate,
+                num_frames,
+                on_progress=lambda p: progress.update(10 + 80 * p),
+            )
 
         f.close()
 
         context.output.upload(output_fname)
 
 
-def data_to_mp4(data, output_fname, sample_rate_hz: float, num_frames: int):
+def data_to_mp4(
+    data,
+    output_fname,
+    sample_rate_hz: float,
+    num_frames: int,
+    on_progress: Optional[Callable[[float], None]] = None,
+):
     import cv2
 
     # get width, height and num_frames
@@ -89,6 +105,8 @@ def data_to_mp4(data, output_fname, sample_rate_hz: float, num_frames: int):
         X = np.clip(X, 0, 255)
         X = X.astype(np.uint8)
         out.write(X)
+        if on_progress is not None:
+            on_progress((i + 1) / num_frames)
 
     out.release()
 
@@ -4,14 +4,20 @@ import sys
 
 from .job_utils import get_job, update_job_status
 
+# Modules used by the processor of each job type when it runs, which the
+# worker imports upfront (relative names are within this package)
+JOB_TYPE_PRELOAD_MODULES = {
+    "mountainsort5": [".processors.mountainsort5_processor.run_mountainsort5"],
+}
+
 
 # Lazy imports for job processors to avoid loading all dependencies upfront
 def get_job_processor(job_type: str):
     """Dynamically import and return the appropriate job processor."""
-    if job_type == "image_series_to_mp4":
-        from .processors.image_series_to_mp4 import process_image_series_to_mp4_job
+    if job_type == "mountainsort5":
+        from .processors.mountainsort5_processor import process_mountainsort5_job
 
-        return process_image_series_to_mp4_job
+        return process_mountainsort5_job
     else:
         raise ValueError(f"Unknown job type: {job_type}")
 
@@ -25,14 +25,17 @@ class Mountainsort5Processor:
     def run(context: Mountainsort5Context):
         from .run_mountainsort5 import run_mountainsort5
 
-        output_json = run_mountainsort5(
-            zarr_url=context.zarrUrl,
-            ecephys_path=context.ecephysPath,
-            start_time=context.startTime,
-            end_time=context.endTime,
-            channels_string=context.channelString,
-            detect_threshold=context.detectThreshold,
-        )
+        # loading the recording takes up to 40%, sorting the rest
+        with context.output.progress_reporter() as progress:
+            output_json = run_mountainsort5(
+                zarr_url=context.zarrUrl,
+                ecephys_path=context.ecephysPath,
+                start_time=context.startTime,
+                end_time=context.endTime,
+                channels_string=context.channelString,
+                detect_threshold=context.detectThreshold,
+                on_progress=lambda p: progress.update(10 + 30 * p),
+            )
 
         with open("_mountainsort5_output.json", "w") as f:
             json.dump(output_json, f)
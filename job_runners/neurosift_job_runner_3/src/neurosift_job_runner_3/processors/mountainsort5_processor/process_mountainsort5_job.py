@@ -1,7 +1,7 @@
 from typing import Any, Dict
 import json
 import logging
-from ...job_utils import update_job_status, OutputFile
+from ...job_utils import mark_job_running, update_job_status, OutputFile
 from .Mountainsort5Processor import (
     Mountainsort5Processor,
     Mountainsort5Context,
@@ -20,7 +20,7 @@ def process_mountainsort5_job(
     kwargs = {"api_base_url": api_base_url} if api_base_url else {}
 
     try:
-        update_job_status(job["_id"], {"status": "running", "progress": 5}, **kwargs)
+        mark_job_running(job, 5, api_base_url=api_base_url)
 
         # Get input parameters
         input_data = json.loads(job["input"])
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import time
@@ -104,7 +104,13 @@ def run_mountainsort5(
     end_time: float,
     channels_string: str,
     detect_threshold: float,
+    on_progress: Optional[Callable[[float], None]] = None,
 ):
+    """Load a segment of a recording and spike sort it with Mountainsort5.
+
+    on_progress, if given, is called with the fraction of the recording
+    loaded after each segment.
+    """
     if channels_string != "*":
         raise ValueError("Mountainsort5 processor only supports '*' for channel_string")
     detect_channel_radius = 100
@@ -220,6 +226,8 @@ def run_mountainsort5(
             print(
                 f"  Progress: {progress:.1f}% ({current_sample - start_sample + data.shape[0]}/{total_samples} samples)"
             )
+            if on_progress is not None:
+                on_progress(progress / 100)
 
             current_sample = current_sample_end
             segment_num += 1
@@ -0,0 +1,226 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from multiprocessing.connection import wait as wait_for_processes
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from .core import JOB_TYPE_PRELOAD_MODULES, get_job_processor
+from .job_utils import claim_job, get_job, log_api_metrics, update_job_status
+from .result_cache import log_result_cache_stats
+
+
+def preload_job_processors(job_types: List[str]) -> List[str]:
+    """Import the processors of job types and the modules they use.
+
+    Args:
+        job_types: Job types to prepare
+
+    Returns:
+        The job types whose processor and modules could be imported
+    """
+    loaded = []
+    for job_type in job_types:
+        try:
+            get_job_processor(job_type)
+            for module in JOB_TYPE_PRELOAD_MODULES.get(job_type, []):
+                importlib.import_module(module, package=__package__)
+        except (ImportError, ValueError) as e:
+            # missing dependencies, or a job type this runner does not know
+            logging.warning(f"Not processing {job_type} jobs: {e}")
+            continue
+        loaded.append(job_type)
+    return loaded
+
+
+class Worker:
+    """Claims pending jobs from the job manager and processes them.
+
+    Processors and their dependencies are imported once, before the first
+    claim. Each job then runs in a child process forked from the worker (so
+    it starts with everything imported) in its own temporary directory, with
+    up to `concurrency` jobs at a time. Claims are long polls: the job
+    manager answers as soon as a job is pending, or after `wait` seconds.
+
+    The first SIGINT or SIGTERM stops claiming and lets running jobs finish;
+    a second one terminates them and marks them failed.
+    """
+
+    def __init__(
+        self,
+        job_types: List[str],
+        *,
+        concurrency: int = 1,
+        wait: float = 20,
+        max_jobs: int = 0,
+        api_base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        worker_id: Optional[str] = None,
+    ):
+        """
+        Args:
+            job_types: Job types to claim
+            concurrency: Maximum number of jobs run at a time
+            wait: Seconds each claim request waits for a pending job
+            max_jobs: Stop after claiming this many jobs (0 for no limit)
+            api_base_url: Optional API base URL override
+            api_key: Worker API key (default: $NEUROSIFT_WORKER_API_KEY)
+            worker_id: Identifier recorded on claimed jobs (default: host:pid)
+        """
+        self.job_types = job_types
+        self.concurrency = concurrency
+        self.wait = wait
+        self.max_jobs = max_jobs
+        self.api_base_url = api_base_url
+        self.api_key = api_key
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.num_claimed = 0
+        self._running: Dict[Any, Dict[str, Any]] = {}
+        self._stop_requests = 0
+        # fork so that jobs start with the processors already imported
+        start_methods = multiprocessing.get_all_start_methods()
+        self._mp = multiprocessing.get_context(
+            "fork" if "fork" in start_methods else "spawn"
+        )
+
+    def run(self) -> None:
+        """Claim and process jobs until stopped or max_jobs are claimed."""
+        signal.signal(signal.SIGINT, self._handle_stop_signal)
+        signal.signal(signal.SIGTERM, self._handle_stop_signal)
+        logging.info(
+            f"Worker {self.worker_id} processing {', '.join(self.job_types)} "
+            f"jobs, {self.concurrency} at a time"
+        )
+        failures = 0
+        while True:
+            self._reap()
+            if self._stop_requests > 1:
+                self._terminate_running()
+                break
+            if self._stop_requests or (
+                self.max_jobs and self.num_claimed >= self.max_jobs
+            ):
+                if not self._running:
+                    break
+                wait_for_processes(list(self._running), timeout=1)
+                continue
+            if len(self._running) >= self.concurrency:
+                wait_for_processes(list(self._running), timeout=1)
+                continue
+            try:
+                job = claim_job(
+                    self.job_types,
+                    self.worker_id,
+                    wait=self.wait,
+                    api_base_url=self.api_base_url,
+                    api_key=self.api_key,
+                )
+                failures = 0
+            except requests.RequestException as e:
+                # back off while the job manager is unreachable
+                failures += 1
+                delay = min(2**failures, 60)
+                logging.warning(f"Error claiming a job, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                continue
+            if job is not None:
+                self._start(job)
+        log_api_metrics(f"API calls of worker {self.worker_id}")
+        log_result_cache_stats()
+        logging.info(f"Worker {self.worker_id} stopped")
+
+    def _start(self, job: Dict[str, Any]) -> None:
+        self.num_claimed += 1
+        queued = _seconds_since(job.get("createdAt"))
+        logging.info(
+            f"Claimed job {job['_id']} of type {job['type']}"
+            + (f" (queued for {queued:.1f}s)" if queued is not None else "")
+        )
+        process = self._mp.Process(
+            target=_process_claimed_job,
+            args=(job, self.api_base_url),
+            name=f"job-{job['_id']}",
+        )
+        process.start()
+        self._running[process.sentinel] = {"job": job, "process": process}
+
+    def _reap(self) -> None:
+        for sentinel, entry in list(self._running.items()):
+            process = entry["process"]
+            if process.is_alive():
+                continue
+            process.join()
+            del self._running[sentinel]
+            job = entry["job"]
+            if process.exitcode == 0:
+                logging.info(f"Finished job {job['_id']}")
+            else:
+                self._fail_if_running(
+                    job, f"Job process exited with code {process.exitcode}"
+                )
+
+    def _terminate_running(self) -> None:
+        for entry in self._running.values():
+            entry["process"].terminate()
+        for entry in self._running.values():
+            entry["process"].join()
+            self._fail_if_running(entry["job"], "Worker was stopped")
+        self._running.clear()
+
+    def _fail_if_running(self, job: Dict[str, Any], error: str) -> None:
+        """Mark a job failed unless its processor already completed or failed it."""
+        kwargs = {"api_base_url": self.api_base_url} if self.api_base_url else {}
+        try:
+            if get_job(job["_id"], **kwargs)["status"] != "running":
+                logging.info(f"Job {job['_id']} failed")
+                return
+            update_job_status(
+                job["_id"], {"status": "failed", "error": error}, **kwargs
+            )
+        except Exception as e:
+            logging.error(f"Unable to mark job {job['_id']} as failed: {e}")
+        logging.error(f"Job {job['_id']} failed: {error}")
+
+    def _handle_stop_signal(self, signum, frame) -> None:
+        self._stop_requests += 1
+        if self._stop_requests == 1:
+            logging.info(
+                "Stopping: no more jobs will be claimed, waiting for running "
+                "jobs (signal again to terminate them)"
+            )
+
+
+def _process_claimed_job(job: Dict[str, Any], api_base_url: Optional[str]) -> None:
+    """Entry point of the child process running one job."""
+    # the worker decides when running jobs are stopped
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    kwargs = {"api_base_url": api_base_url} if api_base_url else {}
+    # processors write their outputs to the working directory
+    with tempfile.TemporaryDirectory(prefix=f"job-{job['_id']}-") as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            get_job_processor(job["type"])(job, **kwargs)
+        except Exception:
+            # processors log their errors and mark their jobs failed
+            sys.exit(1)
+        finally:
+            log_api_metrics(f"API calls of job {job['_id']}")
+
+
+def _seconds_since(timestamp: Optional[str]) -> Optional[float]:
+    if not timestamp:
+        return None
+    try:
+        t = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (datetime.now(timezone.utc) - t).total_seconds()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# the runner packages, importable without installing them
+RUNNER_PACKAGES = [
+    "neurosift_job_runner",
+    "neurosift_job_runner_2",
+    "neurosift_job_runner_3",
+]
+RUNNER_SRC_DIRS = [os.path.join(HERE, "..", name, "src") for name in RUNNER_PACKAGES]
+for src_dir in RUNNER_SRC_DIRS:
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+sys.path.insert(0, HERE)
+
+from job_manager_stub import JobManagerStub  # noqa: E402
+
+
+@pytest.fixture
+def job_manager():
+    stub = JobManagerStub()
+    yield stub
+    stub.close()
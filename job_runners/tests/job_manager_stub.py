@@ -0,0 +1,258 @@
+"""A local stand-in for the job manager API, for testing the job runners.
+
+It keeps jobs and uploaded files in memory and implements the endpoints the
+runners use: jobs, claim, upload-url and the multipart upload endpoints,
+with the status transitions of the real job manager. Uploaded files are
+served back from /files/.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Same table as validateJobState in nextjs/job-manager/middleware/auth.ts
+VALID_TRANSITIONS = {
+    "pending": ["running"],
+    "running": ["completed", "failed"],
+    "completed": [],
+    "failed": [],
+}
+
+
+class JobManagerStub:
+    """An in-memory job manager served on a local port.
+
+    Args:
+        worker_api_key: Key expected by the claim endpoint
+        multipart: Whether the multipart upload endpoints are available
+            (otherwise they answer 501, like the real job manager)
+    """
+
+    def __init__(self, worker_api_key: str = "secret", multipart: bool = True):
+        self.worker_api_key = worker_api_key
+        self.multipart = multipart
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.content_types: Dict[str, Optional[str]] = {}
+        # extra headers of the GET and HEAD responses of files, by path
+        self.file_headers: Dict[str, Dict[str, str]] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.aborted_uploads: List[str] = []
+        # number of times the PUT of a part number fails with a 502
+        self.failing_parts: Dict[int, int] = {}
+        # number of PATCH requests applied without sending a response
+        self.lost_patch_responses = 0
+        # requests received, as (method, path)
+        self.requests: List[tuple] = []
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.stub = self  # type: ignore
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def api_base_url(self) -> str:
+        return f"{self.url}/api"
+
+    def add_job(self, job_type: str, input: Dict[str, Any]) -> str:
+        """Create a pending job and return its ID."""
+        job_id = uuid.uuid4().hex[:24]
+        created = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        with self.lock:
+            self.jobs[job_id] = {
+                "_id": job_id,
+                "type": job_type,
+                "input": json.dumps(input),
+                "status": "pending",
+                "progress": 0,
+                "createdAt": created,
+            }
+        return job_id
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def stub(self) -> JobManagerStub:
+        return self.server.stub  # type: ignore
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self) -> Dict[str, Any]:
+        return json.loads(self._body() or b"{}")
+
+    def _send(
+        self,
+        status: int,
+        body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        if body is None:
+            data, content_type = b"", "text/plain"
+        elif isinstance(body, bytes):
+            data, content_type = body, "application/octet-stream"
+        elif isinstance(body, str):
+            data, content_type = body.encode(), "text/plain"
+        else:
+            data, content_type = json.dumps(body).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self.stub.requests.append(("GET", self.path))
+        m = re.match(r"/api/jobs/(\w+)$", self.path)
+        if m:
+            job = self.stub.jobs.get(m.group(1))
+            return self._send(200, job) if job else self._send(404, "Job not found")
+        if self.path.startswith("/files/"):
+            path = self.path[len("/files/") :]
+            data = self.stub.files.get(path)
+            if data is None:
+                return self._send(404)
+            return self._send(200, data, headers=self.stub.file_headers.get(path))
+        self._send(404)
+
+    def do_HEAD(self) -> None:
+        self.stub.requests.append(("HEAD", self.path))
+        path = self.path[len("/files/") :]
+        data = self.stub.files.get(path)
+        self.send_response(200 if data is not None else 404)
+        self.send_header("Content-Length", str(len(data or b"")))
+        for name, value in self.stub.file_headers.get(path, {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        self.stub.requests.append(("POST", self.path))
+        body = self._json()
+        if self.path == "/api/jobs/claim":
+            return self._claim(body)
+        m = re.match(r"/api/jobs/(\w+)/upload-url$", self.path)
+        if m:
+            path = f"{m.group(1)}/{body['fileName']}"
+            return self._send(
+                200,
+                {
+                    "uploadUrl": f"{self.stub.url}/upload/{path}",
+                    "downloadUrl": f"{self.stub.url}/files/{path}",
+                },
+            )
+        m = re.match(r"/api/jobs/(\w+)/multipart-upload(/complete|/abort)?$", self.path)
+        if m:
+            if not self.stub.multipart:
+                return self._send(501, "Multipart uploads are not supported")
+            return self._multipart(m.group(1), m.group(2), body)
+        self._send(404)
+
+    def _claim(self, body: Dict[str, Any]) -> None:
+        if self.headers.get("Authorization") != f"Bearer {self.stub.worker_api_key}":
+            return self._send(401, "Unauthorized")
+        deadline = time.time() + min(float(body.get("wait") or 0), 20)
+        while True:
+            with self.stub.lock:
+                pending = [
+                    job
+                    for job in self.stub.jobs.values()
+                    if job["status"] == "pending" and job["type"] in body["types"]
+                ]
+                if pending:
+                    job = min(pending, key=lambda job: job["createdAt"])
+                    job.update(status="running", workerId=body["workerId"])
+                    return self._send(200, job)
+            if time.time() + 0.05 > deadline:
+                return self._send(204)
+            time.sleep(0.05)
+
+    def _multipart(
+        self, job_id: str, action: Optional[str], body: Dict[str, Any]
+    ) -> None:
+        path = f"{job_id}/{body['fileName']}"
+        if action is None:
+            num_parts = max(1, -(-body["size"] // body["partSize"]))
+            upload_id = uuid.uuid4().hex
+            self.stub.uploads[upload_id] = {}
+            part_urls = [
+                f"{self.stub.url}/parts/{upload_id}/{i + 1}" for i in range(num_parts)
+            ]
+            return self._send(
+                200,
+                {
+                    "uploadId": upload_id,
+                    "partUrls": part_urls,
+                    "downloadUrl": f"{self.stub.url}/files/{path}",
+                    "partSize": body["partSize"],
+                },
+            )
+        if action == "/complete":
+            parts = self.stub.uploads.pop(body["uploadId"])
+            numbers = [part["partNumber"] for part in body["parts"]]
+            if numbers != sorted(parts):
+                return self._send(400, "Missing parts")
+            self.stub.files[path] = b"".join(parts[i] for i in numbers)
+            return self._send(200, {})
+        self.stub.uploads.pop(body["uploadId"], None)
+        self.stub.aborted_uploads.append(body["uploadId"])
+        self._send(200, {})
+
+    def do_PUT(self) -> None:
+        self.stub.requests.append(("PUT", self.path))
+        data = self._body()
+        m = re.match(r"/parts/(\w+)/(\d+)$", self.path)
+        if m:
+            upload_id, part_number = m.group(1), int(m.group(2))
+            if self.stub.failing_parts.get(part_number, 0) > 0:
+                self.stub.failing_parts[part_number] -= 1
+                return self._send(502)
+            if upload_id not in self.stub.uploads:
+                return self._send(404)
+            self.stub.uploads[upload_id][part_number] = data
+            return self._send(200, headers={"ETag": f'"{upload_id}-{part_number}"'})
+        if self.path.startswith("/upload/"):
+            path = self.path[len("/upload/") :]
+            self.stub.files[path] = data
+            self.stub.content_types[path] = self.headers.get("Content-Type")
+            return self._send(200)
+        self._send(404)
+
+    def do_PATCH(self) -> None:
+        self.stub.requests.append(("PATCH", self.path))
+        m = re.match(r"/api/jobs/(\w+)$", self.path)
+        job = self.stub.jobs.get(m.group(1)) if m else None
+        if job is None:
+            return self._send(404, "Job not found")
+        body = self._json()
+        status = body.get("status")
+        if status and status not in VALID_TRANSITIONS[job["status"]]:
+            return self._send(
+                400, f"Invalid state transition from {job['status']} to {status}"
+            )
+        job.update(body)
+        if self.stub.lost_patch_responses > 0:
+            self.stub.lost_patch_responses -= 1
+            self.close_connection = True
+            return
+        self._send(200, job)
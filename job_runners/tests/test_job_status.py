@@ -0,0 +1,43 @@
+import importlib
+
+import pytest
+import requests
+
+from conftest import RUNNER_PACKAGES
+
+
+@pytest.fixture(params=RUNNER_PACKAGES)
+def job_utils(request, monkeypatch):
+    module = importlib.import_module(f"{request.param}.job_utils")
+    # keep retries quick
+    monkeypatch.setattr(module.get_api_client(), "backoff", 0.01)
+    return module
+
+
+@pytest.fixture
+def running_job(job_manager):
+    job_id = job_manager.add_job("text-letter-count", {})
+    job_manager.jobs[job_id]["status"] = "running"
+    return job_id
+
+
+@pytest.mark.parametrize("status", ["completed", "failed"])
+def test_retry_of_applied_terminal_update_succeeds(
+    job_utils, job_manager, running_job, status
+):
+    job_manager.lost_patch_responses = 1
+    job_utils.update_job_status(
+        running_job, {"status": status}, api_base_url=job_manager.api_base_url
+    )
+
+    assert job_manager.jobs[running_job]["status"] == status
+    patches = [r for r in job_manager.requests if r[0] == "PATCH"]
+    assert len(patches) == 2
+
+
+def test_invalid_terminal_update_still_fails(job_utils, job_manager, running_job):
+    job_manager.jobs[running_job]["status"] = "failed"
+    with pytest.raises(requests.HTTPError):
+        job_utils.update_job_status(
+            running_job, {"status": "completed"}, api_base_url=job_manager.api_base_url
+        )
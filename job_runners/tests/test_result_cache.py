@@ -0,0 +1,44 @@
+import importlib
+import json
+
+import pytest
+
+from conftest import RUNNER_PACKAGES
+
+
+@pytest.fixture(params=RUNNER_PACKAGES)
+def result_cache(request):
+    return importlib.import_module(f"{request.param}.result_cache")
+
+
+@pytest.fixture
+def input_url(job_manager):
+    job_manager.files["input.nwb"] = b"0123456789"
+    return f"{job_manager.url}/files/input.nwb"
+
+
+def _job(input_url):
+    return {"type": "rastermap", "input": json.dumps({"fileUrl": input_url})}
+
+
+def test_input_without_validators_is_not_cached(result_cache, input_url):
+    assert result_cache.get_input_file_fingerprint(input_url) is None
+    assert result_cache.get_result_cache_key(_job(input_url), "1", input_url) is None
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [{"ETag": '"abc"'}, {"Last-Modified": "Wed, 14 Oct 2026 10:00:00 GMT"}],
+)
+def test_input_with_validator_is_cached(result_cache, job_manager, input_url, headers):
+    job_manager.file_headers["input.nwb"] = headers
+    fingerprint = result_cache.get_input_file_fingerprint(input_url)
+    assert fingerprint["size"] == 10
+    key = result_cache.get_result_cache_key(_job(input_url), "1", input_url)
+    assert key is not None
+
+    # a new version of the file gets a new key
+    job_manager.file_headers["input.nwb"] = {
+        name: value + "x" for name, value in headers.items()
+    }
+    assert result_cache.get_result_cache_key(_job(input_url), "1", input_url) != key
@@ -0,0 +1,69 @@
+import importlib
+import os
+
+import pytest
+import requests
+
+from conftest import RUNNER_PACKAGES
+
+
+@pytest.fixture(params=RUNNER_PACKAGES)
+def job_utils(request, monkeypatch):
+    module = importlib.import_module(f"{request.param}.job_utils")
+    # keep retries quick
+    monkeypatch.setattr(module.get_api_client(), "backoff", 0.01)
+    return module
+
+
+@pytest.fixture
+def output_file(tmp_path):
+    path = tmp_path / "output.bin"
+    path.write_bytes(os.urandom(5500))
+    return path
+
+
+def test_multipart_upload_retries_failed_parts(job_utils, job_manager, output_file):
+    job_manager.failing_parts[2] = 1
+    url = job_utils.upload_job_output_multipart(
+        str(output_file),
+        "job1",
+        api_base_url=job_manager.api_base_url,
+        part_size=1000,
+    )
+
+    assert requests.get(url).content == output_file.read_bytes()
+    part_puts = [path for method, path in job_manager.requests if method == "PUT"]
+    assert len(part_puts) == 7
+    assert sum(path.endswith("/2") for path in part_puts) == 2
+    assert not job_manager.aborted_uploads
+
+
+def test_multipart_upload_aborts_on_failure(
+    job_utils, job_manager, output_file, monkeypatch
+):
+    monkeypatch.setattr(job_utils.get_api_client(), "max_retries", 1)
+    job_manager.failing_parts[3] = 10
+    with pytest.raises(requests.HTTPError):
+        job_utils.upload_job_output_multipart(
+            str(output_file),
+            "job1",
+            api_base_url=job_manager.api_base_url,
+            part_size=1000,
+        )
+
+    assert len(job_manager.aborted_uploads) == 1
+    assert not job_manager.uploads
+    assert not job_manager.files
+
+
+def test_upload_falls_back_without_multipart(
+    job_utils, job_manager, output_file, monkeypatch
+):
+    job_manager.multipart = False
+    monkeypatch.setattr(job_utils, "MULTIPART_THRESHOLD", 1000)
+    url = job_utils.upload_job_output(
+        str(output_file), "job1", api_base_url=job_manager.api_base_url
+    )
+
+    assert requests.get(url).content == output_file.read_bytes()
+    assert ("PUT", "/upload/job1/output.bin") in job_manager.requests
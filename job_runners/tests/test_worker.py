@@ -0,0 +1,63 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import RUNNER_PACKAGES, RUNNER_SRC_DIRS
+
+
+@pytest.mark.parametrize("package", RUNNER_PACKAGES)
+def test_declared_job_types_have_processors(package):
+    core = importlib.import_module(f"{package}.core")
+    for job_type in core.JOB_TYPE_PRELOAD_MODULES:
+        try:
+            assert callable(core.get_job_processor(job_type))
+        except ImportError:
+            # the processor's dependencies are not installed here
+            pass
+
+
+@pytest.mark.parametrize("package", RUNNER_PACKAGES)
+def test_worker_processes_its_declared_job_types(package, job_manager):
+    core = importlib.import_module(f"{package}.core")
+    worker = importlib.import_module(f"{package}.worker")
+    job_types = worker.preload_job_processors(list(core.JOB_TYPE_PRELOAD_MODULES))
+    if not job_types:
+        pytest.skip(f"no processor dependencies of {package} are installed")
+
+    job_manager.files["input.txt"] = b"Hello World"
+    job_ids = [
+        job_manager.add_job(job_type, {"fileUrl": f"{job_manager.url}/files/input.txt"})
+        for job_type in job_types
+    ]
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            f"{package}.cli",
+            "worker",
+            "--api-base-url",
+            job_manager.api_base_url,
+            "--api-key",
+            job_manager.worker_api_key,
+            "--wait",
+            "1",
+            "--max-jobs",
+            str(len(job_ids)),
+        ],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(RUNNER_SRC_DIRS)},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "Unknown job type" not in result.stderr
+    for job_id in job_ids:
+        job = job_manager.jobs[job_id]
+        # jobs without real inputs fail, but they must be claimed and finished
+        assert job["status"] in ("completed", "failed"), job
+        if job["type"] == "text-letter-count":
+            assert job["status"] == "completed", job
@@ -0,0 +1,52 @@
+/**
+ * API Route for Completing Multipart Job Output Uploads
+ *
+ * Job runners send the ETags of the uploaded parts here to assemble the file.
+ * No upload can be started while the output storage has no multipart API
+ * (see ../route.ts), so this endpoint answers 501.
+ */
+
+import { NextRequest, NextResponse } from 'next/server';
+import connectDB, { Job } from '../../../../../../lib/db';
+
+/**
+ * Complete a multipart upload of a job output
+ *
+ * @param request NextRequest containing:
+ *   - fileName: Name of the uploaded file
+ *   - uploadId: ID returned when the upload was started
+ *   - parts: [{ partNumber, etag }] of the uploaded parts
+ * @param params.id string - The unique identifier of the job
+ * @returns
+ *   - 501 while the output storage has no multipart uploads
+ *   - Error: 404 if not found
+ *
+ * No API key required - job ID is used as authentication
+ */
+export async function POST(
+  request: NextRequest,
+  { params }: { params: { id: string } }
+) {
+  await connectDB();
+  const job = await Job.findById(params.id);
+
+  if (!job) {
+    return new NextResponse('Job not found', { status: 404 });
+  }
+
+  return new NextResponse('Multipart uploads are not supported by the output storage', { status: 501 });
+}
+
+/**
+ * Handle CORS preflight requests
+ */
+export async function OPTIONS() {
+  return new NextResponse(null, {
+    status: 200,
+    headers: {
+      'Access-Control-Allow-Origin': 'http://localhost:5173',
+      'Access-Control-Allow-Methods': 'POST, OPTIONS',
+      'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+    }
+  });
+}
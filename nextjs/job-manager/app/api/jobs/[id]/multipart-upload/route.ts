@@ -0,0 +1,58 @@
+/**
+ * API Route for Starting Multipart Job Output Uploads
+ *
+ * Job runners upload large outputs in parts when this endpoint returns an
+ * uploadId and one signed URL per part. The memobin storage on tempory.net
+ * has no multipart upload API, so this endpoint answers 501 and runners
+ * fall back to a single upload through upload-url.
+ */
+
+import { NextRequest, NextResponse } from 'next/server';
+import connectDB, { Job } from '../../../../../lib/db';
+
+/**
+ * Start a multipart upload of a job output
+ *
+ * @param request NextRequest containing:
+ *   - fileName: Name of the file to upload
+ *   - size: Size of the file in bytes
+ *   - partSize: Requested size of the parts in bytes
+ *   - contentType: Content type of the file
+ * @param params.id string - The unique identifier of the job
+ * @returns
+ *   - When supported: { uploadId, partUrls, downloadUrl, partSize }
+ *   - 501 while the output storage has no multipart uploads
+ *   - Error: 400 for invalid state, 404 if not found
+ *
+ * No API key required - job ID is used as authentication
+ */
+export async function POST(
+  request: NextRequest,
+  { params }: { params: { id: string } }
+) {
+  await connectDB();
+  const job = await Job.findById(params.id);
+
+  if (!job) {
+    return new NextResponse('Job not found', { status: 404 });
+  }
+  if (job.status !== 'running') {
+    return new NextResponse('Uploads can only be started for running jobs', { status: 400 });
+  }
+
+  return new NextResponse('Multipart uploads are not supported by the output storage', { status: 501 });
+}
+
+/**
+ * Handle CORS preflight requests
+ */
+export async function OPTIONS() {
+  return new NextResponse(null, {
+    status: 200,
+    headers: {
+      'Access-Control-Allow-Origin': 'http://localhost:5173',
+      'Access-Control-Allow-Methods': 'POST, OPTIONS',
+      'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+    }
+  });
+}
@@ -65,6 +65,7 @@ export async function GET(
  * @param request NextRequest containing any of:
  *   - status: 'pending' | 'running' | 'completed' | 'failed'
  *   - progress: number (0-100)
+ *   - etaSec: estimated number of seconds left (running jobs only)
  *   - output: job output data
  *   - error: error information if job failed
  * @param params.id string - The unique identifier of the job
@@ -82,7 +83,7 @@ export async function PATCH(
 
   try {
     const body = await request.json();
-    const { status, progress, output, error } = body;
+    const { status, progress, etaSec, output, error } = body;
 
     await connectDB();
     const job = await Job.findById(params.id);
@@ -97,6 +98,10 @@ export async function PATCH(
     if (status) {
       updates.$set = updates.$set || {};
       updates.$set.status = status;
+      // The estimate is only meaningful while the job is running
+      if (status !== 'running') {
+        updates.$unset = { etaSec: 1 };
+      }
     }
 
     // Only allow progress updates for running jobs
@@ -111,6 +116,18 @@ export async function PATCH(
       updates.$set.progress = progress;
     }
 
+    // Only allow remaining time estimates for running jobs
+    if (typeof etaSec === 'number') {
+      if (job.status !== 'running' || (status && status !== 'running')) {
+        return new NextResponse('Remaining time can only be set for running jobs', { status: 400 });
+      }
+      if (etaSec < 0) {
+        return new NextResponse('Remaining time must not be negative', { status: 400 });
+      }
+      updates.$set = updates.$set || {};
+      updates.$set.etaSec = etaSec;
+    }
+
     // Only allow output updates for running or completed jobs
     if (output) {
       if (!['running', 'completed'].includes(job.status) &&
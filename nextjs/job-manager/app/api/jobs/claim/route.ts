@@ -0,0 +1,101 @@
+/**
+ * API Route for Claiming Pending Jobs
+ *
+ * This endpoint lets long-running job runner workers take the oldest pending
+ * job of the types they support. Claiming sets the job to running in a single
+ * atomic update, so a job is never handed to two workers.
+ */
+
+import { NextRequest, NextResponse } from 'next/server';
+import connectDB, { Job } from '../../../../lib/db';
+
+// Longest time a claim request waits for a job to become available
+const MAX_WAIT_SEC = 20;
+
+// How often the database is checked while waiting
+const POLL_INTERVAL_MS = 250;
+
+export const maxDuration = 30;
+
+/**
+ * Handle CORS preflight requests
+ * Enables cross-origin requests from the development server
+ *
+ * @returns Response with appropriate CORS headers
+ */
+export async function OPTIONS() {
+  return new NextResponse(null, {
+    status: 200,
+    headers: {
+      'Access-Control-Allow-Origin': 'http://localhost:5173',
+      'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, PATCH, OPTIONS',
+      'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+    }
+  });
+}
+
+/**
+ * Claim the oldest pending job of the given types
+ *
+ * @param request NextRequest containing:
+ *   - types: Job types the worker can process
+ *   - workerId: Identifier of the worker, recorded on the job
+ *   - wait: Optional number of seconds to wait for a job (max 20)
+ * @returns
+ *   - Success: The claimed job, now in the running state
+ *   - 204 if no job became available within the wait time
+ *   - Error: 400 for invalid args, 401 for a wrong key, 500 for server errors
+ *
+ * Required: the worker key (JOB_WORKER_API_KEY) as a Bearer token
+ */
+export async function POST(request: NextRequest) {
+  const WORKER_API_KEY = process.env.JOB_WORKER_API_KEY;
+  if (!WORKER_API_KEY) {
+    console.error('JOB_WORKER_API_KEY not configured');
+    return new NextResponse('Server configuration error', { status: 500 });
+  }
+  if (request.headers.get('Authorization') !== `Bearer ${WORKER_API_KEY}`) {
+    return new NextResponse('Unauthorized', { status: 401 });
+  }
+
+  try {
+    const body = await request.json();
+    const { types, workerId } = body;
+
+    if (!Array.isArray(types) || types.length === 0 || !workerId) {
+      return new NextResponse('Missing required fields', { status: 400 });
+    }
+
+    const wait = Math.min(Math.max(Number(body.wait) || 0, 0), MAX_WAIT_SEC);
+    const deadline = Date.now() + wait * 1000;
+
+    await connectDB();
+
+    for (;;) {
+      const job = await Job.findOneAndUpdate(
+        { status: 'pending', type: { $in: types } },
+        {
+          $set: {
+            status: 'running',
+            progress: 0,
+            workerId,
+            claimedAt: new Date(),
+            updatedAt: new Date()
+          }
+        },
+        { sort: { createdAt: 1 }, new: true }
+      );
+
+      if (job) {
+        return NextResponse.json(job);
+      }
+      if (Date.now() + POLL_INTERVAL_MS > deadline) {
+        return new NextResponse(null, { status: 204 });
+      }
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+  } catch (error) {
+    console.error('Error claiming job:', error);
+    return new NextResponse('Internal Server Error', { status: 500 });
+  }
+}
@@ -97,9 +97,12 @@ export interface IJob {
   type: string;
   input: string;
   progress: number;
+  etaSec?: number;  // Estimated seconds left, reported by the processor
   output?: string;
   error?: string;
   userId: string;  // Reference to user who created the job
+  workerId?: string;  // Worker that claimed the job through /api/jobs/claim
+  claimedAt?: Date;
   createdAt: Date;
   updatedAt: Date;
 }
@@ -127,12 +130,18 @@ const jobSchema = new mongoose.Schema<IJobDocument>({
     max: 100,
     default: 0
   },
+  etaSec: {
+    type: Number,
+    min: 0
+  },
   output: String,
   error: String,
   userId: {
     type: String,
     required: true
   },
+  workerId: String,
+  claimedAt: Date,
   createdAt: {
     type: Date,
     default: Date.now
@@ -145,6 +154,8 @@ const jobSchema = new mongoose.Schema<IJobDocument>({
 
 // Create compound indexes
 jobSchema.index({ type: 1, input: 1 });
+// For workers claiming the oldest pending job of their types
+jobSchema.index({ status: 1, type: 1, createdAt: 1 });
 
 // Update the updatedAt field on save
 jobSchema.pre('save', function(next) {
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from .user_cache_dir import evict_lru_files, get_user_cache_dir
+
+# URL written into cached LINDI files in place of the (port-dependent) URL of
+# the served HDF5 file. It is substituted when the index is served.
+LINDI_URL_PLACEHOLDER = "neurosift-local-file://placeholder"
+
+
+class LindiIndexCache:
+    """
+    Per-user cache of LINDI reference file systems (.lindi.json) for local
+    HDF5 files, so that re-opening a file in neurosift costs one JSON fetch
+    instead of an HDF5 metadata crawl over HTTP.
+
+    Entries are keyed by the real path, size and mtime of the file and the
+    least recently used entries are removed once the cache exceeds max_bytes.
+    Requires the optional lindi package.
+    """
+
+    def __init__(
+        self, *, cache_dir: Optional[str] = None, max_bytes: int = 2 * 1024**3
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory for the cached files (default: <user cache dir>/lindi).
+        max_bytes : int
+            Maximum total size of the cached files.
+        """
+        self.cache_dir = cache_dir or get_user_cache_dir("lindi")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def get_or_build(self, path: str) -> str:
+        """
+        Return the path of the cached LINDI file for an HDF5 file, building it
+        first if needed. Refs in the cached file point to
+        LINDI_URL_PLACEHOLDER; use render_for_urls to produce servable content.
+        """
+        cached_path = os.path.join(self.cache_dir, self._key(path) + ".lindi.json")
+        if os.path.exists(cached_path):
+            # mark as recently used
+            os.utime(cached_path)
+            return cached_path
+        import lindi
+
+        print(f"Building LINDI index for {path}")
+        timer = time.time()
+        f = lindi.LindiH5pyFile.from_hdf5_file(path, url=LINDI_URL_PLACEHOLDER)
+        try:
+            rfs = f.to_reference_file_system()
+        finally:
+            f.close()
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(rfs, fp, separators=(",", ":"))
+        os.replace(tmp_path, cached_path)
+        print(
+            f"Built LINDI index in {time.time() - timer:.1f}s "
+            f"({os.path.getsize(cached_path) / 1e6:.1f} MB)"
+        )
+        evict_lru_files(
+            self.cache_dir,
+            max_bytes=self.max_bytes,
+            suffix=".lindi.json",
+            keep=cached_path,
+        )
+        return cached_path
+
+    def render_for_urls(self, cached_path: str, urls: List[str]) -> bytes:
+        """
+        Return the content of a cached LINDI file with refs pointing to the
+        file served at urls.
+
+        With several URLs (the same file served on several origins), chunk
+        refs are spread across them so that the browser, which limits the
+        number of connections per origin, can load more chunks in parallel.
+        Each chunk is always assigned to the same URL so that it can be
+        cached by the browser.
+        """
+        with open(cached_path, "rb") as f:
+            data = f.read()
+        if len(urls) == 1:
+            return data.replace(
+                json.dumps(LINDI_URL_PLACEHOLDER).encode(), json.dumps(urls[0]).encode()
+            )
+        rfs = json.loads(data)
+        templates: Dict[str, str] = rfs.get("templates", {})
+        placeholder_refs = {LINDI_URL_PLACEHOLDER} | {
+            "{{" + k + "}}" for k, v in templates.items() if v == LINDI_URL_PLACEHOLDER
+        }
+        names = [f"ns{i}" for i in range(len(urls))]
+        for key, ref in rfs["refs"].items():
+            if isinstance(ref, list) and ref and ref[0] in placeholder_refs:
+                i = zlib.crc32(key.encode()) % len(urls)
+                ref[0] = "{{" + names[i] + "}}"
+        rfs["templates"] = {
+            **{k: v for k, v in templates.items() if v != LINDI_URL_PLACEHOLDER},
+            **dict(zip(names, urls)),
+        }
+        return json.dumps(rfs, separators=(",", ":")).encode()
+
+    def _key(self, path: str) -> str:
+        real_path = os.path.realpath(path)
+        st = os.stat(real_path)
+        s = f"{real_path}\n{st.st_size}\n{st.st_mtime_ns}"
+        return hashlib.sha256(s.encode()).hexdigest()[:32]
+
+
+def is_plain_hdf5_file(path: str) -> bool:
+    """Whether path is an HDF5 file (as opposed to zarr or LINDI)."""
+    if not os.path.isfile(path):
+        return False
+    if path.endswith(".lindi") or ".lindi." in os.path.basename(path):
+        return False
+    try:
+        import h5py
+    except ImportError:
+        return False
+    return h5py.is_hdf5(path)
@@ -0,0 +1,29 @@
+import time
+from typing import List, Tuple
+
+
+class StartupTimer:
+    """
+    Records the duration of named startup phases so that launch latency of
+    the CLI commands can be reported.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._last = self._start
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """Record the time since the previous mark as the given phase."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def elapsed(self) -> float:
+        """Seconds since the timer was created."""
+        return time.perf_counter() - self._start
+
+    def report(self) -> str:
+        parts = [f"{phase} {duration:.3f}s" for phase, duration in self.phases]
+        parts.append(f"total {self.elapsed():.3f}s")
+        return "Startup timing: " + ", ".join(parts)
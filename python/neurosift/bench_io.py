@@ -0,0 +1,404 @@
+import base64
+import http.client
+import io
+import json
+import os
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, MutableMapping, Optional
+
+from .LindiIndexCache import LindiIndexCache
+from .TemporaryDirectory import TemporaryDirectory
+from .file_server import BlockCache, LocalFileServer
+
+
+@dataclass
+class PhaseResult:
+    phase: str
+    requests: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    skipped: bool = False
+
+
+class ShapedHttpClient:
+    """
+    HTTP range-request client for a LocalFileServer that simulates a slower
+    network: every request takes at least rtt plus its size divided by
+    bandwidth. Requests are sequential over one keep-alive connection, like
+    the viewer's HDF5 worker, and counted per phase.
+    """
+
+    def __init__(self, port: int, *, rtt: float, bandwidth: Optional[float]):
+        """
+        Parameters
+        ----------
+        port : int
+            Port of the local server.
+        rtt : float
+            Simulated round-trip time in seconds.
+        bandwidth : float, optional
+            Simulated bandwidth in bytes per second (None for unlimited).
+        """
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.results: List[PhaseResult] = []
+        self._conn = http.client.HTTPConnection("localhost", port)
+
+    def start_phase(self, phase: str) -> PhaseResult:
+        result = PhaseResult(phase=phase)
+        self.results.append(result)
+        return result
+
+    def get(self, path: str, *, start: Optional[int] = None, end: Optional[int] = None):
+        """GET path, or bytes start..end (inclusive) of it."""
+        headers = {}
+        if start is not None and end is not None:
+            headers["Range"] = f"bytes={start}-{end}"
+        timer = time.perf_counter()
+        self._conn.request("GET", urllib.parse.quote(path), headers=headers)
+        r = self._conn.getresponse()
+        data = r.read()
+        if r.status not in (200, 206):
+            raise IOError(f"GET {path} failed with status {r.status}")
+        simulated = self.rtt
+        if self.bandwidth:
+            simulated += len(data) / self.bandwidth
+        elapsed = time.perf_counter() - timer
+        if simulated > elapsed:
+            time.sleep(simulated - elapsed)
+        if self.results:
+            self.results[-1].requests += 1
+            self.results[-1].bytes += len(data)
+        return data
+
+    def close(self):
+        self._conn.close()
+
+
+class HttpRangeFile(io.RawIOBase):
+    """
+    Read-only file object over HTTP range requests, for h5py. Reads are done
+    in aligned blocks of block_size that are kept in memory, similar to the
+    lazy file used by the viewer's HDF5 worker.
+    """
+
+    def __init__(
+        self, client: ShapedHttpClient, path: str, size: int, *, block_size: int
+    ):
+        self.client = client
+        self.path = path
+        self.size = size
+        self.block_size = block_size
+        self._pos = 0
+        self._blocks: Dict[int, bytes] = {}
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        return self._pos
+
+    def readinto(self, b: Any) -> int:
+        count = min(len(b), self.size - self._pos)
+        if count <= 0:
+            return 0
+        bs = self.block_size
+        first = self._pos // bs
+        last = (self._pos + count - 1) // bs
+        missing = [i for i in range(first, last + 1) if i not in self._blocks]
+        if missing:
+            # one request for the missing blocks (they are contiguous except
+            # for blocks already held, which are simply fetched again)
+            start = missing[0] * bs
+            end = min((missing[-1] + 1) * bs, self.size) - 1
+            data = self.client.get(self.path, start=start, end=end)
+            for i in range(missing[0], missing[-1] + 1):
+                offset = (i - missing[0]) * bs
+                self._blocks[i] = data[offset : offset + bs]
+        data = b"".join(self._blocks[i] for i in range(first, last + 1))
+        offset = self._pos - first * bs
+        b[:count] = data[offset : offset + count]
+        self._pos += count
+        return count
+
+
+class LindiStore(MutableMapping):
+    """
+    Read-only zarr (v2) store over a LINDI reference file system whose chunk
+    refs are fetched with a ShapedHttpClient.
+    """
+
+    def __init__(self, rfs: Dict[str, Any], client: ShapedHttpClient, port: int):
+        self.refs: Dict[str, Any] = rfs["refs"]
+        self.templates: Dict[str, str] = rfs.get("templates", {})
+        self.client = client
+        self.prefix = f"http://localhost:{port}"
+
+    def __getitem__(self, key: str) -> bytes:
+        ref = self.refs[key]
+        if isinstance(ref, dict):
+            return json.dumps(ref).encode()
+        if isinstance(ref, str):
+            if ref.startswith("base64:"):
+                return base64.b64decode(ref[len("base64:") :])
+            return ref.encode()
+        url, offset, size = ref
+        for k, v in self.templates.items():
+            url = url.replace("{{" + k + "}}", v)
+        if not url.startswith(self.prefix):
+            raise IOError(f"Unexpected chunk URL: {url}")
+        path = urllib.parse.unquote(url[len(self.prefix) :])
+        return self.client.get(path, start=offset, end=offset + size - 1)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.refs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.refs)
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def __setitem__(self, key: str, value: bytes):
+        raise NotImplementedError("LindiStore is read-only")
+
+    def __delitem__(self, key: str):
+        raise NotImplementedError("LindiStore is read-only")
+
+
+def run_bench_io(
+    path: str,
+    *,
+    mode: str = "hdf5",
+    rtt: float = 0.05,
+    bandwidth: Optional[float] = 50e6 / 8,
+    block_size: int = 256 * 1024,
+    window: float = 10.0,
+    cache_size: int = 256 * 1024 * 1024,
+) -> List[PhaseResult]:
+    """
+    Serve an NWB file as view-nwb does and replay the requests of a typical
+    viewer session (open, list objects, load units, load a time window of an
+    ElectricalSeries) with a simulated round-trip time (seconds) and
+    bandwidth (bytes per second).
+
+    In "hdf5" mode the file is read with h5py over HTTP range requests in
+    blocks of block_size, like the viewer's HDF5 worker. In "lindi" mode the
+    LINDI index served by view-nwb is loaded first and datasets are read
+    chunk by chunk (requires lindi and zarr).
+    """
+    from .cli import find_free_port
+
+    abs_path = os.path.abspath(path)
+    name = os.path.basename(abs_path)
+    lindi_cache = None
+    if mode == "lindi":
+        lindi_cache = LindiIndexCache()
+        # build the index outside of the measured phases, as view-nwb does
+        lindi_cache.get_or_build(abs_path)
+    with TemporaryDirectory(prefix="bench_io") as tmpdir:
+        os.symlink(abs_path, f"{tmpdir}/{name}")
+        port = find_free_port()
+        server = LocalFileServer(
+            tmpdir,
+            port=port,
+            block_cache=BlockCache(max_bytes=cache_size) if cache_size > 0 else None,
+            lindi_cache=lindi_cache,
+        )
+        server.start(timeout=30)
+        client = ShapedHttpClient(port, rtt=rtt, bandwidth=bandwidth)
+        try:
+            if mode == "lindi":
+                _replay_lindi(client, port, name, window=window)
+            else:
+                _replay_hdf5(
+                    client,
+                    name,
+                    os.path.getsize(abs_path),
+                    block_size=block_size,
+                    window=window,
+                )
+        finally:
+            client.close()
+            server.stop()
+    return client.results
+
+
+def _replay_hdf5(
+    client: ShapedHttpClient, name: str, size: int, *, block_size: int, window: float
+):
+    import h5py
+
+    def timed(phase: str, fn: Callable[[], Any]) -> Any:
+        result = client.start_phase(phase)
+        timer = time.perf_counter()
+        ret = fn()
+        result.seconds = time.perf_counter() - timer
+        result.skipped = ret is None
+        return ret
+
+    f = timed(
+        "open",
+        lambda: h5py.File(
+            HttpRangeFile(client, f"/files/{name}", size, block_size=block_size), "r"
+        ),
+    )
+    try:
+        objects: Dict[str, Dict[str, Any]] = {}
+
+        def list_objects():
+            def visit(obj_name: str, obj: Any):
+                objects[obj_name] = dict(obj.attrs)
+
+            f.visititems(visit)
+            return objects
+
+        timed("list objects", list_objects)
+
+        def load_units():
+            if "units" not in f:
+                return None
+            return [
+                f["units"][k][()]
+                for k in ("id", "spike_times", "spike_times_index")
+                if k in f["units"]
+            ]
+
+        timed("load units", load_units)
+
+        def load_window():
+            series = _find_electrical_series(objects)
+            if series is None:
+                return None
+            g = f[series]
+            num_samples = _window_num_samples(
+                window,
+                g["starting_time"].attrs.get("rate") if "starting_time" in g else None,
+                g["timestamps"][:2] if "timestamps" in g else None,
+            )
+            data = g["data"][:num_samples]
+            if "timestamps" in g:
+                g["timestamps"][:num_samples]
+            return data
+
+        timed("load timeseries window", load_window)
+    finally:
+        f.close()
+
+
+def _replay_lindi(client: ShapedHttpClient, port: int, name: str, *, window: float):
+    import zarr
+
+    def timed(phase: str, fn: Callable[[], Any]) -> Any:
+        result = client.start_phase(phase)
+        timer = time.perf_counter()
+        ret = fn()
+        result.seconds = time.perf_counter() - timer
+        result.skipped = ret is None
+        return ret
+
+    def open_file():
+        rfs = json.loads(client.get(f"/files/{name}.lindi.json"))
+        return zarr.open_group(LindiStore(rfs, client, port), mode="r")
+
+    root = timed("open", open_file)
+    objects: Dict[str, Dict[str, Any]] = {}
+
+    def list_objects():
+        def visit(obj_name: str, obj: Any):
+            objects[obj_name] = dict(obj.attrs)
+
+        root.visititems(visit)
+        return objects
+
+    timed("list objects", list_objects)
+
+    def load_units():
+        if "units" not in root:
+            return None
+        return [
+            root["units"][k][:]
+            for k in ("id", "spike_times", "spike_times_index")
+            if k in root["units"]
+        ]
+
+    timed("load units", load_units)
+
+    def load_window():
+        series = _find_electrical_series(objects)
+        if series is None:
+            return None
+        g = root[series]
+        num_samples = _window_num_samples(
+            window,
+            g["starting_time"].attrs.get("rate") if "starting_time" in g else None,
+            g["timestamps"][:2] if "timestamps" in g else None,
+        )
+        data = g["data"][:num_samples]
+        if "timestamps" in g:
+            g["timestamps"][:num_samples]
+        return data
+
+    timed("load timeseries window", load_window)
+
+
+def _find_electrical_series(objects: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    names = [
+        name
+        for name, attrs in objects.items()
+        if _as_str(attrs.get("neurodata_type")) == "ElectricalSeries"
+    ]
+    # prefer acquired raw data
+    names.sort(key=lambda n: (not n.startswith("acquisition"), n))
+    return names[0] if names else None
+
+
+def _window_num_samples(window: float, rate: Any, timestamps: Any) -> int:
+    if rate is not None and float(rate) > 0:
+        return max(1, int(window * float(rate)))
+    if timestamps is not None and len(timestamps) == 2:
+        dt = float(timestamps[1] - timestamps[0])
+        if dt > 0:
+            return max(1, int(window / dt))
+    return 1
+
+
+def _as_str(value: Any) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode()
+    return value if isinstance(value, str) else None
+
+
+def format_bench_report(results: List[PhaseResult]) -> str:
+    lines = [f"{'phase':<24} {'requests':>8} {'MB':>10} {'seconds':>8}"]
+    for r in results:
+        if r.skipped:
+            lines.append(f"{r.phase:<24} {'(skipped: not in file)':>28}")
+            continue
+        lines.append(
+            f"{r.phase:<24} {r.requests:>8} {r.bytes / 1e6:>10.2f} {r.seconds:>8.2f}"
+        )
+    lines.append(
+        f"{'total':<24} {sum(r.requests for r in results):>8} "
+        f"{sum(r.bytes for r in results) / 1e6:>10.2f} "
+        f"{sum(r.seconds for r in results):>8.2f}"
+    )
+    return "\n".join(lines)
+
+
+def bench_results_to_json(results: List[PhaseResult]) -> List[Dict[str, Any]]:
+    return [asdict(r) for r in results]
@@ -1,11 +1,27 @@
 import time
 import os
+import json
 import click
 import subprocess
 import webbrowser
 import socket
+import urllib.parse
 from contextlib import closing
+from typing import Optional
 from .TemporaryDirectory import TemporaryDirectory
+from .StartupTimer import StartupTimer
+from .LindiIndexCache import LindiIndexCache, is_plain_hdf5_file
+from .daemon_registry import find_daemon_for_files, register_daemon, unregister_daemon
+from .file_server import (
+    LocalFileServer,
+    BlockCache,
+    CompressedVariantCache,
+    DiskBlockCache,
+    RemoteFile,
+    RequestMetrics,
+    TranscodeJob,
+    VideoTranscoder,
+)
 import shutil
 import sys
 
@@ -31,9 +47,135 @@ def neurosift():
     "Repeatable. Placed next to the NWB so it can be played locally. "
     "The filename must match the external_file basename in the NWB.",
 )
-def view_nwb(file: str, neurosift_url: str, videos: tuple[str, ...]):
+@click.option(
+    "--server",
+    type=click.Choice(["python", "node"]),
+    default="python",
+    help="Local file server implementation (default: python). "
+    "The node server requires npm and node >= 16.",
+)
+@click.option(
+    "--startup-timeout",
+    type=float,
+    default=30,
+    help="Seconds to wait for the file server to start listening (default: 30)",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=256,
+    help="Size in MB of the python server's block cache, 0 to disable (default: 256)",
+)
+@click.option(
+    "--lindi/--no-lindi",
+    "use_lindi",
+    default=True,
+    help="For HDF5 files, build (once, then cached) and serve a LINDI index "
+    "so the viewer does not crawl the HDF5 metadata (default: on, requires lindi)",
+)
+@click.option(
+    "--reuse-daemon/--no-reuse-daemon",
+    default=True,
+    help="Use a running `neurosift serve` daemon whose directory contains the "
+    "file instead of starting a new server (default: on)",
+)
+@click.option(
+    "--access-log",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append a JSON line per file request (path, status, bytes, duration, "
+    "ranges) to this file",
+)
+@click.option(
+    "--compress/--no-compress",
+    default=True,
+    help="Send JSON and zarr metadata files gzip/zstd compressed to clients "
+    "that accept it, caching the compressed copies on disk (default: on)",
+)
+@click.option(
+    "--fanout",
+    type=int,
+    default=4,
+    help="Number of ports to serve on. LINDI chunk requests are spread over "
+    "them to get past the browser limit of 6 connections per origin (default: 4)",
+)
+@click.option(
+    "--transcode-video/--no-transcode-video",
+    default=True,
+    help="Convert --video files that browsers cannot stream (AVI, MJPEG, raw "
+    "H.264, MP4 with the index at the end) to fragmented MP4 in the background "
+    "with ffmpeg, copying the video stream when possible (default: on)",
+)
+def view_nwb(
+    file: str,
+    neurosift_url: str,
+    videos: tuple[str, ...],
+    server: str,
+    startup_timeout: float,
+    cache_size: int,
+    use_lindi: bool,
+    reuse_daemon: bool,
+    access_log: Optional[str],
+    compress: bool,
+    fanout: int,
+    transcode_video: bool,
+):
+    timer = StartupTimer()
     abs_fname = os.path.abspath(file)
     base_fname = os.path.basename(abs_fname)
+
+    is_zarr = False
+    if os.path.isdir(abs_fname):
+        if not os.path.exists(f"{abs_fname}/.zmetadata"):
+            raise Exception(
+                f"{abs_fname} is a directory but does not contain a .zmetadata file."
+            )
+        is_zarr = True
+
+    # For plain HDF5 files, the server also serves a cached LINDI index at
+    # <file>.lindi.json so the viewer loads the metadata with one request
+    serve_lindi_index = False
+    if use_lindi and is_plain_hdf5_file(abs_fname):
+        serve_lindi_index = build_lindi_index(abs_fname)
+        timer.mark("lindi index")
+    is_lindi = (
+        file.endswith(".lindi")
+        or file.endswith(".lindi.tar")
+        or file.endswith(".lindi.json")
+    )
+
+    video_transcoder = None
+    video_jobs: dict[str, TranscodeJob] = {}
+    if videos and transcode_video and server == "python":
+        video_transcoder, video_jobs = start_video_transcodes(videos)
+        timer.mark("probe videos")
+
+    if (
+        reuse_daemon
+        and server == "python"
+        and not video_jobs
+        and _videos_are_siblings(abs_fname, videos)
+    ):
+        daemon = find_daemon_for_files([abs_fname, *videos])
+        if daemon is not None:
+            port, directory = daemon
+            rel_path = os.path.relpath(os.path.realpath(abs_fname), directory)
+            file_url = f"http://localhost:{port}/files/" + urllib.parse.quote(
+                rel_path.replace(os.sep, "/")
+            )
+            print(f"Using neurosift serve daemon for {directory} on port {port}")
+            url = build_view_url(
+                neurosift_url,
+                file_url,
+                is_zarr=is_zarr,
+                is_lindi=is_lindi,
+                serve_lindi_index=serve_lindi_index,
+            )
+            print(f"Opening {url}")
+            webbrowser.open(url)
+            print(timer.report())
+            return
+
     with TemporaryDirectory(prefix="view_nwb") as tmpdir:
         if sys.platform == "win32":
             # symlinks require admin privilege on Windows - do a copy instead
@@ -60,94 +202,703 @@ def view_nwb(file: str, neurosift_url: str, videos: tuple[str, ...]):
                 shutil.copy2(video_abs, target)
             else:
                 os.symlink(video_abs, target)
+        timer.mark("prepare files")
+
+        # find an open port
+        port = find_free_port()
+        file_url = f"http://localhost:{port}/files/{urllib.parse.quote(base_fname)}"
 
-        # this directory
-        this_directory = os.path.dirname(os.path.realpath(__file__))
+        if serve_lindi_index and server == "node":
+            # the node server only serves real files, so write the index
+            # next to the file
+            try:
+                write_lindi_index(
+                    abs_fname, file_url, f"{tmpdir}/{base_fname}.lindi.json"
+                )
+            except Exception as e:
+                print(f"Warning: unable to write LINDI index: {e}")
+                serve_lindi_index = False
 
-        env = os.environ.copy()
+        def on_first_request():
+            print(f"First request served {timer.elapsed():.3f}s after launch")
 
-        # apparently shell=True is necessary for Windows, but shell=False is necessary for Linux
-        if os.name == "nt":
-            shell = True
-        elif os.name == "posix":
-            shell = False
+        process = None
+        file_server = None
+        if server == "node":
+            process = start_node_server(tmpdir, port, timer=timer)
+            try:
+                wait_for_port(port, timeout=startup_timeout, process=process)
+            except Exception:
+                process.terminate()
+                raise
         else:
-            print(f"Warning: unrecognized os.name: {os.name}")
-            shell = False
+            block_cache = (
+                BlockCache(max_bytes=cache_size * 1024 * 1024)
+                if cache_size > 0
+                else None
+            )
+            file_server = LocalFileServer(
+                tmpdir,
+                port=port,
+                on_first_request=on_first_request,
+                block_cache=block_cache,
+                lindi_cache=LindiIndexCache() if serve_lindi_index else None,
+                metrics=RequestMetrics(access_log=access_log, block_cache=block_cache),
+                compression_cache=CompressedVariantCache() if compress else None,
+                # only virtual LINDI indexes can direct the viewer to other ports
+                fanout_ports=(
+                    find_free_ports(fanout - 1, exclude=(port,))
+                    if serve_lindi_index
+                    else []
+                ),
+                video_jobs=video_jobs,
+            )
+            try:
+                file_server.start(timeout=startup_timeout)
+            except TimeoutError as e:
+                raise click.ClickException(str(e))
+        timer.mark("bind")
+
+        # open the browser
+        url = build_view_url(
+            neurosift_url,
+            file_url,
+            is_zarr=is_zarr,
+            is_lindi=is_lindi,
+            serve_lindi_index=serve_lindi_index,
+        )
+        print(f"Opening {url}")
+        webbrowser.open(url)
+        print(timer.report())
+        if file_server is not None:
+            print(f"Request metrics: http://localhost:{port}/metrics")
+
+        # wait for the server to finish
+        if process is not None:
+            process.wait()
+        else:
+            assert file_server is not None
+            file_server.wait()
+            assert file_server.metrics is not None
+            file_server.metrics.close()
+        if video_transcoder is not None:
+            video_transcoder.stop()
+
+
+@click.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--port",
+    type=int,
+    default=None,
+    help="Port to listen on (default: a free port)",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=1024,
+    help="Size in MB of the block cache, 0 to disable (default: 1024)",
+)
+@click.option(
+    "--access-log",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append a JSON line per file request (path, status, bytes, duration, "
+    "ranges) to this file",
+)
+@click.option(
+    "--compress/--no-compress",
+    default=True,
+    help="Send JSON and zarr metadata files gzip/zstd compressed to clients "
+    "that accept it, caching the compressed copies on disk (default: on)",
+)
+@click.option(
+    "--fanout",
+    type=int,
+    default=4,
+    help="Number of ports to serve on. LINDI chunk requests are spread over "
+    "them to get past the browser limit of 6 connections per origin (default: 4)",
+)
+def serve(
+    directory: str,
+    port: Optional[int],
+    cache_size: int,
+    access_log: Optional[str],
+    compress: bool,
+    fanout: int,
+):
+    """
+    Serve a directory tree of NWB files until stopped.
+
+    Files are served at http://localhost:<port>/files/<path> and directory
+    listings at http://localhost:<port>/list/<path>. Request metrics are
+    available at http://localhost:<port>/metrics. While the daemon is
+    running, view-nwb opens files under DIRECTORY through it instead of
+    starting a new server.
+    """
+    directory = os.path.realpath(directory)
+    if port is None:
+        port = find_free_port()
+    block_cache = (
+        BlockCache(max_bytes=cache_size * 1024 * 1024) if cache_size > 0 else None
+    )
+    metrics = RequestMetrics(access_log=access_log, block_cache=block_cache)
+    file_server = LocalFileServer(
+        directory,
+        port=port,
+        block_cache=block_cache,
+        lindi_cache=LindiIndexCache(),
+        allow_listing=True,
+        metrics=metrics,
+        compression_cache=CompressedVariantCache() if compress else None,
+        fanout_ports=find_free_ports(fanout - 1, exclude=(port,)),
+    )
+    file_server.start()
+    registration_path = register_daemon(directory, port)
+    print(f"Directory listing: http://localhost:{port}/list/")
+    print(f"Request metrics: http://localhost:{port}/metrics")
+    try:
+        file_server.wait()
+    finally:
+        unregister_daemon(registration_path)
+        metrics.close()
+
+
+@click.command()
+@click.argument("url")
+@click.option(
+    "--neurosift-url",
+    default="https://neurosift.app",
+    help="Neurosift server URL (default: https://neurosift.app)",
+)
+@click.option(
+    "--port",
+    type=int,
+    default=None,
+    help="Port to listen on (default: a free port)",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=10240,
+    help="Size in MB of the persistent disk cache of remote blocks, shared by "
+    "all proxied URLs (default: 10240)",
+)
+@click.option(
+    "--access-log",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Append a JSON line per file request (path, status, bytes, duration, "
+    "ranges) to this file",
+)
+def proxy(
+    url: str,
+    neurosift_url: str,
+    port: Optional[int],
+    cache_size: int,
+    access_log: Optional[str],
+):
+    """
+    View a remote NWB file through a local caching proxy.
+
+    Byte ranges of URL are fetched in aligned blocks and kept in a persistent
+    disk cache (~/.cache/neurosift/blocks by default), so later views of the
+    same file are served from local disk.
+    """
+    timer = StartupTimer()
+    cache = DiskBlockCache(max_bytes=cache_size * 1024 * 1024)
+    try:
+        remote = RemoteFile(url, cache=cache)
+    except Exception as e:
+        raise click.ClickException(f"Unable to open {url}: {e}")
+    timer.mark("probe")
+    name = urllib.parse.urlsplit(url).path.rstrip("/").split("/")[-1] or "remote"
+    if port is None:
+        port = find_free_port()
+    with TemporaryDirectory(prefix="neurosift_proxy") as tmpdir:
+        metrics = RequestMetrics(access_log=access_log)
+        file_server = LocalFileServer(
+            tmpdir,
+            port=port,
+            metrics=metrics,
+            remote_files={name: remote},
+        )
+        file_server.start()
+        timer.mark("bind")
+        print(f"Proxying {url} ({remote.size / 1e6:.1f} MB)")
+        view_url = build_view_url(
+            neurosift_url,
+            f"http://localhost:{port}/files/{urllib.parse.quote(name)}",
+            is_zarr=False,
+            is_lindi=name.endswith(".lindi.json") or name.endswith(".lindi"),
+            serve_lindi_index=False,
+        )
+        print(f"Opening {view_url}")
+        webbrowser.open(view_url)
+        print(timer.report())
+        file_server.wait()
+        metrics.close()
+
+
+@click.command()
+@click.argument("input_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_file", type=click.Path(dir_okay=False), required=False)
+@click.option(
+    "--chunk-size",
+    type=float,
+    default=2,
+    help="Target chunk size in MB of rewritten datasets (default: 2)",
+)
+@click.option(
+    "--page-size",
+    type=int,
+    default=1024,
+    help="HDF5 file space page size in KB; metadata is aggregated into pages "
+    "of this size (default: 1024)",
+)
+@click.option(
+    "--lindi-url",
+    default=None,
+    help="Also write OUTPUT_FILE.lindi.json, a LINDI index of the copy with refs "
+    "pointing to this URL (where the copy will be hosted; requires lindi)",
+)
+def optimize(
+    input_file: str,
+    output_file: Optional[str],
+    chunk_size: float,
+    page_size: int,
+    lindi_url: Optional[str],
+):
+    """
+    Report and fix the layout issues that make an NWB file slow to view.
+
+    Scans the datasets of INPUT_FILE (layout, chunk shape, compression) and
+    how scattered its metadata is, and lists the objects the viewer will
+    struggle with. If OUTPUT_FILE is given, writes a copy with viewer-friendly
+    chunking and paged metadata aggregation. Requires h5py.
+    """
+    from .optimize import format_report, scan_hdf5_file, write_optimized_copy
 
+    report = scan_hdf5_file(input_file)
+    print(format_report(report))
+    if output_file is None:
+        return
+    if os.path.exists(output_file) and os.path.samefile(input_file, output_file):
+        raise click.ClickException("OUTPUT_FILE must differ from INPUT_FILE")
+    print(f"Writing {output_file}")
+    timer = time.time()
+    write_optimized_copy(
+        input_file,
+        output_file,
+        target_chunk_bytes=int(chunk_size * 1024 * 1024),
+        page_size=page_size * 1024,
+    )
+    print(f"Wrote {output_file} in {time.time() - timer:.1f}s")
+    print(format_report(scan_hdf5_file(output_file)))
+    if lindi_url is not None:
+        import lindi
+
+        lindi_path = output_file + ".lindi.json"
+        f = lindi.LindiH5pyFile.from_hdf5_file(output_file, url=lindi_url)
+        try:
+            f.write_lindi_file(lindi_path)
+        finally:
+            f.close()
+        print(f"Wrote {lindi_path}")
+
+
+@click.command()
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--mode",
+    type=click.Choice(["hdf5", "lindi"]),
+    default="hdf5",
+    help="Read the file with HDF5 range requests, or through the LINDI index "
+    "served by view-nwb (requires lindi) (default: hdf5)",
+)
+@click.option(
+    "--rtt",
+    type=float,
+    default=50,
+    help="Simulated round-trip time per request in milliseconds (default: 50)",
+)
+@click.option(
+    "--bandwidth",
+    type=float,
+    default=50,
+    help="Simulated bandwidth in Mbit/s, 0 for unlimited (default: 50)",
+)
+@click.option(
+    "--block-size",
+    type=int,
+    default=256,
+    help="Size in KB of the blocks read by the HDF5 client (default: 256)",
+)
+@click.option(
+    "--window",
+    type=float,
+    default=10,
+    help="Duration in seconds of the ElectricalSeries window to load (default: 10)",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=256,
+    help="Size in MB of the server's in-memory block cache, 0 to disable "
+    "(default: 256)",
+)
+@click.option(
+    "--json",
+    "json_output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also write the results as JSON to this file",
+)
+def bench_io(
+    file: str,
+    mode: str,
+    rtt: float,
+    bandwidth: float,
+    block_size: int,
+    window: float,
+    cache_size: int,
+    json_output: Optional[str],
+):
+    """
+    Measure how a viewer session on an NWB file performs over a slow network.
+
+    Serves FILE as view-nwb does and replays the requests of a typical viewer
+    session (open the file, list its objects, load the units table, load a
+    time window of an ElectricalSeries), delaying each request by the
+    simulated round-trip time and bandwidth. Prints the number of requests,
+    bytes and wall time of each phase, for comparing chunking choices (see
+    neurosift optimize) and server settings.
+    """
+    from .bench_io import bench_results_to_json, format_bench_report, run_bench_io
+
+    print(
+        f"Replaying viewer session on {file} ({mode}, rtt {rtt:g} ms, "
+        f"bandwidth {f'{bandwidth:g} Mbit/s' if bandwidth > 0 else 'unlimited'})"
+    )
+    results = run_bench_io(
+        file,
+        mode=mode,
+        rtt=rtt / 1000,
+        bandwidth=bandwidth * 1e6 / 8 if bandwidth > 0 else None,
+        block_size=block_size * 1024,
+        window=window,
+        cache_size=cache_size * 1024 * 1024,
+    )
+    print(format_bench_report(results))
+    if json_output is not None:
+        with open(json_output, "w") as f:
+            json.dump(
+                {
+                    "file": os.path.abspath(file),
+                    "mode": mode,
+                    "rtt_ms": rtt,
+                    "bandwidth_mbps": bandwidth,
+                    "block_size_kb": block_size,
+                    "phases": bench_results_to_json(results),
+                },
+                f,
+                indent=2,
+            )
+        print(f"Wrote {json_output}")
+
+
+@click.command()
+@click.argument("movies", nargs=-1)
+@click.option(
+    "--resolution",
+    "resolutions",
+    multiple=True,
+    default=["256x256", "512x512"],
+    help="WIDTHxHEIGHT of the synthetic movies, can be repeated "
+    "(default: 256x256 and 512x512)",
+)
+@click.option(
+    "--chunk-frames",
+    type=int,
+    multiple=True,
+    default=[30, 120],
+    help="Frames per chunk, can be repeated (default: 30 and 120)",
+)
+@click.option(
+    "--fps",
+    type=float,
+    multiple=True,
+    default=[30],
+    help="Frame rate given to MP4AVCCodec, can be repeated (default: 30)",
+)
+@click.option(
+    "--crf",
+    type=float,
+    multiple=True,
+    default=[17, 23, 28],
+    help="x264 CRF quality setting of MP4AVCCodec, can be repeated "
+    "(default: 17, 23 and 28)",
+)
+@click.option("--preset", default=None, help="x264 preset of MP4AVCCodec")
+@click.option(
+    "--lossless/--no-lossless",
+    default=True,
+    help="Also benchmark MP4AVCCodec in lossless mode (default: yes)",
+)
+@click.option(
+    "--baselines/--no-baselines",
+    default=True,
+    help="Also benchmark Zstd and Blosc (default: yes)",
+)
+@click.option(
+    "--num-frames",
+    type=int,
+    default=240,
+    help="Frames of each movie (default: 240)",
+)
+@click.option(
+    "--gray",
+    is_flag=True,
+    help="Convert sample movies to grayscale",
+)
+@click.option(
+    "--repeat",
+    type=int,
+    default=2,
+    help="Timed runs per measurement, the best is kept (default: 2)",
+)
+@click.option(
+    "--json",
+    "json_output",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Also write the results as JSON to this file",
+)
+def bench_codecs(
+    movies: tuple[str, ...],
+    resolutions: tuple[str, ...],
+    chunk_frames: tuple[int, ...],
+    fps: tuple[float, ...],
+    crf: tuple[float, ...],
+    preset: Optional[str],
+    lossless: bool,
+    baselines: bool,
+    num_frames: int,
+    gray: bool,
+    repeat: int,
+    json_output: Optional[str],
+):
+    """
+    Compare MP4AVCCodec with Zstd and Blosc on video data.
+
+    MOVIES are names of synthetic movies (behavior, imaging, noise; all three
+    if none are given) or paths of sample movies (.npy uint8 arrays or video
+    files). Prints the compression ratio, single-threaded encode and decode
+    throughput, PSNR, SSIM and peak memory of each codec, chunk size and
+    movie (requires the video extra).
+    """
+    from .codecs.benchmark import (
+        SYNTHETIC_MOVIES,
+        codec_results_to_json,
+        format_codec_header,
+        format_codec_result,
+        run_codec_benchmark,
+    )
+
+    sizes = []
+    for r in resolutions:
         try:
-            npm_version = subprocess.run(
-                ["npm", "--version"],
-                stdout=subprocess.PIPE,
-                universal_newlines=True,
-                shell=shell,
-                env=env,
-            ).stdout.strip()
-            print(f"npm version: {npm_version}")
-        except Exception:
-            raise Exception("Unable to run npm.")
+            width, height = (int(v) for v in r.lower().split("x"))
+        except ValueError:
+            raise click.BadParameter(f"Expected WIDTHxHEIGHT, got {r}")
+        sizes.append((height, width))
+    print(format_codec_header())
+    results = run_codec_benchmark(
+        movies or SYNTHETIC_MOVIES,
+        resolutions=sizes,
+        chunk_frames=chunk_frames,
+        fps=fps,
+        crf=crf,
+        preset=preset,
+        lossless=lossless,
+        baselines=baselines,
+        num_frames=num_frames,
+        gray=gray,
+        repeat=repeat,
+        on_result=lambda result: print(format_codec_result(result)),
+    )
+    if json_output is not None:
+        with open(json_output, "w") as f:
+            json.dump(codec_results_to_json(results), f, indent=2)
+        print(f"Wrote {json_output}")
+
+
+def build_view_url(
+    neurosift_url: str,
+    file_url: str,
+    *,
+    is_zarr: bool,
+    is_lindi: bool,
+    serve_lindi_index: bool,
+) -> str:
+    """Neurosift URL for viewing a file served at file_url."""
+    if serve_lindi_index:
+        return f"{neurosift_url}/?p=/nwb&url={file_url}.lindi.json&st=lindi"
+    url = f"{neurosift_url}/?p=/nwb&url={file_url}"
+    if is_zarr:
+        url = url + "&zarr=1"
+    if is_lindi:
+        url = url + "&st=lindi"
+    return url
+
+
+def build_lindi_index(path: str) -> bool:
+    """Build (or find) the cached LINDI index of an HDF5 file."""
+    try:
+        LindiIndexCache().get_or_build(path)
+        return True
+    except ImportError:
+        print("Install lindi to speed up loading of local HDF5 files")
+    except Exception as e:
+        print(f"Warning: unable to build LINDI index: {e}")
+    return False
 
+
+def write_lindi_index(path: str, file_url: str, output_path: str) -> None:
+    """
+    Write the cached LINDI index of an HDF5 file, with refs pointing to the
+    file served at file_url, to output_path.
+    """
+    lindi_cache = LindiIndexCache()
+    data = lindi_cache.render_for_urls(lindi_cache.get_or_build(path), [file_url])
+    with open(output_path, "wb") as f:
+        f.write(data)
+
+
+def start_video_transcodes(
+    videos: tuple[str, ...],
+) -> tuple[Optional[VideoTranscoder], dict[str, TranscodeJob]]:
+    """
+    Start converting the videos that browsers cannot stream, returning the
+    jobs keyed by video basename.
+    """
+    transcoder = VideoTranscoder()
+    if transcoder.ffmpeg is None:
+        print("Install ffmpeg to convert videos that browsers cannot stream")
+        return None, {}
+    jobs = {}
+    for video in videos:
         try:
-            node_version = subprocess.run(
-                ["node", "--version"],
-                stdout=subprocess.PIPE,
-                universal_newlines=True,
-                shell=shell,
-                env=env,
-            ).stdout.strip()
-            print(f"node version: {node_version}")
-        except Exception:
-            raise Exception("Unable to run node.")
-
-        # parse node_version v18.0.0 to get the major version number
-        node_major_version = int(node_version.split(".")[0][1:])
-        if node_major_version < 16:
-            raise Exception("node version must be >= 16.0.0")
-
-        # run the command npm install in the js directory
-        subprocess.run(
-            ["npm", "install"],
-            cwd=f"{this_directory}/local-file-access-js",
+            job = transcoder.start(os.path.abspath(video))
+        except Exception as e:
+            print(f"Warning: unable to convert {video}: {e}")
+            continue
+        if job is not None:
+            jobs[os.path.basename(os.path.abspath(video))] = job
+    return transcoder, jobs
+
+
+def _videos_are_siblings(nwb_path: str, videos: tuple[str, ...]) -> bool:
+    """Whether each video is already next to the NWB under its own basename."""
+    nwb_dir = os.path.dirname(os.path.realpath(nwb_path))
+    return all(
+        os.path.realpath(os.path.join(nwb_dir, os.path.basename(v)))
+        == os.path.realpath(v)
+        for v in videos
+    )
+
+
+def start_node_server(
+    directory: str, port: int, *, timer: Optional[StartupTimer] = None
+) -> subprocess.Popen:
+    """Install and start the express server in local-file-access-js."""
+    # this directory
+    this_directory = os.path.dirname(os.path.realpath(__file__))
+
+    env = os.environ.copy()
+
+    # apparently shell=True is necessary for Windows, but shell=False is necessary for Linux
+    if os.name == "nt":
+        shell = True
+    elif os.name == "posix":
+        shell = False
+    else:
+        print(f"Warning: unrecognized os.name: {os.name}")
+        shell = False
+
+    try:
+        npm_version = subprocess.run(
+            ["npm", "--version"],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
             shell=shell,
             env=env,
-        )
+        ).stdout.strip()
+        print(f"npm version: {npm_version}")
+    except Exception:
+        raise Exception("Unable to run npm.")
 
-        # find an open port
-        port = find_free_port()
-
-        # run the service
-        env["PORT"] = str(port)
-        process = subprocess.Popen(
-            ["npm", "run", "start", tmpdir],
-            cwd=f"{this_directory}/local-file-access-js",
+    try:
+        node_version = subprocess.run(
+            ["node", "--version"],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
             shell=shell,
             env=env,
-        )
+        ).stdout.strip()
+        print(f"node version: {node_version}")
+    except Exception:
+        raise Exception("Unable to run node.")
 
-        zarr_param = ""
-        if os.path.isdir(abs_fname):
-            if not os.path.exists(f"{abs_fname}/.zmetadata"):
-                raise Exception(
-                    f"{abs_fname} is a directory but does not contain a .zmetadata file."
-                )
-            zarr_param = "&zarr=1"
+    # parse node_version v18.0.0 to get the major version number
+    node_major_version = int(node_version.split(".")[0][1:])
+    if node_major_version < 16:
+        raise Exception("node version must be >= 16.0.0")
+    if timer is not None:
+        timer.mark("toolchain check")
 
-        # it's important to wait a bit before opening the browser
-        time.sleep(3)
+    # run the command npm install in the js directory
+    subprocess.run(
+        ["npm", "install"],
+        cwd=f"{this_directory}/local-file-access-js",
+        shell=shell,
+        env=env,
+    )
+    if timer is not None:
+        timer.mark("install")
 
-        # open the browser
-        url = f"{neurosift_url}/?p=/nwb&url=http://localhost:{port}/files/{base_fname}{zarr_param}"
-        if (
-            file.endswith(".lindi")
-            or file.endswith(".lindi.tar")
-            or file.endswith(".lindi.json")
-        ):
-            url = url + "&st=lindi"
-        print(f"Opening {url}")
-        webbrowser.open(url)
+    # run the service
+    env["PORT"] = str(port)
+    return subprocess.Popen(
+        ["npm", "run", "start", directory],
+        cwd=f"{this_directory}/local-file-access-js",
+        shell=shell,
+        env=env,
+    )
 
-        # wait for the process to finish
-        process.wait()
+
+def wait_for_port(
+    port: int, *, timeout: float, process: Optional[subprocess.Popen] = None
+):
+    """Wait until a server is accepting connections on localhost:port."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if process is not None and process.poll() is not None:
+            raise click.ClickException(
+                f"File server exited with code {process.returncode} "
+                "before it started listening"
+            )
+        try:
+            with socket.create_connection(("localhost", port), timeout=0.5):
+                return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise click.ClickException(
+                f"File server did not start listening on port {port} "
+                f"within {timeout} seconds"
+            )
+        time.sleep(0.05)
 
 
 def find_free_port():
@@ -157,8 +908,23 @@ def find_free_port():
         return s.getsockname()[1]
 
 
+def find_free_ports(n: int, *, exclude: tuple[int, ...] = ()) -> list[int]:
+    """Find n distinct open ports, not including those in exclude."""
+    ports: list[int] = []
+    while len(ports) < n:
+        port = find_free_port()
+        if port not in ports and port not in exclude:
+            ports.append(port)
+    return ports
+
+
 # Add command to the neurosift group
 neurosift.add_command(view_nwb)
+neurosift.add_command(serve)
+neurosift.add_command(proxy)
+neurosift.add_command(optimize)
+neurosift.add_command(bench_io)
+neurosift.add_command(bench_codecs)
 
 
 if __name__ == "__main__":
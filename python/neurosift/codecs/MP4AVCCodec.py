@@ -1,13 +1,47 @@
+import collections
+import functools
+import io
+import itertools
+import math
+import os
 import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fractions import Fraction
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 import numpy as np
 from numcodecs.abc import Codec
 from numcodecs import register_codec
+from numcodecs.compat import ensure_ndarray
+
+# PyAV frame formats of grayscale frames by bit depth
+_GRAY_FORMATS = {8: "gray", 10: "gray10le", 12: "gray12le"}
 
 
 class MP4AVCCodec(Codec):
     """
     Codec for encoding/decoding MP4 AVC video data from numpy arrays.
 
+    Chunks are encoded and decoded in memory with PyAV (the av package) when
+    it is installed, and through temporary files with OpenCV otherwise. Both
+    produce H.264 (yuv420p) video in an MP4 container, playable by browsers.
+
+    The config records the colour mode, so that grayscale chunks decode to
+    (frames, height, width), and optionally the dtype of the array and a
+    linear scaling, so that non-uint8 data is stored as
+    round((value - offset) / scale) and restored as stored * scale + offset.
+
+    The encoder settings (keyframe interval, CRF and x264 preset) apply when
+    encoding with PyAV. With a short keyframe interval, decode_frames reads
+    a few frames of a chunk by seeking to the keyframe before them instead
+    of decoding the whole chunk.
+
+    Grayscale data can also be stored with 10 or 12 bits per sample (12-bit
+    uses H.265, as x264 stops at 10 bits) and chunks can be encoded
+    losslessly. These modes need PyAV, and browsers do not play them.
+
+    encode_batch and decode_batch process many chunks in parallel, and
+    write_zarr_array uses them to fill a zarr array.
+
     Example
     --------
     See examples/example_mp4avc_codec.py in the neurosift repo.
@@ -15,14 +49,64 @@ class MP4AVCCodec(Codec):
 
     codec_id = "mp4avc"
 
-    def __init__(self, fps: float):
+    def __init__(
+        self,
+        fps: float,
+        *,
+        color: Optional[str] = None,
+        dtype: Optional[str] = None,
+        scale: float = 1.0,
+        offset: float = 0.0,
+        gop: Optional[int] = None,
+        crf: Optional[float] = None,
+        preset: Optional[str] = None,
+        bit_depth: int = 8,
+        lossless: bool = False,
+    ):
         """
         Parameters
         ----------
         fps : float
             The frames per second of the video.
+        color : str, optional
+            "gray" for (frames, height, width) arrays or "bgr" for (frames,
+            height, width, 3) arrays. If not given, it is inferred from the
+            array when encoding, and chunks decode as BGR unless the output
+            array has no channel axis.
+        dtype : str, optional
+            dtype of the array (default: uint8, or uint16 if bit_depth > 8).
+        scale : float
+            Size of one step of the stored values, in array units.
+        offset : float
+            Array value stored as 0.
+        gop : int, optional
+            Maximum number of frames between keyframes (default: x264's 250).
+            Smaller values make decode_frames faster and files larger.
+        crf : float, optional
+            x264 constant rate factor; lower is better quality (default: 23).
+        preset : str, optional
+            x264 preset, e.g. "ultrafast" or "slow" (default: "medium").
+        bit_depth : int
+            Bits per stored sample: 8, or 10 or 12 for grayscale data.
+        lossless : bool
+            Encode losslessly (crf is ignored).
         """
+        if color not in (None, "gray", "bgr"):
+            raise ValueError(f"Unsupported color mode: {color}")
+        if bit_depth not in _GRAY_FORMATS:
+            raise ValueError(f"Unsupported bit depth: {bit_depth}")
+        if bit_depth != 8 and color != "gray":
+            raise ValueError('bit_depth > 8 requires color="gray"')
         self.fps = fps
+        self.color = color
+        self.dtype = np.dtype(dtype).name if dtype is not None else None
+        self.scale = scale
+        self.offset = offset
+        self.gop = gop
+        self.crf = crf
+        self.preset = preset
+        self.bit_depth = bit_depth
+        self.lossless = lossless
 
     def encode(self, array: np.ndarray):  # type: ignore
         """
@@ -31,37 +115,34 @@ class MP4AVCCodec(Codec):
         Parameters
         ----------
         array : np.ndarray
-            The numpy array to encode. Must be a uint8 array with shape (frames,
-            height, width, 3) or (frames, height, width).
+            The numpy array to encode, with shape (frames, height, width, 3) or
+            (frames, height, width) and the dtype of the codec (uint8 unless
+            configured otherwise).
         """
-        import cv2
-
-        if array.dtype != np.uint8:
-            raise ValueError("MP4AVCCodec only supports uint8 arrays")
+        if array.dtype != self._array_dtype:
+            raise ValueError(
+                f"MP4AVCCodec configured for {self._array_dtype} arrays, "
+                f"got {array.dtype}"
+            )
 
         if array.ndim not in (3, 4):
             raise ValueError("MP4AVCCodec only supports 3D or 4D arrays")
 
-        if array.ndim == 3:
-            is_color = False
-        else:
-            is_color = True
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_output_fname = f"{tmpdir}/output.mp4"
-            fourcc = cv2.VideoWriter_fourcc(*"avc1")  # type: ignore
-            writer = cv2.VideoWriter(
-                tmp_output_fname,
-                fourcc,
-                self.fps,
-                (array.shape[2], array.shape[1]),
-                isColor=is_color,
+        is_color = array.ndim == 4
+        if self.color is not None and is_color != (self.color == "bgr"):
+            raise ValueError(
+                f"MP4AVCCodec configured for {self.color} arrays, "
+                f"got shape {array.shape}"
             )
-            for i in range(array.shape[0]):
-                writer.write(array[i])
-            writer.release()
-            with open(tmp_output_fname, "rb") as f:
-                return f.read()
+        if is_color and array.shape[3] != 3:
+            raise ValueError("MP4AVCCodec color arrays must have 3 channels")
+
+        frames = (self._to_stored(array[i]) for i in range(array.shape[0]))
+        height, width = array.shape[1:3]
+        if _has_av():
+            return _encode_av(frames, height, width, self, is_color=is_color)
+        self._check_opencv_support()
+        return _encode_cv2(frames, height, width, self.fps, is_color=is_color)
 
     def decode(self, buf: bytes, out=None):  # type: ignore
         """
@@ -73,30 +154,159 @@ class MP4AVCCodec(Codec):
             The MP4 video data buffer to decode. Must be a valid MP4 video
             created with h264 codec.
         out: np.ndarray, optional
-            Optional pre-allocated output array. Must be a uint8 array with shape
-            (frames, height, width, 3) or (frames, height, width).
+            Optional pre-allocated output array with shape (frames, height,
+            width, 3) or (frames, height, width) and the dtype of the codec,
+            or a contiguous buffer of the same size. The frames are decoded
+            into it one at a time.
         """
-        import cv2
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_input_fname = f"{tmpdir}/input.mp4"
-            with open(tmp_input_fname, "wb") as f:
-                f.write(buf)
-            cap = cv2.VideoCapture(tmp_input_fname)
-            frames = []
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frames.append(frame)
-            ret = np.array(frames, dtype=np.uint8)
-            if out is not None:
-                out[...] = ret
-                return out
-            return ret
+        if out is not None:
+            out = ensure_ndarray(out)
+        frames = _FrameWriter(self, out)
+        if _has_av():
+            _decode_av(buf, frames)
+        else:
+            self._check_opencv_support()
+            _decode_cv2(buf, frames)
+        return frames.result()
+
+    def decode_frames(self, buf: bytes, start: int, stop: int, out=None):
+        """
+        Decode frames start to stop (exclusive) of MP4 AVC video data.
+
+        Only the frames from the keyframe at or before start are decoded, so
+        the cost depends on the number of frames requested and on gop rather
+        than on the size of the chunk.
+
+        Parameters
+        ----------
+        buf : bytes
+            The MP4 video data buffer to decode.
+        start : int
+            Index of the first frame.
+        stop : int
+            Index after the last frame. Clipped to the number of frames.
+        out: np.ndarray, optional
+            Optional pre-allocated output array for the frames, as for decode.
+        """
+        if start < 0 or stop < start:
+            raise ValueError(f"Invalid frame range: {start}-{stop}")
+        if out is not None:
+            out = ensure_ndarray(out)
+        frames = _FrameWriter(self, out)
+        if _has_av():
+            _decode_av(buf, frames, start=start, stop=stop)
+        else:
+            self._check_opencv_support()
+            _decode_cv2(buf, frames, start=start, stop=stop)
+        return frames.result()
+
+    def encode_batch(
+        self,
+        arrays: Iterable[np.ndarray],
+        *,
+        num_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        use_processes: bool = False,
+    ) -> Iterator[bytes]:
+        """
+        Encode chunks in parallel, yielding the encoded chunks in order.
+
+        arrays is consumed lazily, so at most max_in_flight chunks (default:
+        twice num_workers) are held in memory at once.
+
+        Parameters
+        ----------
+        arrays : iterable of np.ndarray
+            The chunks to encode.
+        num_workers : int, optional
+            Number of worker threads or processes (default: number of CPUs).
+        max_in_flight : int, optional
+            Maximum number of chunks submitted but not yet yielded.
+        use_processes : bool
+            Use a process pool instead of a thread pool. PyAV releases the
+            GIL while encoding, so threads usually scale as well and avoid
+            copying the chunks between processes.
+        """
+        return _map_bounded(
+            self.encode,
+            arrays,
+            num_workers=num_workers,
+            max_in_flight=max_in_flight,
+            use_processes=use_processes,
+        )
+
+    def decode_batch(
+        self,
+        bufs: Iterable[bytes],
+        *,
+        num_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        use_processes: bool = False,
+    ) -> Iterator[np.ndarray]:
+        """
+        Decode chunks in parallel, yielding the decoded chunks in order.
+
+        The parameters are as for encode_batch.
+        """
+        return _map_bounded(
+            self.decode,
+            bufs,
+            num_workers=num_workers,
+            max_in_flight=max_in_flight,
+            use_processes=use_processes,
+        )
+
+    @property
+    def _array_dtype(self) -> np.dtype:
+        if self.dtype is not None:
+            return np.dtype(self.dtype)
+        return np.dtype("uint8" if self.bit_depth == 8 else "uint16")
+
+    def _check_opencv_support(self):
+        if self.bit_depth != 8 or self.lossless:
+            raise RuntimeError(
+                "MP4AVCCodec requires PyAV for bit_depth > 8 and lossless modes"
+            )
+
+    def _to_stored(self, frame: np.ndarray) -> np.ndarray:
+        """Convert a frame of the array to the stored values."""
+        max_value = 2**self.bit_depth - 1
+        stored_dtype = np.uint8 if self.bit_depth == 8 else np.uint16
+        if self.scale == 1 and self.offset == 0 and frame.dtype == stored_dtype:
+            if self.bit_depth == 8:
+                return np.ascontiguousarray(frame)
+            return np.minimum(frame, max_value)
+        values = (frame.astype(np.float32) - self.offset) / self.scale
+        return np.clip(np.rint(values), 0, max_value).astype(stored_dtype)
+
+    def _from_stored(self, frame: np.ndarray, dest: np.ndarray):
+        """Write a decoded frame to dest, converting to the array dtype."""
+        if self.scale == 1 and self.offset == 0 and frame.dtype == dest.dtype:
+            dest[...] = frame
+            return
+        values = frame.astype(np.float32) * self.scale + self.offset
+        if np.issubdtype(dest.dtype, np.integer):
+            info = np.iinfo(dest.dtype)
+            values = np.clip(np.rint(values), info.min, info.max)
+        dest[...] = values
 
     def __repr__(self):
-        return f"{self.__class__.__name__}(fps={self.fps})"
+        params = [f"fps={self.fps}"]
+        if self.color is not None:
+            params.append(f"color={self.color!r}")
+        if self.dtype is not None:
+            params.append(f"dtype={self.dtype!r}")
+        if self.scale != 1 or self.offset != 0:
+            params.append(f"scale={self.scale}, offset={self.offset}")
+        for name in ("gop", "crf", "preset"):
+            value = getattr(self, name)
+            if value is not None:
+                params.append(f"{name}={value!r}")
+        if self.bit_depth != 8:
+            params.append(f"bit_depth={self.bit_depth}")
+        if self.lossless:
+            params.append("lossless=True")
+        return f"{self.__class__.__name__}({', '.join(params)})"
 
     @staticmethod
     def register_codec():
@@ -104,3 +314,363 @@ class MP4AVCCodec(Codec):
         Convenience static method to register the MP4AVCCodec with numcodecs.
         """
         register_codec(MP4AVCCodec)
+
+
+def write_zarr_array(
+    z: Any,
+    data: Any,
+    *,
+    num_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    use_processes: bool = False,
+):
+    """
+    Write data to a zarr array whose compressor is an MP4AVCCodec, one chunk
+    per task on a thread pool, so that the array encodes the chunks with its
+    codec in parallel.
+
+    data can be any array-like that supports slicing (numpy array, h5py
+    dataset, zarr array); it is read one chunk at a time in the calling
+    thread, so at most max_in_flight chunks are in memory. With
+    use_processes=True the chunks are written from a process pool, so z must
+    be backed by a store the processes share (e.g. a directory).
+
+    Example
+    -------
+    codec = MP4AVCCodec(fps=30, color="gray", gop=30)
+    z = zarr.open_array("video.zarr", mode="w", shape=data.shape,
+                        chunks=(300, *data.shape[1:]), dtype=data.dtype,
+                        compressor=codec)
+    write_zarr_array(z, data)
+    """
+    # zarr 3 lists the compressors of an array, zarr 2 has a single one
+    compressors = getattr(z, "compressors", None)
+    codec = compressors[0] if compressors else getattr(z, "compressor", None)
+    if not isinstance(codec, MP4AVCCodec):
+        raise ValueError("The compressor of the zarr array must be an MP4AVCCodec")
+    if z.filters:
+        raise ValueError("Zarr arrays with filters are not supported")
+    if tuple(data.shape) != tuple(z.shape):
+        raise ValueError(f"Shape mismatch: {data.shape} vs {z.shape}")
+    chunk_coords = itertools.product(
+        *(range(math.ceil(n / c)) for n, c in zip(z.shape, z.chunks))
+    )
+
+    def read_chunks() -> Iterator[Tuple[Tuple[slice, ...], np.ndarray]]:
+        for coords in chunk_coords:
+            selection = tuple(
+                slice(i * c, min((i + 1) * c, n))
+                for i, c, n in zip(coords, z.chunks, z.shape)
+            )
+            yield selection, np.asarray(data[selection], dtype=z.dtype)
+
+    for _ in _map_bounded(
+        functools.partial(_write_zarr_chunk, z),
+        read_chunks(),
+        num_workers=num_workers,
+        max_in_flight=max_in_flight,
+        use_processes=use_processes,
+    ):
+        pass
+
+
+def _write_zarr_chunk(z: Any, item: Tuple[Tuple[slice, ...], np.ndarray]):
+    # each task writes a whole chunk, so tasks never touch the same chunk
+    selection, chunk = item
+    z[selection] = chunk
+
+
+def _map_bounded(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    *,
+    num_workers: Optional[int],
+    max_in_flight: Optional[int],
+    use_processes: bool,
+) -> Iterator[Any]:
+    """
+    Like Executor.map, but consumes items lazily, keeping at most
+    max_in_flight of them submitted and not yet yielded.
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or 2 * num_workers, 1)
+    executor: Executor = (
+        ProcessPoolExecutor(num_workers)
+        if use_processes
+        else ThreadPoolExecutor(num_workers)
+    )
+    with executor:
+        pending: collections.deque = collections.deque()
+        for item in items:
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def _has_av() -> bool:
+    try:
+        import av  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+def _encode_av(
+    frames: Iterator[np.ndarray],
+    height: int,
+    width: int,
+    codec: MP4AVCCodec,
+    *,
+    is_color,
+) -> bytes:
+    import av
+
+    encoder, frame_format, pix_fmt, options = _av_encoder_settings(codec, is_color)
+    output = io.BytesIO()
+    with av.open(output, mode="w", format="mp4") as container:
+        stream = container.add_stream(
+            encoder, rate=Fraction(codec.fps).limit_denominator(1001)
+        )
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = pix_fmt
+        stream.options = options
+        if codec.gop is not None:
+            stream.codec_context.gop_size = codec.gop
+        for array in frames:
+            frame = av.VideoFrame.from_ndarray(array, format=frame_format)
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        # flush the encoder
+        for packet in stream.encode():
+            container.mux(packet)
+    return output.getvalue()
+
+
+def _av_encoder_settings(
+    codec: MP4AVCCodec, is_color: bool
+) -> Tuple[str, str, str, Dict[str, str]]:
+    """Encoder, input frame format, pixel format and options for PyAV."""
+    frame_format = "bgr24" if is_color else _GRAY_FORMATS[codec.bit_depth]
+    if is_color:
+        # libx264rgb encodes BGR without a lossy conversion to YUV
+        encoder, pix_fmt = (
+            ("libx264rgb", "bgr24") if codec.lossless else ("libx264", "yuv420p")
+        )
+    elif codec.bit_depth == 12:
+        encoder, pix_fmt = "libx265", frame_format
+    elif codec.bit_depth == 10 or codec.lossless:
+        # encoded as 4:0:0 to avoid the range compression of yuv420p
+        encoder, pix_fmt = "libx264", frame_format
+    else:
+        # 8-bit yuv420p, which browsers can play
+        encoder, pix_fmt = "libx264", "yuv420p"
+    options: Dict[str, str] = {}
+    if codec.preset is not None:
+        options["preset"] = codec.preset
+    if encoder == "libx265":
+        # x265 lossless inter frames are not exact when the picture is at
+        # most one CTU wide, so lossless chunks are encoded intra-only
+        options["x265-params"] = "log-level=error" + (
+            ":lossless=1:keyint=1" if codec.lossless else ""
+        )
+        if codec.crf is not None and not codec.lossless:
+            options["crf"] = str(codec.crf)
+    elif codec.lossless:
+        options["qp"] = "0"
+    elif codec.crf is not None:
+        options["crf"] = str(codec.crf)
+    return encoder, frame_format, pix_fmt, options
+
+
+def _decode_av(
+    buf: bytes,
+    frames: "_FrameWriter",
+    *,
+    start: int = 0,
+    stop: Optional[int] = None,
+):
+    import av
+
+    with av.open(io.BytesIO(buf), mode="r", format="mp4") as container:
+        stream = container.streams.video[0]
+        num_frames = stream.frames
+        if stop is not None and num_frames > 0:
+            stop = min(stop, num_frames)
+        frames.start(
+            (stop if stop is not None else num_frames) - start,
+            stream.height,
+            stream.width,
+        )
+        to_ndarray = _av_frame_converter(frames)
+        if start == 0 and stop is None:
+            for frame in container.decode(stream):
+                frames.write(to_ndarray(frame))
+            return
+        # frame i is at start_time + i / rate (the videos are constant rate)
+        rate = stream.average_rate or Fraction(frames.codec.fps)
+        first_pts = stream.start_time or 0
+        time_base = stream.time_base
+
+        def frame_index(frame) -> int:
+            return round((frame.pts - first_pts) * time_base * rate)
+
+        if start > 0:
+            # seek to the keyframe at or before frame start
+            container.seek(
+                first_pts + int(start / rate / time_base),
+                stream=stream,
+                backward=True,
+                any_frame=False,
+            )
+        for frame in container.decode(stream):
+            i = frame_index(frame)
+            if stop is not None and i >= stop:
+                break
+            if i >= start:
+                frames.write(to_ndarray(frame))
+
+
+def _av_frame_converter(frames: "_FrameWriter") -> Callable[[Any], np.ndarray]:
+    """Function converting a decoded PyAV frame to the stored values."""
+    codec = frames.codec
+    if not frames.gray:
+        return lambda frame: frame.to_ndarray(format="bgr24")
+    if codec.bit_depth == 8 and not codec.lossless:
+        # encoded as yuv420p, whose luma has a reduced range
+        return lambda frame: frame.to_ndarray(format="gray")
+    # encoded as 4:0:0, which the H.264 decoder returns as yuv with the luma
+    # holding the exact values, so the luma plane is read without conversion
+    dtype = np.dtype("uint8" if codec.bit_depth == 8 else "<u2")
+
+    def to_ndarray(frame) -> np.ndarray:
+        plane = frame.planes[0]
+        rows = np.frombuffer(plane, dtype).reshape(plane.height, -1)
+        return rows[:, : plane.width]
+
+    return to_ndarray
+
+
+def _encode_cv2(
+    frames: Iterator[np.ndarray], height: int, width: int, fps: float, *, is_color
+) -> bytes:
+    import cv2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_output_fname = f"{tmpdir}/output.mp4"
+        fourcc = cv2.VideoWriter_fourcc(*"avc1")  # type: ignore
+        writer = cv2.VideoWriter(
+            tmp_output_fname,
+            fourcc,
+            fps,
+            (width, height),
+            isColor=is_color,
+        )
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        with open(tmp_output_fname, "rb") as f:
+            return f.read()
+
+
+def _decode_cv2(
+    buf: bytes,
+    frames: "_FrameWriter",
+    *,
+    start: int = 0,
+    stop: Optional[int] = None,
+):
+    import cv2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_input_fname = f"{tmpdir}/input.mp4"
+        with open(tmp_input_fname, "wb") as f:
+            f.write(buf)
+        cap = cv2.VideoCapture(tmp_input_fname)
+        try:
+            num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if stop is not None and num_frames > 0:
+                stop = min(stop, num_frames)
+            frames.start(
+                (stop if stop is not None else num_frames) - start,
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            )
+            if start > 0:
+                # OpenCV seeks to the previous keyframe and decodes up to start
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            for _ in range(start, stop if stop is not None else 2**62):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frames.gray:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                frames.write(frame)
+        finally:
+            cap.release()
+
+
+class _FrameWriter:
+    """
+    Collects decoded frames into out, or into an array preallocated from the
+    frame count of the video, so that the chunk is not copied as a whole.
+    """
+
+    def __init__(self, codec: MP4AVCCodec, out: Optional[np.ndarray]):
+        self.codec = codec
+        self.out = out
+        self.dtype = codec._array_dtype
+        if out is not None and out.dtype != self.dtype:
+            raise ValueError(f"MP4AVCCodec decodes into {self.dtype} arrays only")
+        self.gray = codec.color == "gray"
+        self._index = 0
+        self._frames: Optional[list] = None
+        self._frame_shape: Tuple[int, ...] = (0, 0)
+
+    def start(self, num_frames: int, height: int, width: int):
+        """Set up the output for the frame count and size of the video."""
+        out = self.out
+        if out is not None and self.codec.color is None:
+            # decode grayscale if out has no channel axis
+            self.gray = out.ndim == 3 or (
+                out.ndim != 4 and out.size == num_frames * height * width
+            )
+        self._frame_shape = (height, width) if self.gray else (height, width, 3)
+        if out is not None:
+            # a view with one row per frame (out may be flat or squeezed)
+            self._target = out.reshape((-1, *self._frame_shape))
+        elif num_frames > 0:
+            self._target = np.empty((num_frames, *self._frame_shape), dtype=self.dtype)
+        else:
+            # unknown number of frames, or an empty range
+            self._frames = []
+
+    def write(self, frame: np.ndarray):
+        if self._frames is not None:
+            dest = np.empty(frame.shape, dtype=self.dtype)
+            self.codec._from_stored(frame, dest)
+            self._frames.append(dest)
+            return
+        if self._index >= len(self._target):
+            raise ValueError(
+                f"Video has more frames than the output array ({len(self._target)})"
+            )
+        self.codec._from_stored(frame, self._target[self._index])
+        self._index += 1
+
+    def result(self) -> np.ndarray:
+        if self._frames is not None:
+            if not self._frames:
+                return np.empty((0, *self._frame_shape), dtype=self.dtype)
+            return np.array(self._frames, dtype=self.dtype)
+        if self.out is not None:
+            if self._index != len(self._target):
+                raise ValueError(
+                    f"Video has {self._index} frames, "
+                    f"expected {len(self._target)} for the output array"
+                )
+            return self.out
+        return self._target[: self._index]
@@ -1 +1 @@
-from .MP4AVCCodec import MP4AVCCodec  # noqa: F401
+from .MP4AVCCodec import MP4AVCCodec, write_zarr_array  # noqa: F401
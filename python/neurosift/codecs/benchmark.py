@@ -0,0 +1,399 @@
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numcodecs.abc import Codec
+from numcodecs.compat import ensure_ndarray
+
+from .MP4AVCCodec import MP4AVCCodec
+
+# Movies generated by synthetic_movie
+SYNTHETIC_MOVIES = ("behavior", "imaging", "noise")
+
+
+@dataclass
+class CodecBenchResult:
+    movie: str
+    codec: str
+    config: Dict[str, Any]
+    frames: int
+    height: int
+    width: int
+    channels: int
+    chunk_frames: int
+    raw_bytes: int
+    compressed_bytes: int
+    compression_ratio: float
+    encode_mb_per_sec: float
+    decode_mb_per_sec: float
+    # None when the decoded movie is identical to the original
+    psnr: Optional[float]
+    ssim: float
+    # peak memory allocated through Python (including numpy arrays) while
+    # encoding or decoding one chunk; buffers allocated by libav are not seen
+    peak_encode_mb: float
+    peak_decode_mb: float
+
+
+def synthetic_movie(
+    kind: str, num_frames: int, height: int, width: int, *, seed: int = 0
+) -> np.ndarray:
+    """
+    Generate a reproducible grayscale uint8 movie.
+
+    "behavior" is a textured static arena with a bright blob moving across
+    it, like a camera recording of an animal; "imaging" is a dim background
+    with cell-shaped spots flashing with calcium-like transients and shot
+    noise, like two-photon imaging; "noise" is uniform random noise, the
+    worst case for every codec.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == "noise":
+        return rng.integers(0, 256, (num_frames, height, width), dtype=np.uint8)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    movie = np.empty((num_frames, height, width), dtype=np.uint8)
+    if kind == "behavior":
+        background = 90 + 40 * np.sin(x / 23) * np.cos(y / 17)
+        sigma = min(height, width) / 20
+        for t in range(num_frames):
+            cx = width / 2 + width / 3 * np.sin(2 * np.pi * t / 97)
+            cy = height / 2 + height / 3 * np.sin(2 * np.pi * t / 71 + 1)
+            blob = 120 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * sigma**2))
+            frame = background + blob + rng.normal(0, 3, (height, width))
+            movie[t] = np.clip(frame, 0, 255)
+        return movie
+    if kind == "imaging":
+        num_cells = max(10, height * width // 2000)
+        radius = 4
+        py, px = np.mgrid[-2 * radius : 2 * radius + 1, -2 * radius : 2 * radius + 1]
+        footprint = np.exp(-(px**2 + py**2) / (2 * radius**2)).astype(np.float32)
+        size = footprint.shape[0]
+        positions = np.stack(
+            [
+                rng.integers(0, height - size, num_cells),
+                rng.integers(0, width - size, num_cells),
+            ],
+            axis=1,
+        )
+        # spikes convolved with an exponential decay of 10 frames
+        spikes = (rng.random((num_frames, num_cells)) < 0.02).astype(np.float32)
+        traces = np.zeros_like(spikes)
+        level = np.zeros(num_cells, dtype=np.float32)
+        for t in range(num_frames):
+            level = level * np.exp(-1 / 10) + spikes[t]
+            traces[t] = level
+        amplitudes = rng.uniform(20, 60, num_cells).astype(np.float32)
+        background = 20 + 10 * np.exp(-((x - width / 2) ** 2) / (2 * (width / 3) ** 2))
+        for t in range(num_frames):
+            frame = background.copy()
+            for (r, c), a, v in zip(positions, amplitudes, traces[t]):
+                frame[r : r + size, c : c + size] += (a * (0.3 + v)) * footprint
+            movie[t] = np.clip(rng.poisson(frame), 0, 255)
+        return movie
+    raise ValueError(f"Unknown synthetic movie: {kind}")
+
+
+def load_movie(
+    path: str, *, max_frames: Optional[int] = None, gray: bool = False
+) -> np.ndarray:
+    """
+    Load a uint8 movie from a .npy file ((frames, height, width) or
+    (frames, height, width, 3) BGR) or from a video file (requires PyAV),
+    keeping the first max_frames frames.
+    """
+    if path.endswith(".npy"):
+        movie = np.load(path, mmap_mode="r")[:max_frames]
+        if movie.dtype != np.uint8:
+            raise ValueError(f"{path}: only uint8 movies are supported")
+        if gray and movie.ndim == 4:
+            movie = _bgr_to_gray(movie)
+        return np.ascontiguousarray(movie)
+    import av
+
+    frames: List[np.ndarray] = []
+    with av.open(path) as container:
+        for frame in container.decode(video=0):
+            if max_frames is not None and len(frames) >= max_frames:
+                break
+            frames.append(frame.to_ndarray(format="gray" if gray else "bgr24"))
+    if not frames:
+        raise ValueError(f"{path}: no video frames")
+    return np.stack(frames)
+
+
+def _bgr_to_gray(movie: np.ndarray) -> np.ndarray:
+    weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    return np.clip(np.rint(movie @ weights), 0, 255).astype(np.uint8)
+
+
+def benchmark_codec(
+    codec: Codec,
+    movie: np.ndarray,
+    *,
+    movie_name: str,
+    chunk_frames: int,
+    repeat: int = 2,
+) -> CodecBenchResult:
+    """
+    Encode and decode a movie chunk by chunk with a codec.
+
+    Throughputs (in MB of raw movie per second, one thread) are the best of
+    repeat runs. Peak memory is measured in a separate run with tracemalloc,
+    which would otherwise slow down the timed runs.
+    """
+    chunks = [
+        np.ascontiguousarray(movie[i : i + chunk_frames])
+        for i in range(0, movie.shape[0], chunk_frames)
+    ]
+    raw_bytes = sum(chunk.nbytes for chunk in chunks)
+    encode_seconds = decode_seconds = float("inf")
+    for _ in range(max(1, repeat)):
+        timer = time.perf_counter()
+        bufs = [codec.encode(chunk) for chunk in chunks]
+        encode_seconds = min(encode_seconds, time.perf_counter() - timer)
+        timer = time.perf_counter()
+        decoded = [_decode(codec, buf, chunk) for buf, chunk in zip(bufs, chunks)]
+        decode_seconds = min(decode_seconds, time.perf_counter() - timer)
+    peak_encode, peak_decode = _peak_memory(codec, chunks)
+    restored = np.concatenate(decoded)
+    return CodecBenchResult(
+        movie=movie_name,
+        codec=repr(codec),
+        config=codec.get_config(),
+        frames=movie.shape[0],
+        height=movie.shape[1],
+        width=movie.shape[2],
+        channels=movie.shape[3] if movie.ndim == 4 else 1,
+        chunk_frames=chunk_frames,
+        raw_bytes=raw_bytes,
+        compressed_bytes=sum(len(buf) for buf in bufs),
+        compression_ratio=raw_bytes / max(1, sum(len(buf) for buf in bufs)),
+        encode_mb_per_sec=raw_bytes / 1e6 / encode_seconds,
+        decode_mb_per_sec=raw_bytes / 1e6 / decode_seconds,
+        psnr=psnr(movie, restored),
+        ssim=ssim(movie, restored),
+        peak_encode_mb=peak_encode / 1e6,
+        peak_decode_mb=peak_decode / 1e6,
+    )
+
+
+def _decode(codec: Codec, buf: bytes, chunk: np.ndarray) -> np.ndarray:
+    # generic compressors return bytes; MP4AVCCodec returns the frames
+    decoded = ensure_ndarray(codec.decode(buf))
+    return decoded.view(chunk.dtype).reshape(chunk.shape)
+
+
+def _peak_memory(codec: Codec, chunks: List[np.ndarray]) -> Tuple[int, int]:
+    """Peak bytes allocated while encoding and while decoding one chunk."""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    peak_encode = peak_decode = 0
+    try:
+        for chunk in chunks:
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            buf = codec.encode(chunk)
+            peak_encode = max(peak_encode, tracemalloc.get_traced_memory()[1] - base)
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _decode(codec, buf, chunk)
+            peak_decode = max(peak_decode, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return peak_encode, peak_decode
+
+
+def psnr(original: np.ndarray, decoded: np.ndarray) -> Optional[float]:
+    """Peak signal-to-noise ratio in dB of uint8 data, None if identical."""
+    mse = np.mean((original.astype(np.float64) - decoded) ** 2)
+    if mse == 0:
+        return None
+    return float(10 * np.log10(255**2 / mse))
+
+
+def ssim(original: np.ndarray, decoded: np.ndarray, *, max_images: int = 64) -> float:
+    """
+    Mean structural similarity of uint8 movies, over 7x7 windows of each
+    frame and channel (as skimage's structural_similarity), using at most
+    max_images evenly spaced frames and channels.
+    """
+    if original.ndim == 4:
+        original = np.moveaxis(original, -1, 1)
+        decoded = np.moveaxis(decoded, -1, 1)
+    a = original.reshape(-1, *original.shape[-2:])
+    b = decoded.reshape(-1, *decoded.shape[-2:])
+    step = max(1, a.shape[0] // max_images)
+    k = 7
+    if min(a.shape[1:]) < k:
+        raise ValueError("SSIM needs frames of at least 7x7 pixels")
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    # sample covariances
+    norm = k * k / (k * k - 1)
+    values = []
+    for i in range(0, a.shape[0], step):
+        x = a[i].astype(np.float64)
+        y = b[i].astype(np.float64)
+        mx = _box_mean(x, k)
+        my = _box_mean(y, k)
+        vx = norm * (_box_mean(x * x, k) - mx * mx)
+        vy = norm * (_box_mean(y * y, k) - my * my)
+        cxy = norm * (_box_mean(x * y, k) - mx * my)
+        s = ((2 * mx * my + c1) * (2 * cxy + c2)) / (
+            (mx * mx + my * my + c1) * (vx + vy + c2)
+        )
+        values.append(s.mean())
+    return float(np.mean(values))
+
+
+def _box_mean(image: np.ndarray, k: int) -> np.ndarray:
+    """Means over the k x k windows lying inside an image."""
+    c = np.pad(image.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (c[k:, k:] - c[:-k, k:] - c[k:, :-k] + c[:-k, :-k]) / (k * k)
+
+
+def baseline_codecs() -> List[Codec]:
+    """Lossless numcodecs compressors to compare MP4AVCCodec against."""
+    from numcodecs import Blosc, Zstd
+
+    return [
+        Zstd(level=3),
+        Zstd(level=9),
+        Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE),
+        Blosc(cname="lz4", clevel=5, shuffle=Blosc.BITSHUFFLE),
+    ]
+
+
+def iter_movies(
+    movies: Sequence[str],
+    *,
+    resolutions: Sequence[Tuple[int, int]],
+    num_frames: int,
+    gray: bool = False,
+) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    Yield (name, movie) for each entry of movies, which are names of
+    synthetic movies (generated at each of resolutions, as (height, width))
+    or paths of sample movies (used at their own resolution).
+    """
+    for spec in movies:
+        if spec in SYNTHETIC_MOVIES:
+            for height, width in resolutions:
+                yield f"{spec} {width}x{height}", synthetic_movie(
+                    spec, num_frames, height, width
+                )
+        else:
+            movie = load_movie(spec, max_frames=num_frames, gray=gray)
+            yield f"{os.path.basename(spec)} {movie.shape[2]}x{movie.shape[1]}", movie
+
+
+def run_codec_benchmark(
+    movies: Sequence[str] = SYNTHETIC_MOVIES,
+    *,
+    resolutions: Sequence[Tuple[int, int]] = ((256, 256), (512, 512)),
+    chunk_frames: Sequence[int] = (30, 120),
+    fps: Sequence[float] = (30,),
+    crf: Sequence[Optional[float]] = (17, 23, 28),
+    preset: Optional[str] = None,
+    lossless: bool = True,
+    baselines: bool = True,
+    num_frames: int = 240,
+    gray: bool = False,
+    repeat: int = 2,
+    on_result: Optional[Callable[[CodecBenchResult], None]] = None,
+) -> List[CodecBenchResult]:
+    """
+    Benchmark MP4AVCCodec, at each combination of fps and crf (and in
+    lossless mode), against the baseline_codecs compressors, for every movie
+    and number of frames per chunk. Synthetic movies have num_frames frames;
+    sample movies are cut to num_frames.
+
+    on_result is called with each result as it is measured.
+    """
+    results: List[CodecBenchResult] = []
+    for name, movie in iter_movies(
+        movies, resolutions=resolutions, num_frames=num_frames, gray=gray
+    ):
+        color = "bgr" if movie.ndim == 4 else "gray"
+        codecs: List[Codec] = []
+        for f in fps:
+            codecs += [MP4AVCCodec(f, color=color, crf=c, preset=preset) for c in crf]
+            if lossless:
+                codecs.append(MP4AVCCodec(f, color=color, preset=preset, lossless=True))
+        if baselines:
+            codecs += baseline_codecs()
+        for n in chunk_frames:
+            for codec in codecs:
+                result = benchmark_codec(
+                    codec, movie, movie_name=name, chunk_frames=n, repeat=repeat
+                )
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    return results
+
+
+def benchmark_environment() -> Dict[str, Any]:
+    """Versions and machine details to store alongside the results."""
+    import numcodecs
+
+    env: Dict[str, Any] = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "numcodecs": numcodecs.__version__,
+    }
+    try:
+        from importlib.metadata import version
+
+        env["neurosift"] = version("neurosift")
+    except Exception:
+        env["neurosift"] = None
+    try:
+        import av
+
+        env["av"] = av.__version__
+        env["ffmpeg"] = ".".join(str(v) for v in av.library_versions["libavcodec"])
+    except ImportError:
+        env["av"] = None
+    return env
+
+
+def codec_results_to_json(results: List[CodecBenchResult]) -> Dict[str, Any]:
+    return {
+        "environment": benchmark_environment(),
+        "results": [asdict(r) for r in results],
+    }
+
+
+def format_codec_result(result: CodecBenchResult) -> str:
+    psnr_text = "exact" if result.psnr is None else f"{result.psnr:.1f}"
+    return (
+        f"{result.movie:<22} {result.chunk_frames:>6} {result.codec[:44]:<44} "
+        f"{result.compression_ratio:>7.2f} {result.encode_mb_per_sec:>8.1f} "
+        f"{result.decode_mb_per_sec:>8.1f} {psnr_text:>6} {result.ssim:>6.4f} "
+        f"{max(result.peak_encode_mb, result.peak_decode_mb):>8.1f}"
+    )
+
+
+def format_codec_header() -> str:
+    return (
+        f"{'movie':<22} {'chunk':>6} {'codec':<44} {'ratio':>7} {'enc MB/s':>8} "
+        f"{'dec MB/s':>8} {'PSNR':>6} {'SSIM':>6} {'peak MB':>8}"
+    )
+
+
+def format_codec_report(results: List[CodecBenchResult]) -> str:
+    return "\n".join(
+        [format_codec_header()] + [format_codec_result(r) for r in results]
+    )
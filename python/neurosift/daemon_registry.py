@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+import urllib.request
+from typing import List, Optional, Tuple
+
+from .user_cache_dir import get_user_cache_dir
+
+
+def register_daemon(directory: str, port: int) -> str:
+    """
+    Record a running `neurosift serve` daemon so that view-nwb can reuse it.
+    Returns the path of the registration file, to be removed on exit.
+    """
+    path = os.path.join(get_user_cache_dir("daemons"), f"{port}.json")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "directory": os.path.realpath(directory),
+                "port": port,
+                "pid": os.getpid(),
+            },
+            f,
+        )
+    return path
+
+
+def unregister_daemon(registration_path: str):
+    try:
+        os.remove(registration_path)
+    except OSError:
+        pass
+
+
+def find_daemon_for_files(paths: List[str]) -> Optional[Tuple[int, str]]:
+    """
+    Find a running daemon whose directory contains all of the given files.
+
+    Returns (port, directory) or None. Stale registrations are removed.
+    """
+    real_paths = [os.path.realpath(p) for p in paths]
+    registry_dir = get_user_cache_dir("daemons")
+    for name in sorted(os.listdir(registry_dir)):
+        registration_path = os.path.join(registry_dir, name)
+        try:
+            with open(registration_path) as f:
+                info = json.load(f)
+            directory: str = info["directory"]
+            port: int = info["port"]
+            pid: int = info["pid"]
+        except Exception:
+            continue
+        prefix = directory.rstrip(os.sep) + os.sep
+        if not all(p.startswith(prefix) for p in real_paths):
+            continue
+        if not _is_daemon_alive(pid, port):
+            unregister_daemon(registration_path)
+            continue
+        return port, directory
+    return None
+
+
+def _is_daemon_alive(pid: int, port: int) -> bool:
+    if sys.platform != "win32":
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+    # bypass any configured HTTP proxy for this local request
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    try:
+        with opener.open(f"http://localhost:{port}/list/", timeout=2) as r:
+            return r.status == 200
+    except Exception:
+        return False
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Hashable, List, Tuple
+
+
+@dataclass
+class BlockCacheStats:
+    hits: int = 0
+    misses: int = 0
+    readahead_blocks: int = 0
+    disk_reads: int = 0
+    disk_bytes: int = 0
+    disk_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+@dataclass
+class _StreamState:
+    next_block: int = -1
+    window: int = 0
+
+
+class BlockCache:
+    """
+    Bounded LRU cache of aligned file blocks, shared by all files served by a
+    LocalFileServer.
+
+    Requests are mapped to block_size-aligned blocks. Missing blocks that are
+    adjacent (within one request, or across the ranges of a multi-range
+    request) are fetched with a single disk read. When a file is read
+    sequentially, the cache reads ahead with a window that doubles on each
+    sequential request up to max_readahead_bytes.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        block_size: int = 64 * 1024,
+        max_readahead_bytes: int = 4 * 1024 * 1024,
+    ):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum total size of the cached blocks.
+        block_size : int
+            Size of the aligned blocks.
+        max_readahead_bytes : int
+            Maximum amount of data read ahead of a sequential reader.
+        """
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.max_readahead_blocks = max_readahead_bytes // block_size
+        self.stats = BlockCacheStats()
+        self._blocks: "OrderedDict[Tuple[Hashable, int], bytes]" = OrderedDict()
+        self._num_bytes = 0
+        self._streams: "OrderedDict[Hashable, _StreamState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def num_bytes(self) -> int:
+        return self._num_bytes
+
+    def read_ranges(
+        self,
+        path: str,
+        file_key: Hashable,
+        file_size: int,
+        ranges: List[Tuple[int, int]],
+    ) -> List[bytes]:
+        """
+        Read (offset, count) ranges of a file through the cache.
+
+        file_key identifies the version of the file (for example path, size
+        and mtime) so that modified files are not served from stale blocks.
+        This does blocking disk I/O and is meant to be run in an executor.
+        """
+        bs = self.block_size
+        ranges = [(offset, min(count, file_size - offset)) for offset, count in ranges]
+        needed = sorted(
+            {
+                i
+                for offset, count in ranges
+                if count > 0
+                for i in range(offset // bs, (offset + count - 1) // bs + 1)
+            }
+        )
+        if not needed:
+            return [b"" for _ in ranges]
+        local: Dict[int, bytes] = {}
+        with self._lock:
+            for i in needed:
+                block = self._blocks.get((file_key, i))
+                if block is not None:
+                    self._blocks.move_to_end((file_key, i))
+                    local[i] = block
+            missing = [i for i in needed if i not in local]
+            self.stats.hits += len(needed) - len(missing)
+            self.stats.misses += len(missing)
+            window = self._update_stream(file_key, needed[0], needed[-1])
+            last_block = (file_size - 1) // bs
+            readahead = [
+                i
+                for i in range(needed[-1] + 1, min(needed[-1] + window, last_block) + 1)
+                if (file_key, i) not in self._blocks
+            ]
+            self.stats.readahead_blocks += len(readahead)
+        to_read = missing + readahead
+        if to_read:
+            fetched: Dict[int, bytes] = {}
+            with open(path, "rb") as f:
+                for run_start, run_end in _coalesce(to_read):
+                    t0 = time.perf_counter()
+                    data = _pread(f, run_start * bs, (run_end - run_start + 1) * bs)
+                    elapsed = time.perf_counter() - t0
+                    with self._lock:
+                        self.stats.disk_reads += 1
+                        self.stats.disk_bytes += len(data)
+                        self.stats.disk_seconds += elapsed
+                    for i in range(run_start, run_end + 1):
+                        block = data[(i - run_start) * bs : (i - run_start + 1) * bs]
+                        if block:
+                            fetched[i] = block
+            with self._lock:
+                for i, block in fetched.items():
+                    self._insert((file_key, i), block)
+            for i in missing:
+                local[i] = fetched.get(i, b"")
+        ret = []
+        for offset, count in ranges:
+            if count <= 0:
+                ret.append(b"")
+                continue
+            b0 = offset // bs
+            b1 = (offset + count - 1) // bs
+            data = b"".join(local[i] for i in range(b0, b1 + 1))
+            start = offset - b0 * bs
+            ret.append(data[start : start + count])
+        return ret
+
+    def _update_stream(self, file_key: Hashable, first: int, last: int) -> int:
+        """Track sequential access per file and return the readahead window."""
+        state = self._streams.get(file_key)
+        if state is None:
+            state = _StreamState()
+            self._streams[file_key] = state
+            if len(self._streams) > 1000:
+                self._streams.popitem(last=False)
+        else:
+            self._streams.move_to_end(file_key)
+        if state.next_block - 1 <= first <= state.next_block:
+            state.window = min(max(2, state.window * 2), self.max_readahead_blocks)
+        else:
+            state.window = 0
+        state.next_block = last + 1
+        return state.window
+
+    def _insert(self, key: Tuple[Hashable, int], block: bytes):
+        existing = self._blocks.pop(key, None)
+        if existing is not None:
+            self._num_bytes -= len(existing)
+        self._blocks[key] = block
+        self._num_bytes += len(block)
+        while self._num_bytes > self.max_bytes and self._blocks:
+            _, evicted = self._blocks.popitem(last=False)
+            self._num_bytes -= len(evicted)
+
+    def format_stats(self) -> str:
+        s = self.stats
+        return (
+            f"Block cache: {s.hits} hits, {s.misses} misses "
+            f"({s.hit_rate * 100:.1f}% hit rate), "
+            f"{s.readahead_blocks} blocks read ahead, "
+            f"{s.disk_reads} disk reads ({s.disk_bytes / 1e6:.1f} MB "
+            f"in {s.disk_seconds:.2f}s), "
+            f"{self._num_bytes / 1e6:.1f} MB cached"
+        )
+
+
+def _coalesce(blocks: List[int]) -> List[Tuple[int, int]]:
+    """Group block indices into runs of consecutive blocks (inclusive)."""
+    runs: List[Tuple[int, int]] = []
+    for i in sorted(set(blocks)):
+        if runs and runs[-1][1] == i - 1:
+            runs[-1] = (runs[-1][0], i)
+        else:
+            runs.append((i, i))
+    return runs
+
+
+def _pread(f: BinaryIO, offset: int, count: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), count, offset)
+    # Windows
+    f.seek(offset)
+    return f.read(count)
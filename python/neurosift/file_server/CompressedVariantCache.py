@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import os
+import shutil
+import threading
+from typing import BinaryIO, Callable, List, Optional
+
+from ..user_cache_dir import evict_lru_files, get_user_cache_dir
+
+# Files smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+class CompressedVariantCache:
+    """
+    Per-user disk cache of gzip (and, if the zstandard package is installed,
+    zstd) compressed copies of served files, so that large text-like files
+    such as .lindi.json and .zmetadata are compressed once per version.
+
+    Entries are keyed by the real path, size and mtime of the source file and
+    the encoding, and the least recently used entries are removed once the
+    cache exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = 2 * 1024**3,
+        gzip_level: int = 6,
+        zstd_level: int = 10,
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory for the cached files (default: <user cache dir>/compressed).
+        max_bytes : int
+            Maximum total size of the cached files.
+        gzip_level : int
+            gzip compression level.
+        zstd_level : int
+            zstd compression level.
+        """
+        self.cache_dir = cache_dir or get_user_cache_dir("compressed")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        # supported content encodings, in order of preference
+        self.encodings: List[str] = ["gzip"]
+        try:
+            import zstandard  # noqa: F401
+
+            self.encodings.insert(0, "zstd")
+        except ImportError:
+            pass
+        self._lock = threading.Lock()
+
+    def get_or_build(
+        self,
+        path: str,
+        encoding: str,
+        *,
+        render: Optional[Callable[[], bytes]] = None,
+        render_key: str = "",
+    ) -> str:
+        """
+        Return the path of the compressed copy of a file, creating it first
+        if needed.
+
+        If render is given, its output (identified by render_key, e.g. the
+        URL substituted into a LINDI index) is compressed instead of the
+        content of path. This does blocking I/O and is meant to be run in an
+        executor.
+        """
+        st = os.stat(path)
+        key = hashlib.sha256(
+            f"{os.path.realpath(path)}\n{st.st_size}\n{st.st_mtime_ns}\n"
+            f"{render_key}".encode()
+        ).hexdigest()[:32]
+        cached_path = os.path.join(self.cache_dir, f"{key}.{encoding}")
+        if os.path.exists(cached_path):
+            # mark as recently used
+            os.utime(cached_path)
+            return cached_path
+        # compress one file at a time so that concurrent requests for the same
+        # file do not duplicate the work
+        with self._lock:
+            if os.path.exists(cached_path):
+                return cached_path
+            tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as out:
+                    if render is not None:
+                        out.write(self._compress(render(), encoding))
+                    else:
+                        with open(path, "rb") as src:
+                            self._compress_stream(src, out, encoding)
+                os.replace(tmp_path, cached_path)
+            except BaseException:
+                # eviction only looks at complete files
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+        evict_lru_files(
+            self.cache_dir,
+            max_bytes=self.max_bytes,
+            suffix=(".gzip", ".zstd"),
+            keep=cached_path,
+        )
+        return cached_path
+
+    def open(
+        self,
+        path: str,
+        encoding: str,
+        *,
+        render: Optional[Callable[[], bytes]] = None,
+        render_key: str = "",
+    ) -> BinaryIO:
+        """
+        Open the compressed copy of a file for reading, creating it first if
+        needed (see get_or_build).
+
+        The copy is created again if it is evicted, by another request or
+        process, before it can be opened.
+        """
+        kwargs = {"render": render, "render_key": render_key}
+        try:
+            return open(self.get_or_build(path, encoding, **kwargs), "rb")
+        except FileNotFoundError:
+            return open(self.get_or_build(path, encoding, **kwargs), "rb")
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(data)
+        if encoding == "gzip":
+            return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def _compress_stream(self, src: BinaryIO, out: BinaryIO, encoding: str):
+        if encoding == "zstd":
+            import zstandard
+
+            zstandard.ZstdCompressor(level=self.zstd_level).copy_stream(src, out)
+        elif encoding == "gzip":
+            with gzip.GzipFile(
+                fileobj=out, mode="wb", compresslevel=self.gzip_level, mtime=0
+            ) as gz:
+                shutil.copyfileobj(src, gz, 1024 * 1024)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Optional
+
+from ..user_cache_dir import evict_lru_files, get_user_cache_dir
+
+
+class DiskBlockCache:
+    """
+    Persistent per-user cache of aligned blocks of remote files, shared by all
+    proxied URLs.
+
+    Each block is stored as one file named <file key>-<block index>.blk. The
+    least recently used blocks are removed once the cache exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = 10 * 1024**3,
+        block_size: int = 1024 * 1024,
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory for the cached blocks (default: <user cache dir>/blocks).
+        max_bytes : int
+            Maximum total size of the cached blocks.
+        block_size : int
+            Size of the aligned blocks.
+        """
+        self.cache_dir = cache_dir or get_user_cache_dir("blocks")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._num_bytes = _total_block_bytes(self.cache_dir)
+        self._evict_if_needed()
+
+    @property
+    def num_bytes(self) -> int:
+        return self._num_bytes
+
+    def get(self, file_key: str, index: int) -> Optional[bytes]:
+        """Return a cached block, or None if it is not cached."""
+        path = self._block_path(file_key, index)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, file_key: str, index: int, data: bytes):
+        path = self._block_path(file_key, index)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            # the block may already be cached, e.g. fetched by two requests
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._num_bytes += len(data) - old_size
+        self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._num_bytes <= self.max_bytes:
+                return
+            # evict down to 90% so that eviction does not run on every put
+            evict_lru_files(
+                self.cache_dir, max_bytes=int(self.max_bytes * 0.9), suffix=".blk"
+            )
+            self._num_bytes = _total_block_bytes(self.cache_dir)
+
+    def _block_path(self, file_key: str, index: int) -> str:
+        return os.path.join(self.cache_dir, f"{file_key}-{index}.blk")
+
+
+def _total_block_bytes(cache_dir: str) -> int:
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".blk"):
+            continue
+        try:
+            total += entry.stat().st_size
+        except OSError:
+            # removed by another process
+            pass
+    return total
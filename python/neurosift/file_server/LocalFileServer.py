@@ -0,0 +1,998 @@
+import asyncio
+import json
+import os
+import re
+import stat
+import sys
+import threading
+import time
+import traceback
+import urllib.parse
+import uuid
+from dataclasses import dataclass, field
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from ..LindiIndexCache import LindiIndexCache, is_plain_hdf5_file
+from .BlockCache import BlockCache
+from .CompressedVariantCache import MIN_COMPRESS_BYTES, CompressedVariantCache
+from .RemoteFile import RemoteFile
+from .RequestMetrics import RequestMetrics
+from .VideoTranscoder import TranscodeJob
+from .helpers import (
+    BINARY_RANGES_CONTENT_TYPE,
+    cors_headers,
+    encode_binary_ranges_header,
+    is_compressible,
+    is_shareable,
+    negotiate_content_encoding,
+    parse_range_header,
+)
+
+# Maximum size of the request line plus headers
+MAX_HEADER_BYTES = 64 * 1024
+
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT_SEC = 60
+
+# Requests for more data than this bypass the block cache and use sendfile
+MAX_CACHED_REQUEST_BYTES = 8 * 1024 * 1024
+
+# Limits for batched range requests (POST /files/<path>)
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_RANGES = 10000
+
+# Interval for logging block cache statistics
+CACHE_STATS_INTERVAL_SEC = 30
+
+# Interval for polling a video that is being converted for more data, and
+# how long a range request past the converted part waits for it
+VIDEO_POLL_INTERVAL_SEC = 0.2
+VIDEO_RANGE_WAIT_SEC = 60
+
+# Size of the chunks of a video streamed while it is being converted
+VIDEO_CHUNK_BYTES = 1024 * 1024
+
+STATUS_REASONS = {
+    200: "OK",
+    204: "No Content",
+    206: "Partial Content",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Content Too Large",
+    416: "Range Not Satisfiable",
+    500: "Internal Server Error",
+}
+
+
+@dataclass
+class _ServedFile:
+    path: str
+    # identifies the version of the file for the block caches
+    key: Hashable
+    size: int
+    remote: Optional[RemoteFile] = None
+    content_type: str = "application/octet-stream"
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    path: str
+    query: Dict[str, str]
+    version: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+    # byte ranges (start, end inclusive) served in response, for metrics
+    served_ranges: Optional[List[Tuple[int, int]]] = None
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class LocalFileServer:
+    """
+    Asyncio HTTP/1.1 server exposing the files in a directory at /files/<path>
+    for the neurosift web app.
+
+    This is a dependency-free replacement for local-file-access-js. It supports
+    single and multiple byte ranges, HEAD requests and keep-alive connections,
+    sends file data with os.sendfile where the platform allows it, and applies
+    the same CORS allowlist as the express server. Small reads go through an
+    optional BlockCache, which coalesces and reads ahead on slow file systems.
+
+    Many ranges can also be fetched in one round trip by POSTing a Range
+    header value (e.g. "bytes=0-99,4096-8191") as the text/plain body of a
+    request to /files/<path>. The response is multipart/byteranges, or the
+    compact binary framing described in helpers.encode_binary_ranges_header
+    when the request has Accept: application/x-neurosift-ranges.
+
+    With a lindi_cache, GET /files/<path>.lindi.json for an HDF5 file <path>
+    that has no such sibling on disk serves its cached LINDI index. With
+    allow_listing, GET /list/<dir> returns the directory entries as JSON.
+    With a compression_cache, whole-file GETs of text-like files (JSON,
+    zarr metadata, virtual LINDI indexes) are sent gzip or zstd encoded when
+    the client accepts it. With metrics, GET /metrics returns request metrics
+    in the Prometheus text format (or JSON with ?format=json or
+    Accept: application/json). Files in remote_files are served from their
+    remote URL through a disk cache rather than from the directory.
+    Videos in video_jobs are served as their fragmented MP4 conversion, which
+    is streamed while it is being written.
+
+    Browsers open at most six HTTP/1.1 connections per origin. With
+    fanout_ports, the files are also served on other ports and virtual LINDI
+    indexes spread their chunk refs over all of them, so the viewer can load
+    more chunks in parallel.
+
+    Example
+    -------
+    server = LocalFileServer("/path/to/dir", port=61762)
+    server.start()  # returns once the server is listening
+    server.wait()  # serve until Ctrl-C
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        port: int,
+        host: str = "localhost",
+        on_first_request: Optional[Callable[[], None]] = None,
+        block_cache: Optional[BlockCache] = None,
+        lindi_cache: Optional[LindiIndexCache] = None,
+        allow_listing: bool = False,
+        metrics: Optional[RequestMetrics] = None,
+        compression_cache: Optional[CompressedVariantCache] = None,
+        remote_files: Optional[Dict[str, RemoteFile]] = None,
+        fanout_ports: Sequence[int] = (),
+        video_jobs: Optional[Dict[str, TranscodeJob]] = None,
+    ):
+        """
+        Parameters
+        ----------
+        directory : str
+            The directory whose files are served.
+        port : int
+            The port to listen on.
+        host : str
+            The interface to bind (default: localhost).
+        on_first_request : callable, optional
+            Called (from the server thread) once the first file request has
+            been served.
+        block_cache : BlockCache, optional
+            Cache used for requests of up to MAX_CACHED_REQUEST_BYTES.
+        lindi_cache : LindiIndexCache, optional
+            Cache used to serve LINDI indexes of HDF5 files.
+        allow_listing : bool
+            Whether to serve directory listings at /list/<dir>.
+        metrics : RequestMetrics, optional
+            Records the requests for /files/ and serves them at /metrics.
+        compression_cache : CompressedVariantCache, optional
+            Cache of compressed copies of text-like files.
+        remote_files : dict, optional
+            Remote files served at /files/<name>, keyed by name.
+        fanout_ports : sequence of int
+            Additional ports on which the same files are served. The chunk
+            refs of virtual LINDI indexes are spread over all the ports.
+        video_jobs : dict, optional
+            Conversions of videos served in place of the files, keyed by name.
+        """
+        self.directory = directory
+        self.port = port
+        self.host = host
+        self._on_first_request = on_first_request
+        self.block_cache = block_cache
+        self.lindi_cache = lindi_cache
+        self.allow_listing = allow_listing
+        self.metrics = metrics
+        self.compression_cache = compression_cache
+        self.remote_files = remote_files or {}
+        self.fanout_ports = list(fanout_ports)
+        self.video_jobs = video_jobs or {}
+        # status and content length of the last response on each connection
+        self._response_heads: Dict[asyncio.StreamWriter, Tuple[int, int]] = {}
+        self._first_request_served = False
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+
+    def start(self, timeout: Optional[float] = None):
+        """
+        Start serving in a background thread and return once listening.
+
+        Raises TimeoutError if the server is not listening within timeout
+        seconds, or the bind error if the server could not start.
+        """
+        self._thread = threading.Thread(target=self._run_thread, daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(
+                f"File server did not start listening on port {self.port} "
+                f"within {timeout} seconds"
+            )
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    def stop(self):
+        """Stop the server started with start()."""
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self):
+        """Block until the server stops or Ctrl-C is pressed."""
+        try:
+            while self._thread is not None and self._thread.is_alive():
+                self._thread.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping server")
+            self.stop()
+
+    def _run_thread(self):
+        try:
+            asyncio.run(self.serve())
+        except BaseException as e:  # pragma: no cover
+            if not self._ready.is_set():
+                self._startup_error = e
+                self._ready.set()
+            else:
+                traceback.print_exc()
+
+    async def serve(self):
+        """Run the server on the current event loop until stop() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        servers = []
+        try:
+            for port in [self.port, *self.fanout_ports]:
+                servers.append(
+                    await asyncio.start_server(
+                        self._handle_connection, self.host, port, limit=MAX_HEADER_BYTES
+                    )
+                )
+            print(f"Serving files in {self.directory} on port {self.port}.")
+            if self.fanout_ports:
+                print(
+                    "Spreading LINDI chunk requests over ports "
+                    + ", ".join(str(p) for p in [self.port, *self.fanout_ports])
+                )
+            self._ready.set()
+            stats_task = asyncio.create_task(self._log_cache_stats_periodically())
+            await self._stop_event.wait()
+            stats_task.cancel()
+        finally:
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+        for stats in self._format_cache_stats():
+            print(stats)
+
+    def _format_cache_stats(self) -> List[str]:
+        ret = []
+        if self.block_cache is not None:
+            ret.append(self.block_cache.format_stats())
+        for remote in self.remote_files.values():
+            ret.append(remote.format_stats())
+        return ret
+
+    async def _log_cache_stats_periodically(self):
+        if self.block_cache is None and not self.remote_files:
+            return
+        last_logged = None
+        while True:
+            await asyncio.sleep(CACHE_STATS_INTERVAL_SEC)
+            stats = "\n".join(self._format_cache_stats())
+            if stats != last_logged:
+                print(stats)
+                last_logged = stats
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT_SEC
+                    )
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError,
+                ):
+                    break
+                request = _parse_request_head(head)
+                if request is None:
+                    await self._send_response(writer, 400, {}, b"Bad request")
+                    break
+                content_length = _parse_content_length(
+                    request.headers.get("content-length")
+                )
+                if content_length is None:
+                    await self._send_response(
+                        writer, 400, {}, b"Invalid Content-Length"
+                    )
+                    break
+                if content_length > MAX_BODY_BYTES:
+                    await self._send_response(writer, 413, {}, b"Request too large")
+                    break
+                if content_length > 0:
+                    request.body = await reader.readexactly(content_length)
+                started = time.perf_counter()
+                try:
+                    await self._handle_request(request, writer)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    await self._send_response(
+                        writer, 500, {}, b"Internal server error", keep_alive=False
+                    )
+                    break
+                if self.metrics is not None:
+                    self._record_metrics(request, writer, started)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._response_heads.pop(writer, None)
+            writer.close()
+
+    def _record_metrics(
+        self, request: HttpRequest, writer: asyncio.StreamWriter, started: float
+    ):
+        assert self.metrics is not None
+        if not request.path.startswith("/files/"):
+            return
+        status, content_length = self._response_heads.get(writer, (0, 0))
+        self.metrics.record(
+            method=request.method,
+            path=request.path,
+            status=status,
+            num_bytes=0 if request.method == "HEAD" else content_length,
+            duration=time.perf_counter() - started,
+            ranges=request.served_ranges,
+            file_name=request.path[len("/files/") :] if status < 400 else None,
+        )
+
+    async def _handle_request(self, request: HttpRequest, writer: asyncio.StreamWriter):
+        cors = cors_headers(request.headers.get("origin"))
+        keep_alive = request.keep_alive
+        if request.method == "OPTIONS":
+            await self._send_response(writer, 200, cors, b"OK", keep_alive=keep_alive)
+            return
+        if self.allow_listing and (
+            request.path == "/list" or request.path.startswith("/list/")
+        ):
+            await self._send_listing(request, writer, cors)
+            return
+        if self.metrics is not None and request.path == "/metrics":
+            await self._send_metrics(request, writer, cors)
+            return
+        if not request.path.startswith("/files/"):
+            await self._send_response(
+                writer, 404, cors, b"Not found", keep_alive=keep_alive
+            )
+            return
+        if request.method not in ("GET", "HEAD", "POST"):
+            await self._send_response(
+                writer,
+                405,
+                {**cors, "Allow": "GET, HEAD, POST, OPTIONS"},
+                b"Method not allowed",
+                keep_alive=keep_alive,
+            )
+            return
+        file_name = request.path[len("/files/") :]
+        if not is_shareable(file_name):
+            print(f"Access to this file is forbidden. {file_name}", file=sys.stderr)
+            await self._send_response(
+                writer,
+                403,
+                cors,
+                b"Access to this file is forbidden.",
+                keep_alive=keep_alive,
+            )
+            return
+        remote = self.remote_files.get(file_name)
+        if remote is not None:
+            served = _ServedFile(
+                path=remote.url, key=remote.file_key, size=remote.size, remote=remote
+            )
+            if request.method == "POST":
+                await self._send_batch(request, writer, served, cors)
+            else:
+                await self._send_file(request, writer, served, cors)
+            self._mark_first_request_served()
+            return
+        full_file_name = f"{self.directory}/{file_name}"
+        content_type = "application/octet-stream"
+        job = self.video_jobs.get(file_name)
+        if job is not None and not job.failed and request.method != "POST":
+            if not job.done:
+                await self._send_growing_video(request, writer, job, cors)
+                self._mark_first_request_served()
+                return
+            # serve the converted video in place of the original
+            full_file_name = job.output_path
+            content_type = "video/mp4"
+        try:
+            st = os.stat(full_file_name)
+        except OSError:
+            st = None
+        if (
+            st is None
+            and self.lindi_cache is not None
+            and request.method == "GET"
+            and file_name.endswith(".lindi.json")
+        ):
+            encoding = self._negotiate_encoding(request)
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, self._get_lindi_index, file_name[: -len(".lindi.json")], encoding
+            )
+            if data is not None:
+                headers = _add_vary(cors, "Accept-Encoding")
+                if encoding is not None:
+                    headers["Content-Encoding"] = encoding
+                await self._send_response(
+                    writer,
+                    200,
+                    headers,
+                    data,
+                    keep_alive=keep_alive,
+                    content_type="application/json",
+                )
+                self._mark_first_request_served()
+                return
+        if st is None or not stat.S_ISREG(st.st_mode):
+            await self._send_response(
+                writer, 404, cors, b"File not found", keep_alive=keep_alive
+            )
+            return
+        served = _ServedFile(
+            path=full_file_name,
+            key=(full_file_name, st.st_size, st.st_mtime_ns),
+            size=st.st_size,
+            content_type=content_type,
+        )
+        if request.method == "POST":
+            await self._send_batch(request, writer, served, cors)
+        else:
+            await self._send_file(request, writer, served, cors)
+        self._mark_first_request_served()
+
+    def _mark_first_request_served(self):
+        if not self._first_request_served:
+            self._first_request_served = True
+            if self._on_first_request is not None:
+                self._on_first_request()
+
+    def _get_lindi_index(
+        self, file_name: str, encoding: Optional[str]
+    ) -> Optional[bytes]:
+        """
+        LINDI index for the HDF5 file at file_name, compressed with encoding
+        if given, or None if unavailable.
+        """
+        assert self.lindi_cache is not None
+        full_file_name = f"{self.directory}/{file_name}"
+        if not is_plain_hdf5_file(full_file_name):
+            return None
+        try:
+            cached_path = self.lindi_cache.get_or_build(full_file_name)
+        except ImportError:
+            return None
+        urls = [
+            f"http://localhost:{port}/files/{urllib.parse.quote(file_name)}"
+            for port in [self.port, *self.fanout_ports]
+        ]
+        lindi_cache = self.lindi_cache
+        if encoding is None:
+            return lindi_cache.render_for_urls(cached_path, urls)
+        assert self.compression_cache is not None
+        with self.compression_cache.open(
+            cached_path,
+            encoding,
+            render=lambda: lindi_cache.render_for_urls(cached_path, urls),
+            render_key="\n".join(urls),
+        ) as f:
+            return f.read()
+
+    def _negotiate_encoding(self, request: HttpRequest) -> Optional[str]:
+        """Content encoding to use for a whole-file response, if any."""
+        if self.compression_cache is None or "range" in request.headers:
+            return None
+        return negotiate_content_encoding(
+            request.headers.get("accept-encoding"), self.compression_cache.encodings
+        )
+
+    async def _send_listing(
+        self,
+        request: HttpRequest,
+        writer: asyncio.StreamWriter,
+        cors: Dict[str, str],
+    ):
+        """Respond with the shareable entries of a directory as JSON."""
+        dir_name = request.path[len("/list") :].strip("/")
+        full_dir_name = f"{self.directory}/{dir_name}" if dir_name else self.directory
+        if (dir_name and not is_shareable(dir_name)) or not os.path.isdir(
+            full_dir_name
+        ):
+            await self._send_response(
+                writer, 404, cors, b"Directory not found", keep_alive=request.keep_alive
+            )
+            return
+        entries = []
+        for entry in sorted(os.scandir(full_dir_name), key=lambda e: e.name):
+            if not is_shareable(entry.name):
+                continue
+            try:
+                entry_stat = entry.stat()
+            except OSError:
+                continue
+            is_dir = stat.S_ISDIR(entry_stat.st_mode)
+            entries.append(
+                {
+                    "name": entry.name,
+                    "type": "directory" if is_dir else "file",
+                    "size": 0 if is_dir else entry_stat.st_size,
+                    "mtime": entry_stat.st_mtime,
+                }
+            )
+        body = json.dumps({"path": dir_name, "entries": entries}).encode()
+        await self._send_response(
+            writer,
+            200,
+            cors,
+            body,
+            keep_alive=request.keep_alive,
+            content_type="application/json",
+        )
+
+    async def _send_metrics(
+        self,
+        request: HttpRequest,
+        writer: asyncio.StreamWriter,
+        cors: Dict[str, str],
+    ):
+        assert self.metrics is not None
+        if request.query.get("format") == "json" or "application/json" in (
+            request.headers.get("accept", "")
+        ):
+            body = json.dumps(self.metrics.to_json()).encode()
+            content_type = "application/json"
+        else:
+            body = self.metrics.to_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        await self._send_response(
+            writer,
+            200,
+            cors,
+            body,
+            keep_alive=request.keep_alive,
+            content_type=content_type,
+        )
+
+    async def _send_file(
+        self,
+        request: HttpRequest,
+        writer: asyncio.StreamWriter,
+        served: _ServedFile,
+        cors: Dict[str, str],
+    ):
+        file_size = served.size
+        keep_alive = request.keep_alive
+        head_only = request.method == "HEAD"
+        ranges = parse_range_header(request.headers.get("range"), file_size)
+        headers = {
+            **cors,
+            "Accept-Ranges": "bytes",
+            "Content-Type": served.content_type,
+        }
+        compressible = (
+            self.compression_cache is not None
+            and served.remote is None
+            and is_compressible(served.path)
+            and file_size >= MIN_COMPRESS_BYTES
+        )
+        if compressible:
+            headers = _add_vary(headers, "Accept-Encoding")
+        encoding = self._negotiate_encoding(request) if compressible else None
+        if ranges is None and encoding is not None:
+            assert self.compression_cache is not None
+            f = await asyncio.get_running_loop().run_in_executor(
+                None, self.compression_cache.open, served.path, encoding
+            )
+            with f:
+                compressed_size = os.fstat(f.fileno()).st_size
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(compressed_size)
+                self._write_head(writer, 200, headers, keep_alive=keep_alive)
+                if not head_only:
+                    await self._sendfile(writer, f, 0, compressed_size)
+            await writer.drain()
+            return
+        if ranges is None:
+            headers["Content-Length"] = str(file_size)
+            self._write_head(writer, 200, headers, keep_alive=keep_alive)
+            if not head_only:
+                await self._write_file_segments(writer, served, [(0, file_size)])
+            await writer.drain()
+            return
+        if len(ranges) == 0:
+            await self._send_response(
+                writer,
+                416,
+                {**cors, "Content-Range": f"bytes */{file_size}"},
+                b"Range not satisfiable",
+                keep_alive=keep_alive,
+            )
+            return
+        request.served_ranges = ranges
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            self._write_head(writer, 206, headers, keep_alive=keep_alive)
+            if not head_only:
+                await self._write_file_segments(
+                    writer, served, [(start, end - start + 1)]
+                )
+            await writer.drain()
+            return
+        # multiple ranges: multipart/byteranges
+        await self._send_multipart(
+            writer,
+            206,
+            headers,
+            served,
+            ranges,
+            keep_alive=keep_alive,
+            head_only=head_only,
+        )
+
+    async def _send_growing_video(
+        self,
+        request: HttpRequest,
+        writer: asyncio.StreamWriter,
+        job: TranscodeJob,
+        cors: Dict[str, str],
+    ):
+        """
+        Serve a video while it is being converted. Requests for the whole
+        file are streamed with chunked encoding as the fragments are written,
+        and range requests get the part converted so far (with an unknown
+        complete length), waiting for it if needed.
+        """
+        keep_alive = request.keep_alive
+        headers = {**cors, "Accept-Ranges": "bytes", "Content-Type": "video/mp4"}
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("range", ""))
+        start = int(m.group(1)) if m else 0
+        end = int(m.group(2)) if m and m.group(2) else None
+        loop = asyncio.get_running_loop()
+        if start == 0 and end is None:
+            headers["Transfer-Encoding"] = "chunked"
+            self._write_head(writer, 200, headers, keep_alive=keep_alive)
+            if request.method == "HEAD":
+                await writer.drain()
+                return
+            with job.open_output() as f:
+                while True:
+                    finished = job.done
+                    data = await loop.run_in_executor(None, f.read, VIDEO_CHUNK_BYTES)
+                    if data:
+                        writer.write(b"%x\r\n" % len(data) + data + b"\r\n")
+                        await writer.drain()
+                    elif finished:
+                        break
+                    else:
+                        await asyncio.sleep(VIDEO_POLL_INTERVAL_SEC)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return
+        deadline = time.monotonic() + VIDEO_RANGE_WAIT_SEC
+        while (
+            not job.done
+            and job.bytes_available() <= start
+            and time.monotonic() < deadline
+        ):
+            await asyncio.sleep(VIDEO_POLL_INTERVAL_SEC)
+        if job.done and not job.failed:
+            # the complete file has a known size
+            st = os.stat(job.output_path)
+            served = _ServedFile(
+                path=job.output_path,
+                key=(job.output_path, st.st_size, st.st_mtime_ns),
+                size=st.st_size,
+                content_type="video/mp4",
+            )
+            await self._send_file(request, writer, served, cors)
+            return
+        available = job.bytes_available()
+        if start >= available:
+            await self._send_response(
+                writer,
+                416,
+                {**cors, "Content-Range": "bytes */*"},
+                b"Range not yet available",
+                keep_alive=keep_alive,
+            )
+            return
+        end = available - 1 if end is None else min(end, available - 1)
+        request.served_ranges = [(start, end)]
+        headers["Content-Range"] = f"bytes {start}-{end}/*"
+        headers["Content-Length"] = str(end - start + 1)
+        self._write_head(writer, 206, headers, keep_alive=keep_alive)
+        if request.method != "HEAD":
+            with job.open_output() as f:
+                await self._sendfile(writer, f, start, end - start + 1)
+        await writer.drain()
+
+    async def _send_batch(
+        self,
+        request: HttpRequest,
+        writer: asyncio.StreamWriter,
+        served: _ServedFile,
+        cors: Dict[str, str],
+    ):
+        """Respond to a batched range request (POST /files/<path>)."""
+        keep_alive = request.keep_alive
+        try:
+            spec = request.body.decode("ascii")
+        except UnicodeDecodeError:
+            spec = ""
+        ranges = parse_range_header(spec, served.size)
+        if ranges is None or len(ranges) > MAX_BATCH_RANGES:
+            await self._send_response(
+                writer,
+                400,
+                cors,
+                b"Expected a body of the form bytes=start-end,...",
+                keep_alive=keep_alive,
+            )
+            return
+        request.served_ranges = ranges
+        headers = {**cors, "Accept-Ranges": "bytes"}
+        accept = request.headers.get("accept", "")
+        if (
+            BINARY_RANGES_CONTENT_TYPE in accept
+            or request.query.get("format") == "binary"
+        ):
+            frame_header = encode_binary_ranges_header(ranges)
+            headers["Content-Type"] = BINARY_RANGES_CONTENT_TYPE
+            headers["Content-Length"] = str(
+                len(frame_header) + sum(end - start + 1 for start, end in ranges)
+            )
+            self._write_head(writer, 200, headers, keep_alive=keep_alive)
+            writer.write(frame_header)
+            await self._write_file_segments(
+                writer, served, [(start, end - start + 1) for start, end in ranges]
+            )
+            await writer.drain()
+            return
+        await self._send_multipart(
+            writer,
+            200,
+            headers,
+            served,
+            ranges,
+            keep_alive=keep_alive,
+        )
+
+    async def _send_multipart(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        headers: Dict[str, str],
+        served: _ServedFile,
+        ranges: List[Tuple[int, int]],
+        *,
+        keep_alive: bool,
+        head_only: bool = False,
+    ):
+        """Send ranges of a file as a multipart/byteranges body."""
+        boundary = uuid.uuid4().hex
+        part_heads = [
+            (
+                f"--{boundary}\r\n"
+                "Content-Type: application/octet-stream\r\n"
+                f"Content-Range: bytes {start}-{end}/{served.size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        tail = f"--{boundary}--\r\n".encode()
+        content_length = sum(
+            len(h) + (end - start + 1) + 2
+            for h, (start, end) in zip(part_heads, ranges)
+        ) + len(tail)
+        headers = {
+            **headers,
+            "Content-Type": f"multipart/byteranges; boundary={boundary}",
+            "Content-Length": str(content_length),
+        }
+        self._write_head(writer, status, headers, keep_alive=keep_alive)
+        if not head_only:
+            await self._write_file_segments(
+                writer,
+                served,
+                [(start, end - start + 1) for start, end in ranges],
+                part_heads=part_heads,
+            )
+            writer.write(tail)
+        await writer.drain()
+
+    async def _write_file_segments(
+        self,
+        writer: asyncio.StreamWriter,
+        served: _ServedFile,
+        segments: List[Tuple[int, int]],
+        *,
+        part_heads: Optional[List[bytes]] = None,
+    ):
+        """
+        Send (offset, count) segments of a file, each preceded by its
+        multipart head and followed by CRLF if part_heads is given.
+        """
+        loop = asyncio.get_running_loop()
+        total = sum(count for _, count in segments)
+        datas: Optional[List[bytes]] = None
+        if served.remote is not None and total <= MAX_CACHED_REQUEST_BYTES:
+            datas = await loop.run_in_executor(
+                None, served.remote.read_ranges, segments
+            )
+        elif self.block_cache is not None and total <= MAX_CACHED_REQUEST_BYTES:
+            datas = await loop.run_in_executor(
+                None,
+                self.block_cache.read_ranges,
+                served.path,
+                served.key,
+                served.size,
+                segments,
+            )
+        if datas is not None:
+            for i, data in enumerate(datas):
+                if part_heads is not None:
+                    writer.write(part_heads[i])
+                writer.write(data)
+                if part_heads is not None:
+                    writer.write(b"\r\n")
+            return
+        if served.remote is not None:
+            # large remote reads: one piece at a time to bound memory use
+            for i, (offset, count) in enumerate(segments):
+                if part_heads is not None:
+                    writer.write(part_heads[i])
+                for piece_offset in range(
+                    offset, offset + count, MAX_CACHED_REQUEST_BYTES
+                ):
+                    piece_count = min(
+                        MAX_CACHED_REQUEST_BYTES, offset + count - piece_offset
+                    )
+                    (data,) = await loop.run_in_executor(
+                        None,
+                        served.remote.read_ranges,
+                        [(piece_offset, piece_count)],
+                    )
+                    writer.write(data)
+                    await writer.drain()
+                if part_heads is not None:
+                    writer.write(b"\r\n")
+            return
+        with open(served.path, "rb") as f:
+            for i, (offset, count) in enumerate(segments):
+                if part_heads is not None:
+                    writer.write(part_heads[i])
+                await self._sendfile(writer, f, offset, count)
+                if part_heads is not None:
+                    writer.write(b"\r\n")
+
+    async def _sendfile(
+        self, writer: asyncio.StreamWriter, f: BinaryIO, offset: int, count: int
+    ):
+        if count <= 0:
+            return
+        await writer.drain()
+        # zero-copy via os.sendfile where supported; asyncio falls back to
+        # read/write otherwise
+        await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+    def _write_head(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        headers: Dict[str, str],
+        *,
+        keep_alive: bool,
+    ):
+        self._response_heads[writer] = (status, int(headers.get("Content-Length", 0)))
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}"]
+        for k, v in headers.items():
+            lines.append(f"{k}: {v}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        headers: Dict[str, str],
+        body: bytes,
+        *,
+        keep_alive: bool = False,
+        content_type: str = "text/plain",
+    ):
+        self._write_head(
+            writer,
+            status,
+            {
+                **headers,
+                "Content-Type": content_type,
+                "Content-Length": str(len(body)),
+            },
+            keep_alive=keep_alive,
+        )
+        writer.write(body)
+        await writer.drain()
+
+
+def _add_vary(headers: Dict[str, str], name: str) -> Dict[str, str]:
+    vary = headers.get("Vary")
+    return {**headers, "Vary": f"{vary}, {name}" if vary else name}
+
+
+def _parse_content_length(value: Optional[str]) -> Optional[int]:
+    """The body length of a request, or None if the header is invalid."""
+    if value is None or value == "":
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+def _parse_request_head(head: bytes) -> Optional[HttpRequest]:
+    try:
+        text = head.decode("latin-1")
+    except UnicodeDecodeError:  # pragma: no cover
+        return None
+    lines = text.split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        return None
+    if not version.startswith("HTTP/"):
+        return None
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        if ":" not in line:
+            return None
+        k, v = line.split(":", 1)
+        headers[k.strip().lower()] = v.strip()
+    parsed = urllib.parse.urlsplit(target)
+    return HttpRequest(
+        method=method.upper(),
+        path=urllib.parse.unquote(parsed.path),
+        query=dict(urllib.parse.parse_qsl(parsed.query)),
+        version=version,
+        headers=headers,
+    )
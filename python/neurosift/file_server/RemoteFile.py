@@ -0,0 +1,204 @@
+import hashlib
+import http.client
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+from .BlockCache import _coalesce
+from .DiskBlockCache import DiskBlockCache
+
+# Timeout for requests to the remote server
+REMOTE_TIMEOUT_SEC = 60
+
+# Number of attempts for each request to the remote server
+REMOTE_ATTEMPTS = 3
+
+USER_AGENT = "neurosift-proxy"
+
+T = TypeVar("T")
+
+
+@dataclass
+class RemoteFileStats:
+    hits: int = 0
+    misses: int = 0
+    remote_requests: int = 0
+    remote_bytes: int = 0
+    remote_seconds: float = 0.0
+
+
+class RemoteFile:
+    """
+    A remote file (e.g. an NWB asset on DANDI or S3) read with HTTP range
+    requests through a persistent DiskBlockCache, so that repeated views of
+    the same asset are served from local disk.
+
+    The cached blocks are keyed by the URL, size and ETag (or Last-Modified)
+    of the remote file, so that a modified file is not served from stale
+    blocks. Adjacent missing blocks are fetched with a single range request.
+    """
+
+    def __init__(self, url: str, *, cache: DiskBlockCache):
+        """
+        Parameters
+        ----------
+        url : str
+            URL of the remote file. The server must support range requests.
+        cache : DiskBlockCache
+            Cache of the blocks of the remote file.
+        """
+        self.url = url
+        self.cache = cache
+        self.stats = RemoteFileStats()
+        self._lock = threading.Lock()
+        # resolve redirects (e.g. DANDI asset URL to S3) and get the size
+        resolved_url, self.size, validator = _probe(url)
+        self.resolved_url = resolved_url
+        self.file_key = _file_key(url, self.size, validator)
+
+    def read_ranges(self, ranges: List[Tuple[int, int]]) -> List[bytes]:
+        """
+        Read (offset, count) ranges of the file, fetching missing blocks.
+
+        This does blocking I/O and is meant to be run in an executor.
+        """
+        bs = self.cache.block_size
+        ranges = [(offset, min(count, self.size - offset)) for offset, count in ranges]
+        needed = sorted(
+            {
+                i
+                for offset, count in ranges
+                if count > 0
+                for i in range(offset // bs, (offset + count - 1) // bs + 1)
+            }
+        )
+        local: Dict[int, bytes] = {}
+        for i in needed:
+            block = self.cache.get(self.file_key, i)
+            if block is not None:
+                local[i] = block
+        missing = [i for i in needed if i not in local]
+        with self._lock:
+            self.stats.hits += len(needed) - len(missing)
+            self.stats.misses += len(missing)
+        for run_start, run_end in _coalesce(missing):
+            start = run_start * bs
+            end = min((run_end + 1) * bs, self.size) - 1
+            data = self._fetch(start, end)
+            for i in range(run_start, run_end + 1):
+                block = data[(i - run_start) * bs : (i - run_start + 1) * bs]
+                self.cache.put(self.file_key, i, block)
+                local[i] = block
+        ret = []
+        for offset, count in ranges:
+            if count <= 0:
+                ret.append(b"")
+                continue
+            b0 = offset // bs
+            b1 = (offset + count - 1) // bs
+            data = b"".join(local[i] for i in range(b0, b1 + 1))
+            start = offset - b0 * bs
+            ret.append(data[start : start + count])
+        return ret
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        timer = time.perf_counter()
+        try:
+            data = _request_range(self.resolved_url, start, end)
+        except urllib.error.HTTPError as e:
+            if e.code not in (400, 401, 403):
+                raise
+            # the resolved URL may be a presigned URL (e.g. DANDI asset to
+            # S3) that has expired
+            self._resolve_again()
+            data = _request_range(self.resolved_url, start, end)
+        with self._lock:
+            self.stats.remote_requests += 1
+            self.stats.remote_bytes += len(data)
+            self.stats.remote_seconds += time.perf_counter() - timer
+        if len(data) != end - start + 1:
+            raise IOError(
+                f"Expected {end - start + 1} bytes from {self.url}, got {len(data)}"
+            )
+        return data
+
+    def _resolve_again(self):
+        resolved_url, size, validator = _probe(self.url)
+        if _file_key(self.url, size, validator) != self.file_key:
+            # never mix the cached blocks with those of a new version
+            raise IOError(f"{self.url} has changed since it was opened")
+        with self._lock:
+            self.resolved_url = resolved_url
+
+    def format_stats(self) -> str:
+        s = self.stats
+        total = s.hits + s.misses
+        hit_rate = s.hits / total if total > 0 else 0.0
+        return (
+            f"Remote cache: {s.hits} hits, {s.misses} misses "
+            f"({hit_rate * 100:.1f}% hit rate), "
+            f"{s.remote_requests} remote requests "
+            f"({s.remote_bytes / 1e6:.1f} MB in {s.remote_seconds:.1f}s), "
+            f"{self.cache.num_bytes / 1e6:.1f} MB on disk"
+        )
+
+
+def _file_key(url: str, size: int, validator: str) -> str:
+    return hashlib.sha256(f"{url}\n{size}\n{validator}".encode()).hexdigest()[:32]
+
+
+def _probe(url: str) -> Tuple[str, int, str]:
+    """Return the resolved URL, size and validator (ETag) of a remote file."""
+
+    def attempt():
+        req = urllib.request.Request(
+            url, headers={"Range": "bytes=0-0", "User-Agent": USER_AGENT}
+        )
+        with urllib.request.urlopen(req, timeout=REMOTE_TIMEOUT_SEC) as r:
+            r.read()
+            content_range = r.headers.get("Content-Range")
+            m = re.match(r"bytes \d+-\d+/(\d+)", content_range or "")
+            if r.status != 206 or m is None:
+                raise IOError(f"Server does not support range requests: {url}")
+            validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+            return r.geturl(), int(m.group(1)), validator or ""
+
+    return _with_retries(attempt)
+
+
+def _request_range(url: str, start: int, end: int) -> bytes:
+    def attempt():
+        req = urllib.request.Request(
+            url, headers={"Range": f"bytes={start}-{end}", "User-Agent": USER_AGENT}
+        )
+        with urllib.request.urlopen(req, timeout=REMOTE_TIMEOUT_SEC) as r:
+            if r.status != 206:
+                raise IOError(f"Server did not return a partial response for {url}")
+            return r.read()
+
+    return _with_retries(attempt)
+
+
+def _with_retries(fn: Callable[[], T]) -> T:
+    """Call fn, retrying on network errors and 5xx responses."""
+    for attempt in range(REMOTE_ATTEMPTS):
+        if attempt > 0:
+            time.sleep(2**attempt)
+        try:
+            return fn()
+        except urllib.error.HTTPError as e:
+            if e.code < 500 or attempt == REMOTE_ATTEMPTS - 1:
+                raise
+        except (
+            urllib.error.URLError,
+            http.client.HTTPException,
+            TimeoutError,
+            ConnectionError,
+        ):
+            if attempt == REMOTE_ATTEMPTS - 1:
+                raise
+    raise AssertionError("unreachable")
@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+from .BlockCache import BlockCache
+
+# Upper bounds of the request latency histogram buckets (seconds)
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Upper bounds of the range size histogram buckets (bytes): 1 KiB to 64 MiB
+RANGE_SIZE_BUCKETS = tuple(1024 * 4**i for i in range(9))
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, cumulative count) pairs, ending with +Inf."""
+        ret = []
+        total = 0
+        for le, n in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += n
+            ret.append((le, total))
+        return ret
+
+
+class RequestMetrics:
+    """
+    Per-request metrics of a LocalFileServer: request counts by method and
+    status, latency, response bytes, the sizes of the requested byte ranges
+    and per-file request counts. Rendered in the Prometheus text format or
+    as JSON, and optionally written to an access log with one JSON object
+    per request.
+    """
+
+    def __init__(
+        self,
+        *,
+        access_log: Optional[str] = None,
+        block_cache: Optional[BlockCache] = None,
+    ):
+        """
+        Parameters
+        ----------
+        access_log : str, optional
+            Path of a file to which a JSON line is appended for each request.
+        block_cache : BlockCache, optional
+            Block cache whose statistics are included in the output.
+        """
+        self.block_cache = block_cache
+        self.started = time.time()
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.response_bytes = 0
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.range_size = _Histogram(RANGE_SIZE_BUCKETS)
+        self.files: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._access_log: Optional[TextIO] = (
+            open(access_log, "a", buffering=1) if access_log else None
+        )
+
+    def record(
+        self,
+        *,
+        method: str,
+        path: str,
+        status: int,
+        num_bytes: int,
+        duration: float,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        file_name: Optional[str] = None,
+    ):
+        """
+        Record a served request.
+
+        ranges are the (start, end inclusive) byte ranges that were served,
+        None for a whole-file response. file_name is the served file relative
+        to the server directory, if any.
+        """
+        with self._lock:
+            key = (method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.response_bytes += num_bytes
+            self.latency.observe(duration)
+            for start, end in ranges or []:
+                self.range_size.observe(end - start + 1)
+            if file_name is not None:
+                f = self.files.setdefault(file_name, {"requests": 0, "bytes": 0})
+                f["requests"] += 1
+                f["bytes"] += num_bytes
+            if self._access_log is not None:
+                entry = {
+                    "time": round(time.time(), 6),
+                    "method": method,
+                    "path": path,
+                    "status": status,
+                    "bytes": num_bytes,
+                    "duration": round(duration, 6),
+                    "ranges": ranges,
+                }
+                self._access_log.write(json.dumps(entry) + "\n")
+
+    def close(self):
+        if self._access_log is not None:
+            self._access_log.close()
+            self._access_log = None
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            ret: Dict[str, Any] = {
+                "uptime": time.time() - self.started,
+                "requests": [
+                    {"method": method, "status": status, "count": count}
+                    for (method, status), count in sorted(self.requests.items())
+                ],
+                "response_bytes": self.response_bytes,
+                "latency_seconds": _histogram_to_json(self.latency),
+                "range_size_bytes": _histogram_to_json(self.range_size),
+                "files": {name: dict(f) for name, f in sorted(self.files.items())},
+            }
+        if self.block_cache is not None:
+            ret["block_cache"] = {
+                **asdict(self.block_cache.stats),
+                "cached_bytes": self.block_cache.num_bytes,
+            }
+        return ret
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help: str):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, h: _Histogram):
+            for le, n in h.cumulative():
+                lines.append(f'{name}_bucket{{le="{_format_le(le)}"}} {n}')
+            lines.append(f"{name}_sum {h.sum}")
+            lines.append(f"{name}_count {h.count}")
+
+        with self._lock:
+            metric("neurosift_http_requests_total", "counter", "HTTP requests.")
+            for (method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'neurosift_http_requests_total{{method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+            metric(
+                "neurosift_http_response_bytes_total",
+                "counter",
+                "Bytes in response bodies.",
+            )
+            lines.append(f"neurosift_http_response_bytes_total {self.response_bytes}")
+            metric(
+                "neurosift_http_request_duration_seconds",
+                "histogram",
+                "Time from receiving a request to sending the last byte.",
+            )
+            histogram("neurosift_http_request_duration_seconds", self.latency)
+            metric(
+                "neurosift_http_range_size_bytes",
+                "histogram",
+                "Sizes of the requested byte ranges.",
+            )
+            histogram("neurosift_http_range_size_bytes", self.range_size)
+            metric(
+                "neurosift_file_requests_total", "counter", "HTTP requests per file."
+            )
+            for name, f in sorted(self.files.items()):
+                lines.append(
+                    f'neurosift_file_requests_total{{file="{_escape_label(name)}"}} '
+                    f'{f["requests"]}'
+                )
+            metric(
+                "neurosift_file_response_bytes_total",
+                "counter",
+                "Bytes in response bodies per file.",
+            )
+            for name, f in sorted(self.files.items()):
+                lines.append(
+                    f'neurosift_file_response_bytes_total{{file="{_escape_label(name)}"}} '
+                    f'{f["bytes"]}'
+                )
+        if self.block_cache is not None:
+            s = self.block_cache.stats
+            for name, help, value in [
+                ("hits", "Block cache hits.", s.hits),
+                ("misses", "Block cache misses.", s.misses),
+                ("readahead_blocks", "Blocks read ahead.", s.readahead_blocks),
+                ("disk_reads", "Disk reads by the block cache.", s.disk_reads),
+                ("disk_bytes", "Bytes read from disk.", s.disk_bytes),
+                ("disk_seconds", "Time spent reading from disk.", s.disk_seconds),
+            ]:
+                metric(f"neurosift_block_cache_{name}_total", "counter", help)
+                lines.append(f"neurosift_block_cache_{name}_total {value}")
+            metric("neurosift_block_cache_bytes", "gauge", "Bytes in the block cache.")
+            lines.append(f"neurosift_block_cache_bytes {self.block_cache.num_bytes}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_to_json(h: _Histogram) -> Dict[str, Any]:
+    return {
+        "buckets": [[_format_le(le), n] for le, n in h.cumulative()],
+        "sum": h.sum,
+        "count": h.count,
+    }
+
+
+def _format_le(le: float) -> str:
+    if le == float("inf"):
+        return "+Inf"
+    return str(int(le)) if float(le).is_integer() and le >= 1 else str(le)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
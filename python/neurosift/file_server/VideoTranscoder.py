@@ -0,0 +1,321 @@
+import hashlib
+import os
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional
+
+from ..user_cache_dir import evict_lru_files, get_user_cache_dir
+
+# Bump when the ffmpeg arguments change, so that older outputs are not reused
+TRANSCODE_VERSION = 1
+
+# Video codecs that browsers decode, and that can be copied into an MP4
+BROWSER_VIDEO_CODECS = {"h264", "vp9", "av1"}
+
+# Audio codecs that can be copied into an MP4 and played by browsers
+MP4_AUDIO_CODECS = {"aac", "mp3", "opus"}
+
+# Codecs of WebM files, which browsers play progressively as they are
+WEBM_CODECS = {"vp8", "vp9", "av1", "opus", "vorbis"}
+
+# Keyframe interval in seconds when re-encoding, which bounds the size of the
+# fragments and so how soon a seek can be served
+KEYFRAME_INTERVAL_SEC = 2
+
+
+@dataclass
+class VideoProbe:
+    # ffmpeg demuxer names, e.g. "avi" or "mov,mp4,m4a,3gp,3g2,mj2"
+    container: str
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+
+
+class TranscodeJob:
+    """
+    A background ffmpeg run writing a fragmented MP4 version of a video.
+
+    While the job runs, the output grows one fragment at a time and can be
+    read with open_output(); once done is set it is complete (unless failed).
+    """
+
+    def __init__(self, source_path: str, output_path: str, *, copy_video: bool):
+        self.source_path = source_path
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.{os.getpid()}.part"
+        self.copy_video = copy_video
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._process: Optional[subprocess.Popen] = None
+        self._cancelled = False
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def open_output(self) -> BinaryIO:
+        """
+        Open the (possibly still growing) output. The partial file is renamed
+        when the job completes, so an open file stays valid.
+        """
+        for path in (self.output_path, self.partial_path, self.output_path):
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                pass
+        raise FileNotFoundError(self.output_path)
+
+    def bytes_available(self) -> int:
+        for path in (self.output_path, self.partial_path, self.output_path):
+            try:
+                return os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return 0
+
+    def cancel(self):
+        if self._process is not None and self._process.poll() is None:
+            self._cancelled = True
+            self._process.terminate()
+
+
+class VideoTranscoder:
+    """
+    Converts videos that browsers cannot play or cannot stream (AVI, MJPEG,
+    raw H.264, MP4 with the index at the end, ...) into fragmented MP4 with
+    ffmpeg, in the background.
+
+    The video stream is copied without re-encoding when its codec is H.264,
+    VP9 or AV1, which is fast enough to keep ahead of playback; other codecs
+    are encoded to H.264 with a keyframe every KEYFRAME_INTERVAL_SEC seconds.
+    Because the output is fragmented (moov first, then one moof/mdat pair per
+    fragment), it can be served while it is being written.
+
+    Outputs are cached per user, keyed by the path, size and mtime of the
+    source, and the least recently used are removed once the cache exceeds
+    max_bytes.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = 20 * 1024**3,
+        ffmpeg: Optional[str] = None,
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory for the converted videos (default: <user cache dir>/videos).
+        max_bytes : int
+            Maximum total size of the converted videos.
+        ffmpeg : str, optional
+            Path of the ffmpeg executable (default: found with find_ffmpeg).
+        """
+        self.cache_dir = cache_dir or get_user_cache_dir("videos")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        self._jobs: List[TranscodeJob] = []
+
+    def probe(self, path: str) -> VideoProbe:
+        """Container and codecs of a video, from the output of ffmpeg -i."""
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg not found")
+        r = subprocess.run(
+            [self.ffmpeg, "-hide_banner", "-nostdin", "-i", path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            errors="replace",
+        )
+        m = re.search(r"^Input #0, ([^ ]+), from", r.stderr, re.MULTILINE)
+        if m is None:
+            raise IOError(f"Unable to read video {path}: {r.stderr.strip()}")
+        video = re.search(r"Stream #0:\d+.*?: Video: (\w+)", r.stderr)
+        audio = re.search(r"Stream #0:\d+.*?: Audio: (\w+)", r.stderr)
+        return VideoProbe(
+            container=m.group(1).rstrip(","),
+            video_codec=video.group(1) if video else None,
+            audio_codec=audio.group(1) if audio else None,
+        )
+
+    def start(self, path: str) -> Optional[TranscodeJob]:
+        """
+        Start converting a video in the background, or return None if
+        browsers can already stream it as it is. A job for a video converted
+        before is returned already done.
+        """
+        probe = self.probe(path)
+        if is_streamable(path, probe):
+            return None
+        st = os.stat(path)
+        key = hashlib.sha256(
+            f"{os.path.realpath(path)}\n{st.st_size}\n{st.st_mtime_ns}\n"
+            f"{TRANSCODE_VERSION}".encode()
+        ).hexdigest()[:32]
+        copy_video = probe.video_codec in BROWSER_VIDEO_CODECS
+        job = TranscodeJob(
+            path,
+            os.path.join(self.cache_dir, f"{key}.mp4"),
+            copy_video=copy_video,
+        )
+        if os.path.exists(job.output_path):
+            # mark as recently used
+            os.utime(job.output_path)
+            job._done.set()
+            return job
+        args = self._ffmpeg_args(path, probe, job.partial_path)
+        job._process = subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            errors="replace",
+        )
+        self._jobs.append(job)
+        threading.Thread(target=self._wait_for_job, args=(job,), daemon=True).start()
+        return job
+
+    def stop(self, timeout: float = 5):
+        """Terminate the running jobs and remove their partial outputs."""
+        for job in self._jobs:
+            job.cancel()
+        for job in self._jobs:
+            job.wait(timeout)
+
+    def _ffmpeg_args(self, path: str, probe: VideoProbe, output: str) -> List[str]:
+        assert self.ffmpeg is not None
+        args = [self.ffmpeg, "-hide_banner", "-nostdin", "-loglevel", "error"]
+        # raw H.264 and some AVI files have no timestamps to copy
+        args += ["-fflags", "+genpts", "-i", path, "-map", "0:v:0", "-map", "0:a:0?"]
+        if probe.video_codec in BROWSER_VIDEO_CODECS:
+            args += ["-c:v", "copy"]
+        else:
+            args += [
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-crf",
+                "20",
+                "-pix_fmt",
+                "yuv420p",
+                # yuv420p needs even dimensions
+                "-vf",
+                "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+                "-force_key_frames",
+                f"expr:gte(t,n_forced*{KEYFRAME_INTERVAL_SEC})",
+            ]
+        if probe.audio_codec is None or probe.audio_codec in MP4_AUDIO_CODECS:
+            args += ["-c:a", "copy"]
+        else:
+            args += ["-c:a", "aac"]
+        args += [
+            "-movflags",
+            "frag_keyframe+empty_moov+default_base_moof",
+            "-f",
+            "mp4",
+            "-y",
+            output,
+        ]
+        return args
+
+    def _wait_for_job(self, job: TranscodeJob):
+        assert job._process is not None
+        name = os.path.basename(job.source_path)
+        action = "Remuxing" if job.copy_video else "Transcoding"
+        print(f"{action} {name} to fragmented MP4 in the background")
+        timer = time.perf_counter()
+        _, stderr = job._process.communicate()
+        if job._process.returncode == 0:
+            os.replace(job.partial_path, job.output_path)
+            print(f"Finished {name} in {time.perf_counter() - timer:.1f}s")
+            evict_lru_files(
+                self.cache_dir,
+                max_bytes=self.max_bytes,
+                suffix=".mp4",
+                keep=job.output_path,
+            )
+        else:
+            job.error = (
+                stderr.strip() or f"ffmpeg exited with {job._process.returncode}"
+            )
+            if job._cancelled:
+                print(f"Stopped converting {name}")
+            else:
+                print(
+                    f"Warning: unable to convert {name}, serving it as is: {job.error}"
+                )
+            try:
+                os.remove(job.partial_path)
+            except FileNotFoundError:
+                pass
+        job._done.set()
+
+
+def find_ffmpeg() -> Optional[str]:
+    """Path of ffmpeg on the PATH or from the imageio-ffmpeg package, if any."""
+    path = shutil.which("ffmpeg")
+    if path is not None:
+        return path
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def is_streamable(path: str, probe: VideoProbe) -> bool:
+    """Whether browsers can play a video progressively as it is."""
+    formats = probe.container.split(",")
+    codecs = {c for c in (probe.video_codec, probe.audio_codec) if c is not None}
+    if "webm" in formats:
+        return codecs <= WEBM_CODECS
+    if "mp4" in formats:
+        return (
+            probe.video_codec in BROWSER_VIDEO_CODECS
+            and (probe.audio_codec is None or probe.audio_codec in MP4_AUDIO_CODECS)
+            and _mp4_index_first(path)
+        )
+    return False
+
+
+def _mp4_index_first(path: str) -> bool:
+    """
+    Whether an MP4 file has its index (moov) before the media data, or is
+    fragmented, so that playback can start before it is fully downloaded.
+    """
+    boxes: Dict[bytes, int] = {}
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack(">I4s", f.read(8))
+            if box_size == 1:
+                (box_size,) = struct.unpack(">Q", f.read(8))
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < 8:
+                break
+            boxes.setdefault(box_type, offset)
+            offset += box_size
+    if b"moof" in boxes:
+        return True
+    return b"moov" in boxes and boxes[b"moov"] < boxes.get(b"mdat", size)
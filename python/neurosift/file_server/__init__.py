@@ -0,0 +1,7 @@
+from .LocalFileServer import LocalFileServer  # noqa: F401
+from .BlockCache import BlockCache  # noqa: F401
+from .RequestMetrics import RequestMetrics  # noqa: F401
+from .CompressedVariantCache import CompressedVariantCache  # noqa: F401
+from .DiskBlockCache import DiskBlockCache  # noqa: F401
+from .RemoteFile import RemoteFile  # noqa: F401
+from .VideoTranscoder import TranscodeJob, VideoTranscoder  # noqa: F401
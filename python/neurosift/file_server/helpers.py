@@ -0,0 +1,174 @@
+import re
+import struct
+from typing import Dict, List, Optional, Tuple
+
+# Allowed CORS origins. Keep in sync with local-file-access-js/src/index.js:
+# an exact-match list plus a pattern for Cloudflare Pages preview deploys of
+# this repo (every branch is published as <branch>.neurosift.pages.dev).
+ALLOWED_ORIGINS = [
+    "https://neurosift.app",
+    "https://flatironinstitute.github.io",
+    "http://localhost:3000",
+    "http://localhost:4200",
+]
+ALLOWED_ORIGIN_PATTERNS = [re.compile(r"^https://[a-z0-9-]+\.neurosift\.pages\.dev$")]
+
+# Content type of the compact binary framing for batched range responses
+BINARY_RANGES_CONTENT_TYPE = "application/x-neurosift-ranges"
+BINARY_RANGES_MAGIC = b"NSRB"
+BINARY_RANGES_VERSION = 1
+
+# hidden files that are still served (zarr metadata)
+ALLOWED_HIDDEN_FILES = [".zattrs", ".zgroup", ".zarray", ".zmetadata"]
+
+# Text-like files that are sent with a Content-Encoding when the client
+# accepts one (includes .lindi.json)
+COMPRESSIBLE_SUFFIXES = (
+    ".json",
+    ".zattrs",
+    ".zgroup",
+    ".zarray",
+    ".zmetadata",
+    ".txt",
+    ".csv",
+    ".tsv",
+)
+
+
+def cors_headers(origin: Optional[str]) -> Dict[str, str]:
+    """Return the CORS response headers for a request from the given origin."""
+    if not origin:
+        return {}
+    is_allowed = origin in ALLOWED_ORIGINS or any(
+        p.match(origin) for p in ALLOWED_ORIGIN_PATTERNS
+    )
+    if not is_allowed:
+        return {}
+    return {
+        "Access-Control-Allow-Origin": origin,
+        "Access-Control-Allow-Headers": "Origin, X-Requested-With, Content-Type, Accept, Range",
+        "Access-Control-Expose-Headers": "Content-Range, Content-Length, Accept-Ranges",
+        "Vary": "Origin",
+    }
+
+
+def is_shareable(file_name: str) -> bool:
+    """Whether a path relative to the served directory may be served."""
+    parts = re.split(r"[/\\]", file_name)
+    if ".." in parts:
+        # don't allow access to parent directories
+        return False
+    base_name = parts[-1]
+    if base_name.startswith("."):
+        if base_name not in ALLOWED_HIDDEN_FILES:
+            # don't show hidden files (with some exceptions)
+            return False
+    return True
+
+
+def parse_range_header(
+    range_header: Optional[str], file_size: int
+) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse an HTTP Range header against a file of the given size.
+
+    Returns None if there is no (valid) byte range header, in which case the
+    whole file should be sent. Otherwise returns the list of satisfiable
+    (start, end) ranges, with end inclusive. An empty list means that none of
+    the requested ranges can be satisfied (416).
+    """
+    if not range_header:
+        return None
+    range_header = range_header.strip()
+    if not range_header.startswith("bytes="):
+        return None
+    ranges: List[Tuple[int, int]] = []
+    for spec in range_header[len("bytes=") :].split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        if "-" not in spec:
+            return None
+        a, b = spec.split("-", 1)
+        a = a.strip()
+        b = b.strip()
+        try:
+            if not a:
+                # suffix range: the last b bytes
+                suffix_length = int(b)
+                if suffix_length <= 0:
+                    continue
+                start = max(0, file_size - suffix_length)
+                end = file_size - 1
+            else:
+                start = int(a)
+                end = int(b) if b else max(start, file_size - 1)
+        except ValueError:
+            return None
+        if start < 0 or end < start:
+            return None
+        if start >= file_size:
+            # unsatisfiable, but other ranges may still be served
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+    return ranges
+
+
+def encode_binary_ranges_header(ranges: List[Tuple[int, int]]) -> bytes:
+    """
+    Header of a response in the compact binary range framing.
+
+    The layout (all integers little-endian) is
+
+        magic       4 bytes  b"NSRB"
+        version     uint32   1
+        num_ranges  uint32
+        num_ranges x (offset uint64, length uint64)
+
+    followed by the data of each range, concatenated in the same order.
+    ranges are (start, end) pairs with end inclusive.
+    """
+    parts = [
+        struct.pack("<4sII", BINARY_RANGES_MAGIC, BINARY_RANGES_VERSION, len(ranges))
+    ]
+    for start, end in ranges:
+        parts.append(struct.pack("<QQ", start, end - start + 1))
+    return b"".join(parts)
+
+
+def is_compressible(file_name: str) -> bool:
+    """Whether a file is text-like and worth sending compressed."""
+    return file_name.lower().endswith(COMPRESSIBLE_SUFFIXES)
+
+
+def negotiate_content_encoding(
+    accept_encoding: Optional[str], supported: List[str]
+) -> Optional[str]:
+    """
+    Pick a content encoding from an Accept-Encoding header value.
+
+    supported is in order of preference. Returns None if the client accepts
+    none of them (identity).
+    """
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            k, _, v = param.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    best: Optional[str] = None
+    best_q = 0.0
+    for encoding in supported:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
@@ -0,0 +1,423 @@
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Target size of the chunks of rewritten datasets
+DEFAULT_TARGET_CHUNK_BYTES = 2 * 1024 * 1024
+
+# File space page size of rewritten files; metadata is aggregated into pages
+# of this size so that the viewer can read it with few requests
+DEFAULT_PAGE_SIZE = 1024 * 1024
+
+# Datasets smaller than this are written contiguously (one request anyway)
+MIN_CHUNKED_DATASET_BYTES = 1024 * 1024
+
+# Thresholds for the scan report
+LARGE_CONTIGUOUS_BYTES = 64 * 1024 * 1024
+SMALL_CHUNK_BYTES = 16 * 1024
+MANY_CHUNKS = 1000
+LARGE_CHUNK_BYTES = 32 * 1024 * 1024
+MAX_CHUNKS_PER_ROW = 8
+
+# Page size used to estimate how many requests it takes to read the object
+# headers of a file
+METADATA_READ_SIZE = 1024 * 1024
+
+# HDF5 filters that the viewer can decode when reading through LINDI
+VIEWER_COMPRESSION = ("gzip",)
+
+
+@dataclass
+class DatasetReport:
+    name: str
+    shape: Optional[Tuple[int, ...]]
+    dtype: str
+    layout: str
+    chunks: Optional[Tuple[int, ...]]
+    compression: Optional[str]
+    nbytes: int
+    num_chunks: int
+    issues: List[str] = field(default_factory=list)
+
+
+@dataclass
+class FileReport:
+    path: str
+    file_size: int
+    num_groups: int
+    num_datasets: int
+    num_attributes: int
+    file_space_strategy: str
+    page_size: Optional[int]
+    metadata_pages: int
+    datasets: List[DatasetReport] = field(default_factory=list)
+
+    @property
+    def issues(self) -> List[Tuple[str, str]]:
+        """(object name, issue) for all the issues found."""
+        ret = []
+        if self.metadata_pages > 1 and self.page_size is None:
+            ret.append(
+                (
+                    "/",
+                    f"object headers are scattered over {self.metadata_pages} "
+                    f"regions of {_format_bytes(METADATA_READ_SIZE)} "
+                    "(no paged metadata aggregation)",
+                )
+            )
+        for d in self.datasets:
+            for issue in d.issues:
+                ret.append((d.name, issue))
+        return ret
+
+
+def scan_hdf5_file(path: str) -> FileReport:
+    """
+    Scan the layout of an HDF5 (NWB) file: dataset layouts, chunk shapes and
+    compression, and how scattered the object headers are, and flag the
+    objects that are slow to load in the viewer.
+    """
+    import h5py
+
+    counts = {"groups": 0, "datasets": 0, "attributes": 0}
+    header_pages = set()
+    datasets: List[DatasetReport] = []
+
+    def visit(name: str, obj: Any):
+        counts["attributes"] += len(obj.attrs)
+        try:
+            header_pages.add(h5py.h5o.get_info(obj.id).addr // METADATA_READ_SIZE)
+        except Exception:
+            pass
+        if isinstance(obj, h5py.Group):
+            counts["groups"] += 1
+        elif isinstance(obj, h5py.Dataset):
+            counts["datasets"] += 1
+            datasets.append(_scan_dataset(obj))
+
+    with h5py.File(path, "r") as f:
+        visit("/", f)
+        f.visititems(visit)
+        fcpl = f.id.get_create_plist()
+        strategy, _, _ = fcpl.get_file_space_strategy()
+        is_paged = strategy == h5py.h5f.FSPACE_STRATEGY_PAGE
+        page_size = fcpl.get_file_space_page_size() if is_paged else None
+    strategy_names = {
+        h5py.h5f.FSPACE_STRATEGY_FSM_AGGR: "fsm_aggr",
+        h5py.h5f.FSPACE_STRATEGY_PAGE: "page",
+        h5py.h5f.FSPACE_STRATEGY_AGGR: "aggr",
+        h5py.h5f.FSPACE_STRATEGY_NONE: "none",
+    }
+    return FileReport(
+        path=path,
+        file_size=os.path.getsize(path),
+        num_groups=counts["groups"],
+        num_datasets=counts["datasets"],
+        num_attributes=counts["attributes"],
+        file_space_strategy=strategy_names.get(strategy, str(strategy)),
+        page_size=page_size,
+        metadata_pages=len(header_pages),
+        datasets=datasets,
+    )
+
+
+def _scan_dataset(ds: Any) -> DatasetReport:
+    import h5py
+
+    layout_code = ds.id.get_create_plist().get_layout()
+    layout = {
+        h5py.h5d.COMPACT: "compact",
+        h5py.h5d.CONTIGUOUS: "contiguous",
+        h5py.h5d.CHUNKED: "chunked",
+        h5py.h5d.VIRTUAL: "virtual",
+    }.get(layout_code, str(layout_code))
+    shape = ds.shape
+    nbytes = 0 if shape is None else ds.size * ds.dtype.itemsize
+    num_chunks = 0
+    if ds.chunks is not None:
+        try:
+            num_chunks = ds.id.get_num_chunks()
+        except Exception:
+            num_chunks = math.prod(
+                math.ceil(n / c) for n, c in zip(shape, ds.chunks) if c > 0
+            )
+    report = DatasetReport(
+        name=ds.name,
+        shape=shape,
+        dtype=str(ds.dtype),
+        layout=layout,
+        chunks=ds.chunks,
+        compression=ds.compression,
+        nbytes=nbytes,
+        num_chunks=num_chunks,
+    )
+    if layout == "contiguous" and nbytes >= LARGE_CONTIGUOUS_BYTES:
+        report.issues.append(
+            f"contiguous {_format_bytes(nbytes)} dataset: not compressible and "
+            "exposed to chunk-based readers (LINDI, zarr) as a single chunk"
+        )
+    if ds.chunks is not None and ds.dtype.kind != "O":
+        chunk_bytes = math.prod(ds.chunks) * ds.dtype.itemsize
+        if chunk_bytes < SMALL_CHUNK_BYTES and num_chunks > MANY_CHUNKS:
+            report.issues.append(
+                f"{num_chunks} chunks of {_format_bytes(chunk_bytes)}: "
+                "one request per chunk"
+            )
+        if chunk_bytes > LARGE_CHUNK_BYTES:
+            report.issues.append(
+                f"chunks of {_format_bytes(chunk_bytes)}: small slices "
+                "download whole chunks"
+            )
+        if len(shape) >= 2 and math.ceil(shape[1] / ds.chunks[1]) > MAX_CHUNKS_PER_ROW:
+            report.issues.append(
+                f"chunks split axis 1 into {math.ceil(shape[1] / ds.chunks[1])} "
+                "pieces: a time window needs that many chunks per row block"
+            )
+    if ds.compression is not None and ds.compression not in VIEWER_COMPRESSION:
+        report.issues.append(
+            f"{ds.compression} compression cannot be decoded by the viewer "
+            "through LINDI"
+        )
+    return report
+
+
+def format_report(report: FileReport) -> str:
+    lines = [
+        f"{report.path}: {_format_bytes(report.file_size)}, "
+        f"{report.num_groups} groups, {report.num_datasets} datasets, "
+        f"{report.num_attributes} attributes",
+        f"File space strategy: {report.file_space_strategy}"
+        + (
+            f" (page size {_format_bytes(report.page_size)})"
+            if report.page_size is not None
+            else ""
+        ),
+        f"Object headers span {report.metadata_pages} regions of "
+        f"{_format_bytes(METADATA_READ_SIZE)}",
+    ]
+    issues = report.issues
+    if not issues:
+        lines.append("No issues found.")
+        return "\n".join(lines)
+    lines.append(f"{len(issues)} issues:")
+    for name, issue in issues:
+        lines.append(f"  {name}: {issue}")
+    return "\n".join(lines)
+
+
+def viewer_chunk_shape(
+    shape: Tuple[int, ...], itemsize: int, target_bytes: int
+) -> Tuple[int, ...]:
+    """
+    Chunk shape of about target_bytes that keeps the trailing axes whole for
+    as long as possible, so that a time window of a (time, channels) series
+    is read with few requests.
+    """
+    chunks = [max(1, n) for n in shape]
+    for i in range(len(chunks)):
+        trailing = math.prod(chunks[i + 1 :]) * itemsize
+        if chunks[i] * trailing <= target_bytes:
+            break
+        chunks[i] = max(1, target_bytes // trailing)
+    return tuple(chunks)
+
+
+def write_optimized_copy(
+    src_path: str,
+    dst_path: str,
+    *,
+    target_chunk_bytes: int = DEFAULT_TARGET_CHUNK_BYTES,
+    page_size: int = DEFAULT_PAGE_SIZE,
+):
+    """
+    Write a copy of an HDF5 (NWB) file that is faster to view remotely.
+
+    Datasets of at least MIN_CHUNKED_DATASET_BYTES are rechunked to about
+    target_chunk_bytes (keeping trailing axes whole), compression the viewer
+    cannot decode is replaced by gzip, smaller datasets are stored
+    contiguously, and the file uses paged file space aggregation so that the
+    metadata is packed into a few pages. Groups, attributes, soft and external
+    links, hard links and object references are preserved.
+    """
+    import h5py
+
+    with h5py.File(src_path, "r") as src, h5py.File(
+        dst_path, "w", fs_strategy="page", fs_persist=True, fs_page_size=page_size
+    ) as dst:
+        copier = _Copier(src, dst, target_chunk_bytes=target_chunk_bytes)
+        copier.copy_attrs(src, dst)
+        copier.copy_group(src, dst)
+        copier.resolve_references()
+
+
+class _Copier:
+    def __init__(self, src: Any, dst: Any, *, target_chunk_bytes: int):
+        self.src = src
+        self.dst = dst
+        self.target_chunk_bytes = target_chunk_bytes
+        # source object address -> destination path, to recreate hard links
+        self._copied: Dict[Any, str] = {}
+        # objects whose values contain references, written once all the
+        # referenced objects exist in the destination
+        self._deferred_datasets: List[Tuple[Any, Any]] = []
+        self._deferred_attrs: List[Tuple[Any, Any, str]] = []
+
+    def copy_group(self, src_group: Any, dst_group: Any):
+        import h5py
+
+        for name in src_group:
+            link = src_group.get(name, getlink=True)
+            if isinstance(link, h5py.SoftLink):
+                dst_group[name] = h5py.SoftLink(link.path)
+                continue
+            if isinstance(link, h5py.ExternalLink):
+                dst_group[name] = h5py.ExternalLink(link.filename, link.path)
+                continue
+            obj = src_group[name]
+            key = _object_key(obj)
+            if key in self._copied:
+                dst_group[name] = self.dst[self._copied[key]]
+                continue
+            if isinstance(obj, h5py.Group):
+                new_group = dst_group.create_group(name)
+                self._copied[key] = new_group.name
+                self.copy_attrs(obj, new_group)
+                self.copy_group(obj, new_group)
+            elif isinstance(obj, h5py.Dataset):
+                new_ds = self.copy_dataset(obj, dst_group, name)
+                self._copied[key] = new_ds.name
+                self.copy_attrs(obj, new_ds)
+            elif isinstance(obj, h5py.Datatype):
+                dst_group[name] = obj.dtype
+                self._copied[key] = dst_group[name].name
+
+    def copy_attrs(self, src_obj: Any, dst_obj: Any):
+        for name in src_obj.attrs:
+            dtype = src_obj.attrs.get_id(name).dtype
+            if _has_references(dtype):
+                self._deferred_attrs.append((src_obj, dst_obj, name))
+                continue
+            dst_obj.attrs.create(name, data=src_obj.attrs[name], dtype=dtype)
+
+    def copy_dataset(self, ds: Any, dst_group: Any, name: str) -> Any:
+        import h5py
+
+        if ds.shape is None:
+            return dst_group.create_dataset(name, data=h5py.Empty(ds.dtype))
+        if _has_references(ds.dtype) or ds.dtype.kind == "O":
+            # references and variable-length data keep their original layout
+            kwargs: Dict[str, Any] = {}
+            if ds.chunks is not None:
+                kwargs = dict(
+                    chunks=ds.chunks,
+                    maxshape=ds.maxshape,
+                    compression=ds.compression,
+                    compression_opts=ds.compression_opts,
+                )
+            new_ds = dst_group.create_dataset(
+                name, shape=ds.shape, dtype=ds.dtype, **kwargs
+            )
+            if _has_references(ds.dtype):
+                self._deferred_datasets.append((ds, new_ds))
+            elif ds.size > 0:
+                new_ds[()] = ds[()]
+            return new_ds
+        nbytes = ds.size * ds.dtype.itemsize
+        resizable = ds.maxshape != ds.shape
+        if ds.ndim == 0 or (nbytes < MIN_CHUNKED_DATASET_BYTES and not resizable):
+            return dst_group.create_dataset(
+                name, data=ds[()], dtype=ds.dtype, fillvalue=ds.fillvalue
+            )
+        chunks = viewer_chunk_shape(
+            ds.shape, ds.dtype.itemsize, self.target_chunk_bytes
+        )
+        compression = ds.compression
+        compression_opts = ds.compression_opts
+        if compression is not None and compression not in VIEWER_COMPRESSION:
+            compression, compression_opts = "gzip", 4
+        new_ds = dst_group.create_dataset(
+            name,
+            shape=ds.shape,
+            dtype=ds.dtype,
+            chunks=chunks,
+            maxshape=ds.maxshape,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=ds.shuffle and compression is not None,
+            fillvalue=ds.fillvalue,
+        )
+        # copy in slabs of whole chunks along the first axis
+        row_bytes = max(1, nbytes // max(1, ds.shape[0]))
+        rows = max(chunks[0], (64 * 1024 * 1024 // row_bytes) // chunks[0] * chunks[0])
+        for start in range(0, ds.shape[0], rows):
+            end = min(start + rows, ds.shape[0])
+            new_ds[start:end] = ds[start:end]
+        return new_ds
+
+    def resolve_references(self):
+        for src_obj, dst_obj, name in self._deferred_attrs:
+            dtype = src_obj.attrs.get_id(name).dtype
+            value = self._map_references(src_obj.attrs[name], dtype)
+            dst_obj.attrs.create(name, data=value, dtype=dtype)
+        for src_ds, dst_ds in self._deferred_datasets:
+            if src_ds.size > 0:
+                dst_ds[()] = self._map_references(src_ds[()], src_ds.dtype)
+
+    def _map_references(self, value: Any, dtype: Any) -> Any:
+        import numpy as np
+
+        if dtype.names is not None:
+            value = np.array(value, dtype=dtype, copy=True)
+            for field_name in dtype.names:
+                field_dtype = dtype.fields[field_name][0]
+                if _has_references(field_dtype):
+                    value[field_name] = self._map_references(
+                        value[field_name], field_dtype
+                    )
+            return value
+        if isinstance(value, np.ndarray):
+            out = np.empty(value.shape, dtype=dtype)
+            for index in np.ndindex(value.shape):
+                out[index] = self._map_reference(value[index])
+            return out
+        return self._map_reference(value)
+
+    def _map_reference(self, ref: Any) -> Any:
+        import h5py
+
+        if not ref:
+            # null reference
+            return ref
+        if isinstance(ref, h5py.RegionReference):
+            print(
+                f"Warning: region reference to {self.src[ref].name} "
+                "is not supported and was written as a null reference"
+            )
+            return h5py.RegionReference()
+        return self.dst[self.src[ref].name].ref
+
+
+def _has_references(dtype: Any) -> bool:
+    import h5py
+
+    if dtype.names is not None:
+        return any(_has_references(dtype.fields[n][0]) for n in dtype.names)
+    return h5py.check_dtype(ref=dtype) is not None
+
+
+def _object_key(obj: Any) -> Any:
+    import h5py
+
+    try:
+        return h5py.h5o.get_info(obj.id).addr
+    except Exception:
+        return obj.name
+
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    raise AssertionError("unreachable")
@@ -0,0 +1,65 @@
+import os
+import sys
+from typing import Optional, Tuple, Union
+
+
+def get_user_cache_dir(*subdirs: str) -> str:
+    """
+    Return (and create) a per-user neurosift cache directory.
+
+    The location can be overridden with the NEUROSIFT_CACHE_DIR environment
+    variable. Otherwise it is %LOCALAPPDATA%/neurosift/cache on Windows,
+    ~/Library/Caches/neurosift on macOS and $XDG_CACHE_HOME/neurosift (default
+    ~/.cache/neurosift) elsewhere.
+    """
+    base = os.environ.get("NEUROSIFT_CACHE_DIR")
+    if not base:
+        if sys.platform == "win32":
+            local_app_data = os.environ.get("LOCALAPPDATA") or os.path.expanduser(
+                "~/AppData/Local"
+            )
+            base = os.path.join(local_app_data, "neurosift", "cache")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser("~/Library/Caches/neurosift")
+        else:
+            xdg = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+            base = os.path.join(xdg, "neurosift")
+    path = os.path.join(base, *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def evict_lru_files(
+    directory: str,
+    *,
+    max_bytes: int,
+    suffix: Union[str, Tuple[str, ...]],
+    keep: Optional[str] = None,
+):
+    """
+    Remove the least recently used files ending in suffix (a string or a
+    tuple of strings) from a cache directory until their total size is at
+    most max_bytes. Cache users mark entries as used by touching their mtime.
+    keep is never removed.
+    """
+    entries = []
+    total = 0
+    for name in os.listdir(directory):
+        p = os.path.join(directory, name)
+        if not name.endswith(suffix):
+            continue
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        total += st.st_size
+        if p != keep:
+            entries.append((st.st_mtime, st.st_size, p))
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from neurosift.file_server import BlockCache
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    data = os.urandom(95)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    return str(path), data
+
+
+def _read(cache, data_file, ranges):
+    path, data = data_file
+    return cache.read_ranges(path, (path, len(data)), len(data), ranges)
+
+
+def test_evicts_least_recently_used_blocks_at_max_bytes(data_file):
+    cache = BlockCache(max_bytes=30, block_size=10, max_readahead_bytes=0)
+    for offset in (0, 40, 20):
+        _read(cache, data_file, [(offset, 10)])
+    assert cache.num_bytes == 30
+    # block 0 becomes the most recently used, so block 4 is evicted
+    _read(cache, data_file, [(0, 10)])
+    _read(cache, data_file, [(60, 10)])
+    assert cache.num_bytes == 30
+    assert cache.stats.hits == 1
+    _read(cache, data_file, [(0, 10), (20, 10), (60, 10)])
+    assert cache.stats.hits == 4
+    _read(cache, data_file, [(40, 10)])
+    assert cache.stats.misses == 5
+
+
+def test_read_spanning_blocks_to_eof(data_file):
+    cache = BlockCache(max_bytes=1000, block_size=10, max_readahead_bytes=0)
+    _, data = data_file
+    assert _read(cache, data_file, [(5, 90), (85, 20), (95, 5)]) == [
+        data[5:95],
+        data[85:95],
+        b"",
+    ]
+    # the last block is partial
+    assert cache.num_bytes == 95
+    assert _read(cache, data_file, [(88, 100)]) == [data[88:]]
+    assert cache.stats.misses == 10
+    assert cache.num_bytes == 95
+
+
+def test_adjacent_missing_blocks_are_read_at_once(data_file):
+    cache = BlockCache(max_bytes=1000, block_size=10, max_readahead_bytes=0)
+    _, data = data_file
+    _read(cache, data_file, [(30, 10)])
+    assert cache.stats.disk_reads == 1
+    # blocks 0-2 and 4-5 are missing, block 3 is cached
+    assert _read(cache, data_file, [(0, 10), (10, 15), (25, 5), (45, 10)]) == [
+        data[0:10],
+        data[10:25],
+        data[25:30],
+        data[45:55],
+    ]
+    assert cache.stats.disk_reads == 3
+    assert cache.stats.disk_bytes == 10 + 30 + 20
+
+
+def test_sequential_reads_read_ahead(data_file):
+    cache = BlockCache(max_bytes=1000, block_size=10, max_readahead_bytes=20)
+    _read(cache, data_file, [(0, 10)])
+    _read(cache, data_file, [(10, 10)])
+    # block 1 and the readahead of blocks 2-3 in one read
+    assert cache.stats.disk_reads == 2
+    assert cache.stats.readahead_blocks == 2
+    _read(cache, data_file, [(20, 20)])
+    assert cache.stats.hits == 2
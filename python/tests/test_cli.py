@@ -0,0 +1,52 @@
+import json
+import os
+import urllib.parse
+
+import pytest
+
+from neurosift.cli import build_view_url, write_lindi_index
+
+
+def test_build_view_url_for_node_server(tmp_path, monkeypatch):
+    h5py = pytest.importorskip("h5py")
+    pytest.importorskip("lindi")
+    monkeypatch.setenv("NEUROSIFT_CACHE_DIR", str(tmp_path / "cache"))
+    source = tmp_path / "my file.nwb"
+    with h5py.File(source, "w") as f:
+        # large enough not to be inlined in the index
+        f.create_dataset("x", data=list(range(100000)))
+    served_dir = tmp_path / "served"
+    served_dir.mkdir()
+    file_url = "http://localhost:1234/files/" + urllib.parse.quote(source.name)
+
+    # view-nwb --server node writes the index into the served directory
+    write_lindi_index(str(source), file_url, f"{served_dir}/{source.name}.lindi.json")
+    url = build_view_url(
+        "https://neurosift.app",
+        file_url,
+        is_zarr=False,
+        is_lindi=False,
+        serve_lindi_index=True,
+    )
+
+    assert url.endswith("&st=lindi")
+    index_url = url.split("&url=", 1)[1].split("&")[0]
+    served_path = urllib.parse.unquote(index_url.split("/files/", 1)[1])
+    assert os.path.isfile(served_dir / served_path)
+    with open(served_dir / served_path) as f:
+        rfs = json.load(f)
+    refs = [ref for ref in rfs["refs"].values() if isinstance(ref, list)]
+    assert refs and all(ref[0] == file_url for ref in refs)
+
+
+def test_build_view_url_without_lindi_index():
+    url = build_view_url(
+        "https://neurosift.app",
+        "http://localhost:1234/files/data.nwb",
+        is_zarr=False,
+        is_lindi=False,
+        serve_lindi_index=False,
+    )
+    assert (
+        url == "https://neurosift.app/?p=/nwb&url=http://localhost:1234/files/data.nwb"
+    )
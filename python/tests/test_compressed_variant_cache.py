@@ -0,0 +1,45 @@
+import gzip
+import os
+
+import pytest
+
+from neurosift.file_server import CompressedVariantCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CompressedVariantCache(cache_dir=str(tmp_path / "compressed"))
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('{"x": 1}' * 1000)
+    return str(path)
+
+
+def test_failed_compression_leaves_no_temporary_file(cache, json_file):
+    def render():
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_build(json_file, "gzip", render=render)
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_open_builds_an_evicted_copy_again(cache, json_file, monkeypatch):
+    get_or_build = cache.get_or_build
+    calls = []
+
+    def get_or_build_then_evict(*args, **kwargs):
+        path = get_or_build(*args, **kwargs)
+        calls.append(path)
+        if len(calls) == 1:
+            # evicted by a concurrent request before it is opened
+            os.remove(path)
+        return path
+
+    monkeypatch.setattr(cache, "get_or_build", get_or_build_then_evict)
+    with cache.open(json_file, "gzip") as f:
+        assert gzip.decompress(f.read()) == open(json_file, "rb").read()
+    assert len(calls) == 2
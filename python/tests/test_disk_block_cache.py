@@ -0,0 +1,19 @@
+from neurosift.file_server import DiskBlockCache
+
+
+def test_put_existing_block_counts_its_bytes_once(tmp_path):
+    cache = DiskBlockCache(cache_dir=str(tmp_path), max_bytes=1000, block_size=100)
+    for _ in range(20):
+        cache.put("file", 0, b"x" * 100)
+    assert cache.num_bytes == 100
+    cache.put("file", 0, b"x" * 60)
+    assert cache.num_bytes == 60
+    assert cache.get("file", 0) == b"x" * 60
+
+
+def test_put_evicts_least_recently_used_blocks(tmp_path):
+    cache = DiskBlockCache(cache_dir=str(tmp_path), max_bytes=1000, block_size=100)
+    for index in range(15):
+        cache.put("file", index, b"x" * 100)
+    assert cache.num_bytes <= 1000
+    assert cache.get("file", 14) == b"x" * 100
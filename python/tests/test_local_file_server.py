@@ -0,0 +1,162 @@
+import json
+import re
+import socket
+import struct
+import threading
+
+import pytest
+
+from neurosift.file_server.LocalFileServer import (
+    MAX_BATCH_RANGES,
+    MAX_BODY_BYTES,
+    LocalFileServer,
+)
+from neurosift.LindiIndexCache import LindiIndexCache
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "data.bin").write_bytes(b"0123456789")
+    server = LocalFileServer(str(tmp_path), port=_free_port())
+    server.start(timeout=10)
+    yield server
+    server.stop()
+
+
+def _request(server, head: bytes) -> bytes:
+    with socket.create_connection(("localhost", server.port), timeout=10) as s:
+        s.sendall(head)
+        response = b""
+        while chunk := s.recv(65536):
+            response += chunk
+    return response
+
+
+def _post_batch(server, body: bytes, *, binary: bool = True) -> bytes:
+    accept = b"Accept: application/x-neurosift-ranges\r\n" if binary else b""
+    return _request(
+        server,
+        b"POST /files/data.bin HTTP/1.1\r\nHost: localhost\r\n"
+        + accept
+        + b"Content-Length: "
+        + str(len(body)).encode()
+        + b"\r\nConnection: close\r\n\r\n"
+        + body,
+    )
+
+
+def _decode_binary_ranges(response: bytes) -> list:
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200")
+    assert b"Content-Type: application/x-neurosift-ranges" in head
+    magic, version, num_ranges = struct.unpack_from("<4sII", body)
+    assert (magic, version) == (b"NSRB", 1)
+    offset = 12 + 16 * num_ranges
+    ranges = []
+    for i in range(num_ranges):
+        start, length = struct.unpack_from("<QQ", body, 12 + 16 * i)
+        ranges.append((start, body[offset : offset + length]))
+        offset += length
+    assert offset == len(body)
+    return ranges
+
+
+def test_serves_byte_range(server):
+    response = _request(
+        server,
+        b"GET /files/data.bin HTTP/1.1\r\nHost: localhost\r\nRange: bytes=2-5\r\n"
+        b"Connection: close\r\n\r\n",
+    )
+    assert response.startswith(b"HTTP/1.1 206")
+    assert response.endswith(b"2345")
+
+
+@pytest.mark.parametrize("content_length", [b"abc", b"-5", b"1.5"])
+def test_invalid_content_length_gets_400(server, content_length):
+    response = _request(
+        server,
+        b"POST /files/data.bin HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Length: " + content_length + b"\r\n\r\n",
+    )
+    assert response.startswith(b"HTTP/1.1 400")
+
+
+def test_lindi_index_counts_as_first_request(tmp_path):
+    h5py = pytest.importorskip("h5py")
+    pytest.importorskip("lindi")
+    with h5py.File(tmp_path / "data.h5", "w") as f:
+        f.create_dataset("x", data=list(range(10)))
+    served = threading.Event()
+    server = LocalFileServer(
+        str(tmp_path),
+        port=_free_port(),
+        on_first_request=served.set,
+        lindi_cache=LindiIndexCache(cache_dir=str(tmp_path / "lindi")),
+    )
+    server.start(timeout=10)
+    try:
+        response = _request(
+            server,
+            b"GET /files/data.h5.lindi.json HTTP/1.1\r\nHost: localhost\r\n"
+            b"Connection: close\r\n\r\n",
+        )
+        assert response.startswith(b"HTTP/1.1 200")
+        assert "refs" in json.loads(response.split(b"\r\n\r\n", 1)[1])
+        assert served.wait(timeout=10)
+    finally:
+        server.stop()
+
+
+def test_batch_binary_round_trip(server):
+    response = _post_batch(server, b"bytes=0-1,4-6,8-")
+    assert _decode_binary_ranges(response) == [(0, b"01"), (4, b"456"), (8, b"89")]
+
+
+def test_batch_multipart_round_trip(server):
+    response = _post_batch(server, b"bytes=0-1,4-6", binary=False)
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200")
+    assert b"Content-Type: multipart/byteranges" in head
+    parts = re.findall(rb"Content-Range: bytes (\d+-\d+)/10\r\n\r\n(\d*)\r\n", body)
+    assert parts == [(b"0-1", b"01"), (b"4-6", b"456")]
+
+
+def test_batch_ranges_past_eof(server):
+    # ranges starting past the end are dropped, others are truncated
+    response = _post_batch(server, b"bytes=2-3,20-30,8-100")
+    assert _decode_binary_ranges(response) == [(2, b"23"), (8, b"89")]
+
+
+@pytest.mark.parametrize("body", [b"bytes=", b"bytes=10-20"])
+def test_empty_batch(server, body):
+    assert _decode_binary_ranges(_post_batch(server, body)) == []
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"0-1",
+        b"bytes=abc",
+        b"bytes=5-2",
+        b"bytes=\xff",
+        b"bytes=" + b",".join([b"0-0"] * (MAX_BATCH_RANGES + 1)),
+    ],
+)
+def test_malformed_batch_gets_400(server, body):
+    assert _post_batch(server, body).startswith(b"HTTP/1.1 400")
+
+
+def test_oversized_batch_gets_413(server):
+    # the body is rejected from its Content-Length, before it is read
+    response = _request(
+        server,
+        b"POST /files/data.bin HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Length: " + str(MAX_BODY_BYTES + 1).encode() + b"\r\n\r\n",
+    )
+    assert response.startswith(b"HTTP/1.1 413")
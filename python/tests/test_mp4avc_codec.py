@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("av")
+
+from neurosift.codecs import MP4AVCCodec, write_zarr_array  # noqa: E402
+
+
+@pytest.mark.parametrize("bit_depth", [10, 12])
+@pytest.mark.parametrize("shape", [(100, 64, 64), (30, 120, 160), (20, 48, 200)])
+def test_lossless_high_bit_depth_round_trip(bit_depth, shape):
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 2**bit_depth, size=shape, dtype=np.uint16)
+    codec = MP4AVCCodec(fps=30, color="gray", bit_depth=bit_depth, lossless=True)
+    decoded = codec.decode(codec.encode(data))
+    assert decoded.dtype == np.uint16
+    np.testing.assert_array_equal(decoded, data)
+
+
+def test_lossless_12_bit_scaled_round_trip():
+    rng = np.random.default_rng(1)
+    data = rng.integers(0, 2**12, size=(60, 64, 64), dtype=np.uint16) * 16
+    codec = MP4AVCCodec(fps=30, color="gray", bit_depth=12, lossless=True, scale=16)
+    np.testing.assert_array_equal(codec.decode(codec.encode(data)), data)
+
+
+@pytest.mark.parametrize(
+    "color, frame_shape, dtype",
+    [("gray", (48, 64), np.uint8), ("bgr", (48, 64, 3), np.uint8)],
+)
+@pytest.mark.parametrize("start, stop", [(3, 3), (10, 12), (25, 30)])
+def test_decode_frames_empty_range(color, frame_shape, dtype, start, stop):
+    rng = np.random.default_rng(2)
+    data = rng.integers(0, 256, size=(10, *frame_shape), dtype=dtype)
+    codec = MP4AVCCodec(fps=30, color=color)
+    frames = codec.decode_frames(codec.encode(data), start, stop)
+    assert frames.shape == (0, *frame_shape)
+    assert frames.dtype == dtype
+
+
+def test_decode_frames_empty_range_high_bit_depth():
+    data = np.zeros((5, 32, 32), dtype=np.uint16)
+    codec = MP4AVCCodec(fps=30, color="gray", bit_depth=10)
+    frames = codec.decode_frames(codec.encode(data), 5, 8)
+    assert frames.shape == (0, 32, 32)
+    assert frames.dtype == np.uint16
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_write_zarr_array(tmp_path, use_processes):
+    zarr = pytest.importorskip("zarr")
+    MP4AVCCodec.register_codec()
+    rng = np.random.default_rng(3)
+    # the last chunk along each axis is partial
+    data = rng.integers(0, 256, size=(25, 40, 56), dtype=np.uint8)
+    codec = MP4AVCCodec(fps=30, color="gray", lossless=True)
+    kwargs = {"zarr_format": 2} if zarr.__version__.startswith("3") else {}
+    z = zarr.open_array(
+        str(tmp_path / "video.zarr"),
+        mode="w",
+        shape=data.shape,
+        chunks=(10, 32, 32),
+        dtype=data.dtype,
+        compressor=codec,
+        **kwargs,
+    )
+    write_zarr_array(z, data, num_workers=2, use_processes=use_processes)
+    reopened = zarr.open_array(str(tmp_path / "video.zarr"), mode="r")
+    np.testing.assert_array_equal(reopened[:], data)
@@ -0,0 +1,88 @@
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from neurosift.file_server import DiskBlockCache, RemoteFile
+
+
+class _AssetServer:
+    """Serves /asset as a redirect to a presigned URL that can be expired."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.token = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.asset_server = self  # type: ignore
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/asset"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        asset: _AssetServer = self.server.asset_server  # type: ignore
+        if self.path == "/asset":
+            self.send_response(302)
+            self.send_header("Location", f"/s3?token={asset.token}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path != f"/s3?token={asset.token}":
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        m = re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"])
+        assert m is not None
+        start, end = int(m.group(1)), int(m.group(2))
+        data = asset.data[start : end + 1]
+        self.send_response(206)
+        self.send_header(
+            "Content-Range", f"bytes {start}-{start + len(data) - 1}/{len(asset.data)}"
+        )
+        self.send_header("ETag", hashlib.md5(asset.data).hexdigest())
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def asset():
+    asset = _AssetServer(bytes(range(256)) * 4)
+    yield asset
+    asset.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskBlockCache(cache_dir=str(tmp_path), block_size=100)
+
+
+def test_expired_presigned_url_is_resolved_again(asset, cache):
+    remote = RemoteFile(asset.url, cache=cache)
+    assert remote.read_ranges([(0, 10)]) == [asset.data[:10]]
+    asset.token += 1
+    assert remote.read_ranges([(500, 200)]) == [asset.data[500:700]]
+    assert remote.resolved_url.endswith(f"token={asset.token}")
+
+
+def test_changed_file_is_not_mixed_with_cached_blocks(asset, cache):
+    remote = RemoteFile(asset.url, cache=cache)
+    assert remote.read_ranges([(0, 10)]) == [asset.data[:10]]
+    asset.data = bytes(reversed(asset.data))
+    asset.token += 1
+    with pytest.raises(IOError, match="has changed"):
+        remote.read_ranges([(500, 200)])
+    assert cache.get(remote.file_key, 5) is None
@@ -119,7 +119,10 @@ export const JobStatusHandler: FunctionComponent<Props> = ({
           </div>
         ) : (
           <div>
-            <p>Processing... {job?.progress || 0}%</p>
+            <p>
+              Processing... {Math.round(job?.progress || 0)}%
+              {job?.etaSec !== undefined && ` (${formatTimeLeft(job.etaSec)})`}
+            </p>
             <div
               style={{
                 width: "200px",
@@ -251,3 +254,9 @@ export const JobStatusHandler: FunctionComponent<Props> = ({
 
   return null;
 };
+
+const formatTimeLeft = (etaSec: number) => {
+  if (etaSec < 60) return `about ${Math.max(Math.round(etaSec), 1)} s left`;
+  if (etaSec < 3600) return `about ${Math.round(etaSec / 60)} min left`;
+  return `about ${(etaSec / 3600).toFixed(1)} h left`;
+};
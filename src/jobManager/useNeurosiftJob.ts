@@ -7,6 +7,7 @@ export interface Job {
   _id: string;
   status: "pending" | "running" | "completed" | "failed";
   progress: number;
+  etaSec?: number;
   output?: string;
   error?: string;
 }